@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+一括生成のスループットのベンチマーク
+
+generate_batch_organized.py と同じ BPM 160〜300（10刻み）× 2パターンの組み合わせを、
+従来の方法（1ファイルごとに generate_metronome() を呼ぶ）と render_many() で生成し、
+実時間とファイル数/秒を比較する。保存先の形式を指定すると保存処理も含めて計測する。
+
+使用例:
+  uv run python benchmarks/batch_sweep.py                  # 波形の生成のみ
+  uv run python benchmarks/batch_sweep.py --save wav       # WAVの保存も含める
+  uv run python benchmarks/batch_sweep.py --durations 30 60 --save mp3
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.metronome.batch import expand_tasks, render_many  # noqa: E402
+from src.metronome.core import generate_metronome  # noqa: E402
+from src.metronome.io import save_as_mp3, save_as_wav  # noqa: E402
+
+# generate_batch_organized.py と同じ組み合わせ
+BPMS = range(160, 301, 10)
+PATTERNS = ("4beat", "4to8")
+
+
+def run_per_task(tasks, save):
+    """従来の方法: タスクごとに最初から生成する"""
+    for task in tasks:
+        wave_data = generate_metronome(
+            task.bpm, task.duration, task.sample_rate, task.pattern, timing=task.timing
+        )
+        save(task, wave_data)
+
+
+def run_render_many(tasks, save):
+    """render_many() でクリック音・パターン・同じテンポの波形を共有して生成する"""
+    for task, wave_data in render_many(tasks):
+        save(task, wave_data)
+
+
+METHODS = {"per_task": run_per_task, "render_many": run_render_many}
+
+
+class _WorkDir:
+    """保存先の一時ディレクトリ"""
+
+    def __init__(self):
+        self.name = tempfile.mkdtemp(prefix="metronome-sweep-")
+
+    def clean(self):
+        shutil.rmtree(self.name)
+        os.mkdir(self.name)
+
+    def remove(self):
+        shutil.rmtree(self.name, ignore_errors=True)
+
+
+def _make_save(kind, workdir):
+    if kind is None:
+        return lambda task, wave_data: None
+
+    def save(task, wave_data):
+        filename = os.path.join(workdir.name, f"{task.pattern}_{task.bpm}_{task.duration}.{kind}")
+        if kind == "wav":
+            save_as_wav(wave_data, task.sample_rate, filename)
+        else:
+            save_as_mp3(wave_data, task.sample_rate, filename, bitrate=task.bitrate)
+
+    return save
+
+
+def measure(method, tasks, save, workdir, repeat):
+    """
+    1つの方法で全タスクを repeat 回実行する
+
+    Returns:
+        dict: 実時間の中央値と最小値（秒）、ファイル数/秒（最小値から計算）
+    """
+    timings = []
+    for _ in range(repeat):
+        # 既存ファイルの置き換えにかかる時間を含めないよう、毎回空のディレクトリに保存する
+        workdir.clean()
+        start = time.perf_counter()
+        METHODS[method](tasks, save)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": best,
+        "files_per_s": len(tasks) / best,
+    }
+
+
+def main():
+    """ベンチマークを実行する"""
+    parser = argparse.ArgumentParser(description="一括生成のスループットのベンチマーク")
+    parser.add_argument("--durations", type=int, nargs="+", default=[60], help="長さ（秒）のリスト")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="サンプリングレート")
+    parser.add_argument(
+        "--save", choices=["wav", "mp3"], default=None, help="保存処理も含めて計測する"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数（最速を採用）")
+    parser.add_argument("--output", type=str, default=None, help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    tasks = expand_tasks(BPMS, PATTERNS, args.durations, (args.sample_rate,))
+    workdir = _WorkDir()
+    save = _make_save(args.save, workdir)
+    try:
+        # 初回のみの処理（クリック音の生成・パターンのコンパイル）を計測から除く
+        run_per_task(tasks[:1], save)
+        results = {method: measure(method, tasks, save, workdir, args.repeat) for method in METHODS}
+    finally:
+        workdir.remove()
+
+    print(f"{len(tasks)}ファイル（保存: {args.save or 'なし'}）")
+    print(f"{'方法':<14} {'中央値[s]':>10} {'最速[s]':>9} {'ファイル/s':>11}")
+    for method, result in results.items():
+        print(
+            f"{method:<14} {result['median_s']:>10.3f} {result['min_s']:>9.3f} "
+            f"{result['files_per_s']:>11.1f}"
+        )
+    speedup = results["per_task"]["min_s"] / results["render_many"]["min_s"]
+    print(f"\nrender_many: {speedup:.2f}倍")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"tasks": len(tasks), "save": args.save, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+合成・エンコード処理のベンチマーク
+
+各ケースを独立した子プロセスで実行し、処理時間（出力秒数/実時間秒数）と
+ピークRSSを計測する。同じマシンで保存したベースラインと比較して性能の劣化を検出する。
+
+ベースラインはマシンごとに benchmarks/baselines/<マシンID>.json に保存する
+（リポジトリには含めない）。まだない場合は最初の実行結果をベースラインとして保存し、
+別のマシンで記録したベースラインを指定した場合は比較しない。
+
+使用例:
+  uv run python benchmarks/run.py                      # 全ケースを実行してベースラインと比較
+  uv run python benchmarks/run.py --quick              # 小さい組み合わせのみ
+  uv run python benchmarks/run.py --save-baseline      # 結果をベースラインとして保存
+  uv run python benchmarks/run.py --filter save_as_mp3 # 対象を絞り込む
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+# 1回の計測でケースを繰り返す最短の時間（秒）。数ミリ秒で終わるケースでも
+# タイマーの分解能やスケジューラの揺らぎの影響を受けないようにする
+DEFAULT_MIN_TIME = 0.2
+
+BPMS = (20, 120, 300)
+DURATIONS = (10, 60, 600)
+SAMPLE_RATES = (22050, 44100, 48000)
+PATTERNS = ("4beat", "4to8")
+
+
+def build_cases(quick=False):
+    """
+    計測するケースの一覧を作成する
+
+    Returns:
+        list: {"name", "func", "bpm", "duration", "sample_rate", "pattern"} のリスト
+    """
+    bpms = (120, 300) if quick else BPMS
+    durations = (10, 60) if quick else DURATIONS
+    sample_rates = (44100,) if quick else SAMPLE_RATES
+
+    cases = []
+    for bpm, duration, sample_rate, pattern in itertools.product(
+        bpms, durations, sample_rates, PATTERNS
+    ):
+        cases.append(_case("generate_metronome", bpm, duration, sample_rate, pattern))
+
+    for sample_rate in sample_rates:
+        cases.append(_case("generate_click_sound", None, None, sample_rate, None))
+
+    # 保存処理は波形の内容に依存しないため、長さとサンプリングレートのみ変える
+    for func in ("save_as_wav", "save_as_mp3"):
+        for duration, sample_rate in itertools.product(durations, sample_rates):
+            cases.append(_case(func, 120, duration, sample_rate, "4beat"))
+
+    return cases
+
+
+def _case(func, bpm, duration, sample_rate, pattern):
+    parts = [func] + [str(v) for v in (bpm, duration, sample_rate, pattern) if v is not None]
+    return {
+        "name": "/".join(parts),
+        "func": func,
+        "bpm": bpm,
+        "duration": duration,
+        "sample_rate": sample_rate,
+        "pattern": pattern,
+    }
+
+
+def _peak_rss_mb():
+    """このプロセスのピークRSS（MB）。取得できない環境では None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def machine_info():
+    """
+    ベースラインを比較できるかの判定に使うマシンの情報
+
+    Returns:
+        dict: OS・アーキテクチャ・CPU・CPU数・Pythonのバージョン
+    """
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def default_baseline_path(machine):
+    """マシンごとのベースラインのファイル名"""
+    machine_id = hashlib.sha256(json.dumps(machine, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(BASELINE_DIR, f"{machine_id}.json")
+
+
+def save_baseline(path, machine, results):
+    """計測結果をマシンの情報とともにベースラインとして保存する"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"machine": machine, "results": results}, f, indent=2, sort_keys=True)
+
+
+def _time_call(func, min_time):
+    """
+    func を合計 min_time 秒以上になるまで繰り返し呼ぶ
+
+    Returns:
+        tuple: (各回の時間のリスト, 最後の戻り値)
+    """
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while True:
+        start = time.perf_counter()
+        result = func()
+        end = time.perf_counter()
+        timings.append(end - start)
+        if end >= deadline:
+            return timings, result
+
+
+def run_case(case, repeat, min_time=DEFAULT_MIN_TIME):
+    """
+    1ケースを計測する（子プロセス内で実行）
+
+    1回の計測では合計 min_time 秒以上になるまでケースを繰り返し、repeat 回の計測の
+    全ての呼び出しのうち最速の時間を採用する（他のプロセスによる揺らぎの影響を受けにくい）。
+
+    Returns:
+        dict: 最速の処理時間、出力秒数/実時間秒数、ピークRSS
+    """
+    sys.path.insert(0, ROOT)
+    from src.metronome.core import generate_click_sound, generate_metronome
+    from src.metronome.io import save_as_mp3, save_as_wav
+
+    func = case["func"]
+    wave_data = None
+    if func.startswith("save_as"):
+        wave_data = generate_metronome(
+            case["bpm"], case["duration"], case["sample_rate"], case["pattern"]
+        )
+
+    workdir = tempfile.mkdtemp(prefix="metronome-bench-")
+    rss_before = _peak_rss_mb()
+
+    def once():
+        if func == "generate_click_sound":
+            return generate_click_sound(case["sample_rate"])
+        if func == "generate_metronome":
+            return generate_metronome(
+                case["bpm"], case["duration"], case["sample_rate"], case["pattern"]
+            )
+        if func == "save_as_wav":
+            return save_as_wav(wave_data, case["sample_rate"], os.path.join(workdir, "out.wav"))
+        return save_as_mp3(wave_data, case["sample_rate"], os.path.join(workdir, "out.mp3"))
+
+    try:
+        timings = []
+        output_samples = None
+        for _ in range(repeat):
+            calls, result = _time_call(once, min_time)
+            timings.extend(calls)
+            if func.startswith("generate"):
+                output_samples = len(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if wave_data is not None:
+        output_samples = len(wave_data)
+
+    best = min(timings)
+    rss_after = _peak_rss_mb()
+    return {
+        "seconds": best,
+        "throughput": (output_samples / case["sample_rate"]) / best if best > 0 else None,
+        "peak_rss_mb": rss_after,
+        "peak_rss_delta_mb": (
+            rss_after - rss_before if rss_after is not None and rss_before is not None else None
+        ),
+    }
+
+
+def run_isolated(case, repeat, min_time=DEFAULT_MIN_TIME):
+    """ケースを独立した子プロセスで実行し、他のケースのメモリ使用量の影響を避ける"""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--case",
+            json.dumps(case),
+            "--repeat",
+            str(repeat),
+            "--min-time",
+            str(min_time),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """
+    ベースラインと比較し、劣化したケースを返す
+
+    Returns:
+        list: (ケース名, 劣化内容を表す文字列) のリスト
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "error" in result or "error" in base:
+            continue
+        if base["throughput"] and result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                (name, f"throughput {base['throughput']:.1f}x -> {result['throughput']:.1f}x")
+            )
+        base_delta = base.get("peak_rss_delta_mb")
+        delta = result.get("peak_rss_delta_mb")
+        # 数MBの揺らぎは無視する
+        if (
+            base_delta is not None
+            and delta is not None
+            and delta > base_delta * (1 + tolerance) + 5
+        ):
+            regressions.append((name, f"peak RSS +{base_delta:.1f}MB -> +{delta:.1f}MB"))
+    return regressions
+
+
+def _faster(result, retry):
+    """2回の計測のうち速い方の時間と小さい方のRSS増分を採用する"""
+    if "error" in retry:
+        return result
+    merged = retry if retry["seconds"] < result["seconds"] else result
+    deltas = [r["peak_rss_delta_mb"] for r in (result, retry) if r["peak_rss_delta_mb"] is not None]
+    return {**merged, "peak_rss_delta_mb": min(deltas) if deltas else None}
+
+
+def main():
+    """ベンチマークを実行する"""
+    parser = argparse.ArgumentParser(description="合成・エンコード処理のベンチマーク")
+    parser.add_argument("--quick", action="store_true", help="小さい組み合わせのみ実行")
+    parser.add_argument(
+        "--filter", type=str, default=None, help="ケース名に含まれる文字列で絞り込む"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="各ケースの計測回数（最速値を採用）")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=DEFAULT_MIN_TIME,
+        help=f"1回の計測でケースを繰り返す最短の時間（秒、デフォルト: {DEFAULT_MIN_TIME}）",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="ベースラインJSON（デフォルト: benchmarks/baselines/<マシンID>.json）",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存")
+    parser.add_argument("--output", type=str, default=None, help="結果をJSONで保存する")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="劣化とみなす割合（デフォルト: 0.25）"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="劣化したケースを計測し直す回数（再現した場合のみ劣化とする、デフォルト: 2）",
+    )
+    parser.add_argument("--case", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # 子プロセスとして1ケースを実行
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case), args.repeat, args.min_time)))
+        return 0
+
+    cases = build_cases(args.quick)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case["name"]]
+    if shutil.which("ffmpeg") is None:
+        print("警告: ffmpegが見つからないため save_as_mp3 は計測しません")
+        cases = [case for case in cases if case["func"] != "save_as_mp3"]
+
+    print(f"{'ケース':<44} {'時間[s]':>9} {'出力秒/秒':>11} {'RSS[MB]':>9} {'増分[MB]':>9}")
+    results = {}
+    for case in cases:
+        result = run_isolated(case, args.repeat, args.min_time)
+        results[case["name"]] = result
+        if "error" in result:
+            print(f"{case['name']:<44} エラー: {result['error']}")
+            continue
+        rss = result["peak_rss_mb"]
+        delta = result["peak_rss_delta_mb"]
+        print(
+            f"{case['name']:<44} {result['seconds']:>9.4f} {result['throughput']:>11.1f} "
+            f"{rss if rss is not None else float('nan'):>9.1f} "
+            f"{delta if delta is not None else float('nan'):>9.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    machine = machine_info()
+    baseline_path = args.baseline or default_baseline_path(machine)
+    if args.save_baseline:
+        save_baseline(baseline_path, machine, results)
+        print(f"\nベースラインを保存しました: {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        # 初回は比較せず、このマシンのベースラインとして保存する
+        save_baseline(baseline_path, machine, results)
+        print(f"\nこのマシンのベースラインがないため、結果を保存しました: {baseline_path}")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine:
+        # 絶対時間はマシンに依存するため、別のマシンの数値とは比較しない
+        print(
+            f"\nベースラインは別のマシンで記録されたため比較しません: {baseline_path}\n"
+            "このマシンで --save-baseline を指定して記録し直してください"
+        )
+        return 0
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    # 一時的に他のプロセスに CPU を取られた場合を除くため、劣化したケースだけ
+    # 子プロセスで計測し直し、速い方の結果で比較する
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        for name in sorted({name for name, _ in regressions}):
+            case = next(case for case in cases if case["name"] == name)
+            results[name] = _faster(results[name], run_isolated(case, args.repeat, args.min_time))
+        regressions = compare(results, baseline["results"], args.tolerance)
+
+    if regressions:
+        print(f"\n✗ {len(regressions)}件の性能劣化を検出しました:")
+        for name, regression in regressions:
+            print(f"  - {name}: {regression}")
+        return 1
+
+    print(f"\n✓ ベースラインからの劣化はありません（許容範囲 {args.tolerance:.0%}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
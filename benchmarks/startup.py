@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+CLIの起動時間のベンチマーク
+
+`python -X importtime` でパッケージの読み込み時間と重い依存ライブラリの内訳を、
+`--help` の実行時間（実時間の中央値）でコマンドの応答速度を計測する。
+
+使用例:
+  uv run python benchmarks/startup.py                    # 計測結果を表示
+  uv run python benchmarks/startup.py --max-help-ms 300  # --help が遅ければ失敗にする
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 計測対象の import 文
+IMPORTS = {
+    "package": "import src.metronome",
+    "cli": "import src.metronome.cli",
+    "generate_metronome": "from src.metronome import generate_metronome",
+}
+
+# 起動時に読み込まれていないことを確認する重い依存ライブラリ
+HEAVY_MODULES = ("numpy", "scipy", "pydub")
+
+# --help を計測するコマンド（サブコマンドも必要なライブラリは引数の解析後に読み込む）
+HELP_COMMANDS = {
+    "--help": ["--help"],
+    "batch --help": ["batch", "--help"],
+    "play --help": ["play", "--help"],
+    "serve --help": ["serve", "--help"],
+}
+
+
+def measure_import(statement):
+    """
+    1つの import 文の読み込み時間を計測し、重い依存ライブラリの内訳を -X importtime で調べる
+
+    Returns:
+        dict: import 文の実時間（ms）、読み込まれた重い依存ライブラリとその時間（ms）
+    """
+    script = f"import time\nstart = time.perf_counter()\n{statement}\n"
+    script += "print((time.perf_counter() - start) * 1000)"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    heavy = {}
+    for line in completed.stderr.splitlines():
+        fields = line[len("import time:") :].split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # 見出し行
+            continue
+        # サブモジュール（scipy.io.wavfile など）も含め、最も時間のかかった読み込みを記録
+        package = fields[2].strip().split(".")[0]
+        if package in HEAVY_MODULES:
+            heavy[package] = max(heavy.get(package, 0), cumulative / 1000)
+    # -X importtime の出力分だけ実時間は長くなるが、比較には十分
+    return {"import_ms": float(completed.stdout.strip()), "heavy_ms": heavy}
+
+
+def measure_help(args, repeat):
+    """
+    CLIを子プロセスで起動し、終了までの実時間を計測する
+
+    Returns:
+        dict: 実時間の中央値と最小値（ms）
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "src.metronome.cli", *args],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings)}
+
+
+def main():
+    """ベンチマークを実行する"""
+    parser = argparse.ArgumentParser(description="CLIの起動時間のベンチマーク")
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="--help の繰り返し回数（中央値を採用）"
+    )
+    parser.add_argument(
+        "--max-help-ms",
+        type=float,
+        default=None,
+        help="--help の実時間（中央値）がこれを超えたら失敗にする",
+    )
+    parser.add_argument("--output", type=str, default=None, help="結果をJSONで保存する")
+    args = parser.parse_args()
+
+    results = {"imports": {}, "help": {}}
+    # インタプリタ自体の起動時間（比較用）
+    results["help"]["python -c pass"] = _measure_interpreter(args.repeat)
+
+    print(f"{'import':<24} {'時間[ms]':>9}  重い依存ライブラリ")
+    for name, statement in IMPORTS.items():
+        result = measure_import(statement)
+        results["imports"][name] = result
+        heavy = ", ".join(f"{module} {ms:.0f}ms" for module, ms in result["heavy_ms"].items())
+        print(f"{name:<24} {result['import_ms']:>9.1f}  {heavy or '-'}")
+
+    print(f"\n{'コマンド':<24} {'中央値[ms]':>11} {'最小[ms]':>9}")
+    for name, command in HELP_COMMANDS.items():
+        results["help"][name] = measure_help(command, args.repeat)
+    for name, result in results["help"].items():
+        print(f"{name:<24} {result['median_ms']:>11.1f} {result['min_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    failed = False
+    cli_heavy = results["imports"]["cli"]["heavy_ms"]
+    if cli_heavy:
+        print(f"\n✗ CLIの起動時に重いライブラリが読み込まれています: {', '.join(cli_heavy)}")
+        failed = True
+    help_ms = results["help"]["--help"]["median_ms"]
+    if args.max_help_ms is not None and help_ms > args.max_help_ms:
+        print(f"\n✗ --help が {help_ms:.1f}ms かかりました（上限 {args.max_help_ms:.1f}ms）")
+        failed = True
+    if failed:
+        return 1
+
+    print("\n✓ 起動時に重いライブラリは読み込まれていません")
+    return 0
+
+
+def _measure_interpreter(repeat):
+    """何も読み込まないインタプリタの起動時間"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings)}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
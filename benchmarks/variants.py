@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+複数のサンプリングレート・形式の出力のベンチマーク
+
+同じ設定を複数のサンプリングレート・形式で出力する場合に、従来の方法（組み合わせごとに
+generate_metronome() と保存処理を呼ぶ）と render_variants() を比較する。
+
+使用例:
+  uv run python benchmarks/variants.py
+  uv run python benchmarks/variants.py --formats wav --duration 600
+  uv run python benchmarks/variants.py --formats wav --tempo-map "160-300@10m"
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.metronome.batch import render_variants  # noqa: E402
+from src.metronome.core import generate_metronome  # noqa: E402
+from src.metronome.io import encode_mp3, save_as_wav  # noqa: E402
+
+
+def run_separate(args, base):
+    """従来の方法: 組み合わせごとに最初から生成して保存する"""
+    for sample_rate in args.sample_rates:
+        for format in args.formats:
+            wave_data = generate_metronome(
+                args.bpm,
+                args.duration,
+                sample_rate,
+                args.pattern,
+                timing=args.timing,
+                tempo_map=args.tempo_map,
+            )
+            output_file = f"{base}_{sample_rate}hz.{format}"
+            if format == "wav":
+                save_as_wav(wave_data, sample_rate, output_file)
+            else:
+                encode_mp3(wave_data, sample_rate, output_file)
+
+
+def run_variants(args, base):
+    """render_variants() で1度に生成する"""
+    render_variants(
+        args.bpm,
+        args.duration,
+        args.sample_rates,
+        args.formats,
+        base,
+        args.pattern,
+        timing=args.timing,
+        tempo_map=args.tempo_map,
+        checksums=args.checksums,
+    )
+
+
+METHODS = {"separate": run_separate, "render_variants": run_variants}
+
+
+def measure(method, args, workdir):
+    """
+    1つの方法を repeat 回実行する
+
+    Returns:
+        dict: 実時間の中央値と最小値（秒）
+    """
+    timings = []
+    for _ in range(args.repeat):
+        shutil.rmtree(workdir, ignore_errors=True)
+        os.mkdir(workdir)
+        start = time.perf_counter()
+        METHODS[method](args, os.path.join(workdir, "click"))
+        timings.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(timings), "min_s": min(timings)}
+
+
+def main():
+    """ベンチマークを実行する"""
+    parser = argparse.ArgumentParser(description="複数のサンプリングレート・形式の出力の比較")
+    parser.add_argument("--bpm", type=float, default=180, help="テンポ")
+    parser.add_argument("--duration", type=float, default=60, help="長さ（秒）")
+    parser.add_argument("--pattern", type=str, default="4to8", help="リズムパターン")
+    parser.add_argument(
+        "--tempo-map", type=str, default=None, help="テンポマップ（--bpm・--duration より優先）"
+    )
+    parser.add_argument("--timing", choices=["accumulate", "exact"], default="accumulate")
+    parser.add_argument(
+        "--sample-rates",
+        type=int,
+        nargs="+",
+        default=[22050, 44100, 48000],
+        help="サンプリングレート",
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=["wav", "mp3"], default=["wav", "mp3"], help="出力形式"
+    )
+    parser.add_argument(
+        "--checksums", action="store_true", help="render_variants() でSHA-256も計算する"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="繰り返し回数（最速を採用）")
+    parser.add_argument("--output", type=str, default=None, help="結果をJSONで保存する")
+    args = parser.parse_args()
+    if args.tempo_map:
+        args.bpm = args.duration = None
+
+    workdir = tempfile.mkdtemp(prefix="metronome-variants-")
+    try:
+        # 初回のみの処理（クリック音の生成・パターンのコンパイル）を計測から除く
+        run_separate(args, os.path.join(workdir, "warmup"))
+        results = {method: measure(method, args, workdir) for method in METHODS}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    outputs = len(args.sample_rates) * len(args.formats)
+    length = f"テンポマップ {args.tempo_map}" if args.tempo_map else f"{args.duration}秒"
+    print(f"{outputs}ファイル（{length}、形式: {' '.join(args.formats)}）")
+    print(f"{'方法':<16} {'中央値[s]':>10} {'最速[s]':>9}")
+    for method, result in results.items():
+        print(f"{method:<16} {result['median_s']:>10.3f} {result['min_s']:>9.3f}")
+    speedup = results["separate"]["min_s"] / results["render_variants"]["min_s"]
+    print(f"\nrender_variants: {speedup:.2f}倍")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"outputs": outputs, "args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
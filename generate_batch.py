@@ -3,8 +3,8 @@
 BPM範囲のメトロノームファイルを一括生成するスクリプト
 """
 
-from src.metronome.core import generate_metronome
-from src.metronome.io import save_as_mp3
+from src.metronome.batch import BatchTask, render_task
+from src.metronome.cache import RenderCache
 
 
 def generate_batch_metronomes(start_bpm, end_bpm, step=10, duration=60, sample_rate=44100):
@@ -26,27 +26,21 @@ def generate_batch_metronomes(start_bpm, end_bpm, step=10, duration=60, sample_r
     print(f"各ファイルの長さ: {duration}秒\n")
 
     generated_files = []
+    cache = RenderCache()
 
     for idx, bpm in enumerate(bpm_list, 1):
         print(f"[{idx}/{total}] BPM {bpm} を生成中...")
 
-        # メトロノーム音声を生成
-        wave_data = generate_metronome(
-            bpm=bpm,
-            duration_seconds=duration,
-            sample_rate=sample_rate
-        )
-
         # ファイル名を生成
         output_file = f"metronome_bpm{bpm:03d}_1min.mp3"
 
-        # MP3として保存
-        save_as_mp3(wave_data, sample_rate, output_file, bpm)
+        # メトロノーム音声を生成してMP3として保存（キャッシュがあればコピー）
+        render_task(BatchTask(bpm, duration, sample_rate, "4beat", output_file), cache)
 
         generated_files.append(output_file)
         print(f"  ✓ {output_file}")
 
-    print(f"\n完了！{total}個のファイルを生成しました:")
+    print(f"\n完了！{total}個のファイルを生成しました（キャッシュ: ヒット {cache.hits} / ミス {cache.misses}）:")
     for file in generated_files:
         print(f"  - {file}")
 
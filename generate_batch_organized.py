@@ -2,15 +2,14 @@
 """
 BPM範囲のメトロノームファイルを一括生成するスクリプト
 パターンごとにディレクトリを分けて保存
+途中で中断しても、再実行すると残りのファイル（ない・壊れた・設定が変わったもの）だけを生成する
 """
 
-import os
-from pathlib import Path
-from src.metronome.core import generate_metronome
-from src.metronome.io import save_as_mp3
+from src.metronome.cache import RenderCache
+from src.metronome.manifest import build, validate_job
 
 
-def generate_batch_metronomes(start_bpm, end_bpm, step=10, duration=60, sample_rate=44100, pattern="4beat", output_dir="mp3"):
+def generate_batch_metronomes(start_bpm, end_bpm, step=10, duration=60, sample_rate=44100, patterns=("4beat",), output_dir="mp3"):
     """
     指定範囲のBPMでメトロノームファイルを一括生成
 
@@ -20,54 +19,51 @@ def generate_batch_metronomes(start_bpm, end_bpm, step=10, duration=60, sample_r
         step: BPMの刻み幅
         duration: 各ファイルの長さ（秒）
         sample_rate: サンプリングレート
-        pattern: リズムパターン（"4beat" or "4to8"）
-        output_dir: 出力ディレクトリ
+        patterns: リズムパターンのリスト（"4beat" / "4to8"）
+        output_dir: 出力ディレクトリ（パターンごとのサブディレクトリに保存）
     """
-    bpm_list = range(start_bpm, end_bpm + 1, step)
-    total = len(list(bpm_list))
+    job = validate_job(
+        {
+            "output_dir": output_dir,
+            "bpm_range": [f"{start_bpm}:{end_bpm}:{step}"],
+            "patterns": list(patterns),
+            "durations": [duration],
+            "sample_rates": [sample_rate],
+        }
+    )
+    total = len(job["bpms"]) * len(patterns)
 
-    pattern_name = "4つ打ち" if pattern == "4beat" else "4→8パターン"
+    pattern_names = {"4beat": "4つ打ち", "4to8": "4→8パターン"}
 
     print(f"\n{'='*60}")
     print(f"BPM {start_bpm}〜{end_bpm} ({step}刻み) のメトロノームを生成します")
-    print(f"パターン: {pattern_name}")
+    print(f"パターン: {', '.join(pattern_names[p] for p in patterns)}")
     print(f"合計: {total}ファイル")
     print(f"各ファイルの長さ: {duration}秒")
     print(f"出力先: {output_dir}/")
     print(f"{'='*60}\n")
 
-    # 出力ディレクトリを作成
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-
     generated_files = []
-
-    for idx, bpm in enumerate(bpm_list, 1):
-        print(f"[{idx}/{total}] BPM {bpm} を生成中...", end=" ", flush=True)
-
-        try:
-            # メトロノーム音声を生成
-            wave_data = generate_metronome(
-                bpm=bpm,
-                duration_seconds=duration,
-                sample_rate=sample_rate,
-                pattern=pattern
-            )
-
-            # ファイル名を生成
-            output_file = output_path / f"metronome_bpm{bpm:03d}_60sec.mp3"
-
-            # MP3として保存
-            save_as_mp3(wave_data, sample_rate, str(output_file), bpm)
-
-            generated_files.append(str(output_file))
-            print(f"✓ 完了")
-
-        except Exception as e:
-            print(f"✗ エラー: {e}")
+    up_to_date = 0
+    cache = RenderCache()
+
+    # 生成が必要なファイルだけを、合成とエンコード（ffmpeg）を並行して生成する
+    for idx, result in enumerate(build(job, cache=cache), 1):
+        task = result.entry.task
+        print(f"[{idx}/{total}] {task.pattern} BPM {task.bpm}", end=" ")
+        if result.status == "failed":
+            print(f"✗ エラー: {result.error}")
+            continue
+        generated_files.append(task.output_file)
+        if result.status == "up-to-date":
+            up_to_date += 1
+            print("✓ 生成済み")
+        else:
+            print(f"✓ 完了（{result.reason}）")
 
     print(f"\n{'='*60}")
-    print(f"完了！{len(generated_files)}/{total}個のファイルを生成しました")
+    print(f"完了！{len(generated_files)}/{total}個のファイルがそろっています（うち生成済み {up_to_date}個）")
+    print(f"キャッシュ: ヒット {cache.hits} / ミス {cache.misses}")
     print(f"出力先: {output_dir}/")
     print(f"{'='*60}\n")
 
@@ -80,35 +76,15 @@ def main():
     print("メトロノーム音声一括生成ツール")
     print("="*60)
 
-    # BPM 160〜300を10刻みで生成
-    start_bpm = 160
-    end_bpm = 300
-    step = 10
-    duration = 60
-    sample_rate = 44100
-
-    # 4beatパターンを生成
-    print("\n【1/2】4beatパターンを生成中...")
-    generate_batch_metronomes(
-        start_bpm=start_bpm,
-        end_bpm=end_bpm,
-        step=step,
-        duration=duration,
-        sample_rate=sample_rate,
-        pattern="4beat",
-        output_dir="mp3/4beat"
-    )
-
-    # 4to8パターンを生成
-    print("\n【2/2】4to8パターンを生成中...")
+    # BPM 160〜300を10刻みで、4beat・4to8パターンを生成
     generate_batch_metronomes(
-        start_bpm=start_bpm,
-        end_bpm=end_bpm,
-        step=step,
-        duration=duration,
-        sample_rate=sample_rate,
-        pattern="4to8",
-        output_dir="mp3/4to8"
+        start_bpm=160,
+        end_bpm=300,
+        step=10,
+        duration=60,
+        sample_rate=44100,
+        patterns=("4beat", "4to8"),
+        output_dir="mp3"
     )
 
     print("\n" + "="*60)
@@ -9,8 +9,6 @@ a = Analysis(
     datas=[],
     hiddenimports=[
         'numpy',
-        'scipy',
-        'scipy.signal',
         'pydub',
         'tkinter',
     ],
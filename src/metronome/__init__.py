@@ -1,11 +1,73 @@
 """メトロノーム音声生成パッケージ"""
 
-from .core import generate_click_sound, generate_metronome
-from .io import save_as_mp3, save_as_wav
+import importlib
+
+__version__ = "0.1.0"
+
+# 公開する名前 → 定義しているサブモジュール。
+# NumPy などの読み込みに時間がかかるため、最初に参照された時にサブモジュールを読み込む
+_EXPORTS = {
+    "PATTERNS": "patterns",
+    "CompiledPattern": "patterns",
+    "compile_pattern": "patterns",
+    "TempoMap": "tempo",
+    "parse_tempo_map": "tempo",
+    "ClickBank": "core",
+    "click_bank": "core",
+    "generate_click_sound": "core",
+    "generate_metronome": "core",
+    "iter_metronome_chunks": "core",
+    "EncoderPool": "io",
+    "encode_many": "io",
+    "encode_mp3": "io",
+    "save_as_mp3": "io",
+    "save_as_wav": "io",
+    "WavWriter": "io",
+    "render_loop": "loop",
+    "save_loop": "loop",
+    "PlaybackEngine": "playback",
+    "Profile": "profiling",
+    "render_many": "batch",
+    "render_variants": "batch",
+    # コンソールスクリプト（metronome = "metronome:main"）の入口
+    "main": "cli",
+}
 
 __all__ = [
+    "PATTERNS",
+    "CompiledPattern",
+    "ClickBank",
+    "EncoderPool",
+    "PlaybackEngine",
+    "Profile",
+    "TempoMap",
+    "WavWriter",
+    "click_bank",
+    "compile_pattern",
+    "encode_many",
+    "encode_mp3",
     "generate_click_sound",
     "generate_metronome",
+    "iter_metronome_chunks",
+    "parse_tempo_map",
+    "render_loop",
+    "render_many",
+    "render_variants",
     "save_as_mp3",
     "save_as_wav",
+    "save_loop",
 ]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # 次回からは通常の属性として参照できるようにする
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
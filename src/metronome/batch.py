@@ -0,0 +1,355 @@
+"""複数ファイルの一括生成（プロセスプールによる並列処理）"""
+
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+
+from .cache import cached_save, render_spec
+from .core import (
+    _compute_onsets,
+    _compute_schedule,
+    _make_clicks,
+    _render_clicks,
+    _render_pattern,
+    _render_tiled,
+    _sample_schedule,
+    _to_int16,
+    count_samples,
+    generate_metronome,
+)
+from .io import _atomic_output, encode_mp3, save_as_mp3, save_as_wav
+from .manifest import file_sha256
+from .patterns import TIMING_MODES, compile_pattern
+from .tempo import parse_tempo_map
+
+# サンプリングレートのデフォルト（ファイル名に含めない）
+DEFAULT_SAMPLE_RATE = 44100
+
+# render_variants() で出力できる形式
+VARIANT_FORMATS = ("wav", "mp3")
+
+
+@dataclass(frozen=True)
+class BatchTask:
+    """一括生成する1ファイル分の設定"""
+
+    bpm: int
+    duration: int
+    sample_rate: int
+    pattern: str
+    output_file: str
+    bitrate: str = "192k"
+    timing: str = "accumulate"
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """1タスク分の実行結果"""
+
+    task: BatchTask
+    error: str = None
+    cached: bool = False
+
+
+def expand_tasks(
+    bpms,
+    patterns=("4beat",),
+    durations=(60,),
+    sample_rates=(DEFAULT_SAMPLE_RATE,),
+    output_dir="mp3",
+    bitrate="192k",
+    timing="accumulate",
+):
+    """
+    BPM × パターン × 長さ × サンプリングレートの全組み合わせのタスクを作成する
+
+    出力先は `<output_dir>/<pattern>/metronome_bpmXXX_<duration>sec.mp3`
+    （デフォルト以外のサンプリングレートは `_<rate>hz` を付加）。
+
+    Args:
+        bpms: BPMのリスト
+        patterns: リズムパターンのリスト
+        durations: 長さ（秒）のリスト
+        sample_rates: サンプリングレートのリスト
+        output_dir: 出力ディレクトリ
+        bitrate: MP3のビットレート
+        timing: クリック位置の計算方法（"accumulate" または "exact"）
+
+    Returns:
+        list: BatchTask のリスト
+    """
+    tasks = []
+    for pattern, bpm, duration, sample_rate in itertools.product(
+        patterns, bpms, durations, sample_rates
+    ):
+        filename = f"metronome_bpm{bpm:03d}_{duration}sec"
+        if sample_rate != DEFAULT_SAMPLE_RATE:
+            filename += f"_{sample_rate}hz"
+        output_file = os.path.join(output_dir, pattern, filename + ".mp3")
+        tasks.append(BatchTask(bpm, duration, sample_rate, pattern, output_file, bitrate, timing))
+    return tasks
+
+
+def render_task(task, cache=None):
+    """
+    1ファイル分を生成して保存する（ワーカープロセスで実行）
+
+    Args:
+        task: BatchTask
+        cache: RenderCache（None ならキャッシュを使わない）
+
+    Returns:
+        bool: キャッシュから取得した場合 True
+    """
+    directory = os.path.dirname(task.output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def save(output_file):
+        wave_data = generate_metronome(
+            bpm=task.bpm,
+            duration_seconds=task.duration,
+            sample_rate=task.sample_rate,
+            pattern=task.pattern,
+            timing=task.timing,
+        )
+        save_as_mp3(wave_data, task.sample_rate, output_file, bitrate=task.bitrate)
+
+    spec = render_spec(
+        task.bpm,
+        task.duration,
+        task.sample_rate,
+        task.pattern,
+        bitrate=task.bitrate,
+        timing=task.timing,
+    )
+    return cached_save(cache, spec, task.output_file, save)
+
+
+def render_many(specs, dtype=np.float64):
+    """
+    複数の設定の波形をまとめて生成する
+
+    サンプリングレートごとにクリック音を1度だけ用意し、パターンのコンパイル結果も
+    共有する。BPM・パターン・タイミングが同じで長さだけが違う設定は、最も長いものを
+    1度だけ合成し、短いものにはその先頭部分のコピーを返す（オンセット位置は長さに
+    よらず同じ）。短い方の末尾からはみ出すクリックがある場合は、個別に生成すると
+    そのクリックは書き込まれないため、その設定だけ個別に合成する。いずれの場合も
+    個別に生成した結果と完全に一致する。
+    生成するたびに結果を返すため、呼び出し側は前の結果をエンコードしながら次を待てる。
+
+    Args:
+        specs: bpm, duration, sample_rate, pattern（と省略可能な timing）属性を持つ
+               設定（BatchTask など）のリスト
+        dtype: 合成時の作業用バッファの型（generate_metronome() と同じ）
+
+    Yields:
+        tuple: (設定, 波形データ)。サンプリングレート・パターン・BPMごとにまとめた順に返す
+
+    Raises:
+        ValueError: パターンやタイミングが正しくない場合（生成を始める前に検出する）
+    """
+    # サンプリングレート → (パターン, タイミング, BPM) → 設定のリスト（入力順を保つ）
+    groups = {}
+    for spec in specs:
+        compiled = compile_pattern(spec.pattern)
+        timing = getattr(spec, "timing", "accumulate")
+        if timing not in TIMING_MODES:
+            raise ValueError(f"timing は {' / '.join(TIMING_MODES)} のいずれかを指定してください")
+        key = (compiled.canonical, timing, spec.bpm)
+        by_rate = groups.setdefault(spec.sample_rate, {})
+        by_rate.setdefault(key, (compiled, []))[1].append(spec)
+
+    for sample_rate, by_rate in groups.items():
+        clicks = _make_clicks(sample_rate, dtype)
+        for (_, timing, bpm), (compiled, members) in by_rate.items():
+            longest = max(members, key=lambda spec: spec.duration)
+            wave_data = _render_pattern(
+                bpm, longest.duration, sample_rate, compiled, dtype, timing, clicks
+            )
+            if len(members) > 1:
+                positions, _, _ = _compute_onsets(
+                    bpm, longest.duration, sample_rate, compiled, timing
+                )
+            # 呼び出し側が配列を書き換えても良いように、元の配列は最後に返す
+            for spec in members:
+                if spec is longest:
+                    continue
+                num_samples = count_samples(bpm, spec.duration, sample_rate, compiled, timing)
+                overflow = np.searchsorted(positions, num_samples - clicks.shape[1])
+                if overflow < len(positions) and positions[overflow] < num_samples:
+                    yield (
+                        spec,
+                        _render_pattern(
+                            bpm, spec.duration, sample_rate, compiled, dtype, timing, clicks
+                        ),
+                    )
+                else:
+                    yield spec, wave_data[:num_samples].copy()
+            yield longest, wave_data
+
+
+def render_variants(
+    bpm,
+    duration=60,
+    sample_rates=(22050, 44100, 48000),
+    formats=VARIANT_FORMATS,
+    output_base="metronome",
+    pattern="4beat",
+    timing="accumulate",
+    tempo_map=None,
+    bitrate="192k",
+    workers=None,
+    manifest_file=None,
+    checksums=True,
+):
+    """
+    1つのタイムラインから複数のサンプリングレート・形式のファイルをまとめて生成する
+
+    オンセットの予定表（各クリックの時刻）を1度だけ計算し、サンプリングレートごとに
+    サンプル位置へ変換して合成する。合成した波形は形式ごとの保存処理（WAVの書き込み、
+    ffmpegによるMP3エンコード）へ並行して渡し、その間に次のサンプリングレートを合成する。
+    各ファイルの内容は generate_metronome() と save_as_wav() / encode_mp3() を
+    個別に呼んだ場合と同じになる。
+
+    出力先は `<output_base>_<sample_rate>hz.<format>`。
+
+    Args:
+        bpm: テンポ（tempo_map を指定する場合は None でよい）
+        duration: 長さ（秒、tempo_map を指定する場合は None でテンポマップの長さ）
+        sample_rates: サンプリングレートのリスト
+        formats: 出力形式のリスト（"wav" / "mp3"）
+        output_base: 出力ファイル名の共通部分（ディレクトリを含めてよい）
+        pattern: リズムパターン
+        timing: クリック位置の計算方法（"accumulate" または "exact"）
+        tempo_map: テンポマップ（generate_metronome() と同じ）
+        bitrate: MP3のビットレート
+        workers: 同時に実行する保存処理の数（None ならCPU数、最大4）
+        manifest_file: マニフェストをJSONで保存するファイル名（None なら保存しない）
+        checksums: 出力ファイルの SHA-256 をマニフェストに含めるか（読み直す分だけ遅くなる）
+
+    Returns:
+        dict: マニフェスト。生成の設定と、出力ファイルごとの path, format, sample_rate,
+        samples, seconds, bytes, sha256（checksums=False なら None）のリスト（sample_rates × formats の順）
+
+    Raises:
+        ValueError: 形式・パターン・タイミングが正しくない場合
+        CouldntEncodeError: ffmpegがエンコードに失敗した場合（他の出力の完了を待ってから送出）
+    """
+    for format in formats:
+        if format not in VARIANT_FORMATS:
+            raise ValueError(f"形式は {' / '.join(VARIANT_FORMATS)} のいずれかを指定してください")
+    compiled = compile_pattern(pattern)
+    schedule = _compute_schedule(bpm, duration, compiled, timing, tempo_map)
+
+    directory = os.path.dirname(output_base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    futures = []
+    with ThreadPoolExecutor(workers or min(4, os.cpu_count() or 1)) as executor:
+        for sample_rate in sample_rates:
+            positions, variants, total_samples = _sample_schedule(schedule, sample_rate)
+            clicks = _make_clicks(sample_rate)
+            wave_data = None
+            if tempo_map is None:
+                wave_data = _render_tiled(
+                    total_samples, positions, variants, clicks, compiled.sounding_steps
+                )
+            if wave_data is None:
+                wave_data = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+
+            for format in formats:
+                output_file = f"{output_base}_{sample_rate}hz.{format}"
+                futures.append(
+                    executor.submit(
+                        _save_variant,
+                        wave_data,
+                        sample_rate,
+                        format,
+                        output_file,
+                        bitrate,
+                        checksums,
+                    )
+                )
+        outputs = [future.result() for future in futures]
+
+    manifest = {
+        "bpm": bpm,
+        "duration": duration,
+        "pattern": compiled.canonical,
+        "timing": timing,
+        "tempo_map": None if tempo_map is None else parse_tempo_map(tempo_map).canonical,
+        "outputs": outputs,
+    }
+    if manifest_file is not None:
+        with _atomic_output(manifest_file) as temp_filename:
+            with open(temp_filename, "w") as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def _save_variant(wave_data, sample_rate, format, output_file, bitrate, checksum):
+    """1つの出力を保存し、マニフェストの項目を返す（ワーカースレッドで実行）"""
+    if format == "wav":
+        save_as_wav(wave_data, sample_rate, output_file)
+    else:
+        encode_mp3(wave_data, sample_rate, output_file, bitrate=bitrate)
+
+    entry = {
+        "path": output_file,
+        "format": format,
+        "sample_rate": sample_rate,
+        "samples": len(wave_data),
+        "seconds": len(wave_data) / sample_rate,
+        "bytes": os.path.getsize(output_file),
+        "sha256": file_sha256(output_file) if checksum else None,
+    }
+    if format == "mp3":
+        entry["bitrate"] = bitrate
+    return entry
+
+
+def _render_task_isolated(task, cache):
+    """タスクを実行し、例外は文字列として返す（他のタスクを止めない）"""
+    try:
+        cached = render_task(task, cache)
+    except Exception as e:
+        return BatchResult(task, f"{type(e).__name__}: {e}")
+    return BatchResult(task, cached=cached)
+
+
+def run_batch(tasks, jobs=None, cache=None):
+    """
+    タスクを並列に実行し、完了した順に結果を返す
+
+    1つのタスクが失敗しても残りのタスクは続行される。
+
+    Args:
+        tasks: BatchTask のリスト
+        jobs: 並列ワーカー数（None ならCPU数、1 ならプロセスを起動せず逐次実行）
+        cache: RenderCache（None ならキャッシュを使わない）
+
+    Yields:
+        BatchResult: 各タスクの結果
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _render_task_isolated(task, cache)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        futures = {executor.submit(_render_task_isolated, task, cache): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # ワーカープロセス自体が異常終了した場合など
+                yield BatchResult(futures[future], f"{type(e).__name__}: {e}")
@@ -0,0 +1,226 @@
+"""生成済みファイルのキャッシュ（内容アドレス方式）"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from . import __version__
+from .patterns import canonicalize
+from .tempo import parse_tempo_map
+
+# キャッシュの保存先を指定する環境変数
+CACHE_DIR_ENV = "METRONOME_CACHE_DIR"
+
+# キャッシュの合計サイズ上限（デフォルト: 1GB）
+DEFAULT_CACHE_BYTES = 1024**3
+
+
+def default_cache_dir():
+    """
+    キャッシュの保存先を取得する
+
+    環境変数 METRONOME_CACHE_DIR、XDG_CACHE_HOME/metronome、~/.cache/metronome の順に使う。
+    """
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "metronome")
+
+
+def render_spec(
+    bpm,
+    duration,
+    sample_rate,
+    pattern,
+    format="mp3",
+    bitrate="192k",
+    timing="accumulate",
+    tempo_map=None,
+):
+    """
+    出力ファイルの内容を決めるパラメータ一式を作成する
+
+    クリック音の設定とライブラリのバージョンも含むため、
+    生成ロジックが変わると別のキーになる。
+
+    Returns:
+        dict: キャッシュキーの元になる設定
+    """
+    # core は NumPy を読み込むため、キャッシュのオプション解析だけなら読み込まない
+    from .core import CLICK_DURATION, CLICK_FREQUENCIES
+
+    spec = {
+        "bpm": bpm,
+        "duration": duration,
+        "sample_rate": sample_rate,
+        # 名前ではなく正規化した記法をキーにする（定義が変われば別のキーになる）
+        "pattern": canonicalize(pattern),
+        "timing": timing,
+        "format": format,
+        "click_frequencies": sorted(CLICK_FREQUENCIES.items()),
+        "click_duration": CLICK_DURATION,
+        "version": __version__,
+    }
+    if format == "mp3":
+        spec["bitrate"] = bitrate
+    if tempo_map is not None:
+        spec["tempo_map"] = parse_tempo_map(tempo_map).canonical
+    return spec
+
+
+class RenderCache:
+    """
+    生成済みファイルをパラメータのハッシュをキーとして保存するキャッシュ
+
+    合計サイズが上限を超えると、最後に使われた時刻が古いものから削除する。
+    合計サイズは最初の登録時に1度だけ数え、以降は登録したファイルの分を加算して追跡する
+    （上限を超えた時だけディレクトリ全体を調べ直す）。
+    複数プロセスから同じディレクトリを同時に使用できる。
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            directory: キャッシュの保存先（None なら default_cache_dir()）
+            max_bytes: キャッシュの合計サイズ上限（バイト）
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # キャッシュの合計サイズの見積もり（None は未計測）
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(spec):
+        """設定からキャッシュキー（SHA-256）を計算する"""
+        canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path(self, key, suffix):
+        """キーに対応するキャッシュファイルのパス"""
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def fetch(self, key, output_file):
+        """
+        キャッシュにあれば出力先へコピーする
+
+        Args:
+            key: キャッシュキー
+            output_file: 出力ファイル名（拡張子でキャッシュファイルを区別する）
+
+        Returns:
+            bool: キャッシュにあった場合 True
+        """
+        cached = self.path(key, os.path.splitext(output_file)[1])
+        try:
+            _copy_atomic(cached, output_file)
+            # 最終使用時刻を更新（削除順の判定に使う）
+            os.utime(cached)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, source_file):
+        """
+        生成したファイルをキャッシュに登録し、上限を超えた分を削除する
+
+        Args:
+            key: キャッシュキー
+            source_file: 登録するファイル
+        """
+        cached = self.path(key, os.path.splitext(source_file)[1])
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        try:
+            replaced = os.path.getsize(cached)
+        except FileNotFoundError:
+            replaced = 0
+        _copy_atomic(source_file, cached)
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += os.path.getsize(cached) - replaced
+            over = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """合計サイズが上限以下になるまで古いファイルから削除する"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("."):
+                    # 書き込み中の一時ファイル
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+    def info(self):
+        """
+        キャッシュの統計情報を取得する
+
+        Returns:
+            dict: hits, misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def cached_save(cache, spec, output_file, save):
+    """
+    キャッシュにあればコピーし、なければ生成して登録する
+
+    Args:
+        cache: RenderCache（None ならキャッシュを使わない）
+        spec: render_spec() で作成した設定
+        output_file: 出力ファイル名
+        save: 出力ファイル名を受け取って生成・保存する関数
+
+    Returns:
+        bool: キャッシュを使った場合 True
+    """
+    if cache is None:
+        save(output_file)
+        return False
+
+    key = cache.key(spec)
+    if cache.fetch(key, output_file):
+        return True
+
+    save(output_file)
+    try:
+        cache.store(key, output_file)
+    except OSError:
+        # キャッシュに書き込めなくても出力自体は成功している
+        pass
+    return False
+
+
+def _copy_atomic(source, destination):
+    """一意な一時ファイルへコピーしてからリネームする"""
+    # io は NumPy を読み込むため、使う時に読み込む
+    from .io import _atomic_output
+
+    with _atomic_output(destination) as temp:
+        shutil.copyfile(source, temp)
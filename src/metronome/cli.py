@@ -1,13 +1,43 @@
 """コマンドラインインターフェース"""
 
 import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
 
-from .core import generate_metronome
-from .io import save_as_mp3
+# NumPy・SciPy・pydub を読み込むモジュールは、引数の解析後に各関数の中で読み込む
+# （--help や引数エラーの応答を速くするため）
+from .cache import DEFAULT_CACHE_BYTES, RenderCache, cached_save, render_spec
+from .manifest import VERIFY_MODES, parse_bpm_range
+from .patterns import PATTERNS, TIMING_MODES, canonicalize
+from .profiling import Profile
+from .tempo import parse_tempo_map
 
+PATTERN_NAMES = {"4beat": "4つ打ち", "4to8": "4→8パターン"}
 
-def main():
+# play / serve のデフォルト値（NumPy を読み込まずに --help を表示できるよう、
+# playback・server の DEFAULT_* と同じ値をここにも持つ）
+PLAY_DEFAULTS = {"block_size": 256, "buffer_blocks": 8}
+SERVE_DEFAULTS = {"host": "127.0.0.1", "port": 8765, "queue_chunks": 8, "max_duration": 600}
+
+
+def main(argv=None):
     """メインエントリーポイント"""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # サブコマンド
+    if argv and argv[0] == "batch":
+        return batch_main(argv[1:])
+    if argv and argv[0] == "build":
+        return build_main(argv[1:])
+    if argv and argv[0] == "play":
+        return play_main(argv[1:])
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
+
     parser = argparse.ArgumentParser(
         description="4つ打ちメトロノーム音声生成ツール",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -16,11 +46,32 @@ def main():
   uv run python -m metronome.cli --bpm 120
   uv run python -m metronome.cli --bpm 140 --output my_metronome.mp3
   uv run python -m metronome.cli -b 100 -o practice.mp3
+  uv run python -m metronome.cli --tempo-map "160@4 160-300@10m 300@4" -o ramp.mp3
+
+一括生成:
+  uv run python -m metronome.cli batch --help
+
+ジョブファイルによる差分生成:
+  uv run python -m metronome.cli build --help
+
+リアルタイム再生:
+  uv run python -m metronome.cli play --help
+
+HTTPサーバー:
+  uv run python -m metronome.cli serve --help
         """,
     )
 
+    parser.add_argument("-b", "--bpm", type=int, help="テンポ（Beats Per Minute）例: 120")
+
     parser.add_argument(
-        "-b", "--bpm", type=int, required=True, help="テンポ（Beats Per Minute）例: 120"
+        "--tempo-map",
+        type=_parse_tempo_map,
+        default=None,
+        help="テンポマップ（--bpm の代わりに指定）。空白区切りの「テンポ@長さ」の列\n"
+        "120@8: 8小節一定、160-300@96: 96小節かけて直線的に加速、\n"
+        "160~300@10m: 10分かけて指数的に加速、160>300@15: 15小節で段階的に変化\n"
+        "長さは小節数（パターンの1サイクル。4beat は4拍、4to8 は8拍）、または s（秒）/ m（分）付きの時間",
     )
 
     parser.add_argument(
@@ -36,49 +87,698 @@ def main():
     )
 
     parser.add_argument(
-        "--duration", type=int, default=60, help="音声の長さ（秒）（デフォルト: 60秒）"
+        "--duration",
+        type=int,
+        default=None,
+        help="音声の長さ（秒）（デフォルト: 60秒、--tempo-map ではテンポマップの長さ）",
     )
 
     parser.add_argument(
         "--pattern",
-        type=str,
+        type=_parse_pattern,
         default="4beat",
-        choices=["4beat", "4to8"],
         help="リズムパターン（デフォルト: 4beat）\n"
         "4beat: 通常の4つ打ち\n"
-        "4to8: 4つ打ち2小節→8つ打ち1小節（12拍1サイクル）",
+        "4to8: 4つ打ち2拍→8つ打ち2拍を2回（8拍1サイクル）\n"
+        'またはパターン記法（例: "A x x/2 x/2 . x"、A=アクセント x=通常 .=休符）',
+    )
+
+    parser.add_argument(
+        "--timing",
+        type=str,
+        default="accumulate",
+        choices=list(TIMING_MODES),
+        help="クリック位置の計算方法（デフォルト: accumulate）\n"
+        "accumulate: 従来どおり（長時間では最大1サンプル程度の誤差）\n"
+        "exact: 拍番号から直接計算（誤差0.5サンプル以下）",
     )
 
-    args = parser.parse_args()
+    _add_loop_arguments(parser)
+    _add_cache_arguments(parser)
+    _add_profile_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    if (args.bpm is None) == (args.tempo_map is None):
+        parser.error("--bpm と --tempo-map のどちらか一方を指定してください")
+    if args.loop:
+        if args.tempo_map is not None:
+            parser.error("--loop は --tempo-map と組み合わせられません")
+        return _save_loop(args)
+    if args.tempo_map is None:
+        duration = 60 if args.duration is None else args.duration
+        tempo = str(args.bpm)
+        bpms = (args.bpm,)
+    else:
+        duration = args.duration
+        tempo = args.tempo_map.canonical
+        bpms = (args.tempo_map.start_bpm, args.tempo_map.end_bpm)
 
     # BPMの妥当性チェック
-    if args.bpm < 20 or args.bpm > 300:
+    if min(bpms) < 20 or max(bpms) > 300:
         print("警告: BPMは通常20〜300の範囲です")
 
-    pattern_name = "4つ打ち" if args.pattern == "4beat" else "4→8パターン"
+    pattern_name = PATTERN_NAMES.get(args.pattern, args.pattern)
+    length = "テンポマップの長さ" if duration is None else f"{duration}秒"
 
     print("メトロノーム音声を生成中...")
-    print(f"  BPM: {args.bpm}")
-    print(f"  長さ: {args.duration}秒")
+    print(f"  BPM: {tempo}")
+    print(f"  長さ: {length}")
     print(f"  パターン: {pattern_name}")
     print(f"  サンプリングレート: {args.sample_rate} Hz")
 
-    # メトロノーム音声を生成
-    wave_data = generate_metronome(
-        bpm=args.bpm,
-        duration_seconds=args.duration,
-        sample_rate=args.sample_rate,
-        pattern=args.pattern,
-    )
+    from .core import generate_metronome
+    from .io import mp3_filename, save_as_mp3
 
-    # MP3として保存
-    output_file = save_as_mp3(wave_data, args.sample_rate, args.output, args.bpm)
+    def save(output_file):
+        # メトロノーム音声を生成
+        wave_data = generate_metronome(
+            bpm=args.bpm,
+            duration_seconds=duration,
+            sample_rate=args.sample_rate,
+            pattern=args.pattern,
+            timing=args.timing,
+            tempo_map=args.tempo_map,
+        )
+
+        # MP3として保存
+        save_as_mp3(wave_data, args.sample_rate, output_file)
+
+    output_file = mp3_filename(args.output, args.bpm)
+    spec = render_spec(
+        args.bpm,
+        duration,
+        args.sample_rate,
+        args.pattern,
+        timing=args.timing,
+        tempo_map=args.tempo_map,
+    )
+    with _profiled(args.profile):
+        cached = cached_save(_make_cache(args), spec, output_file, save)
 
     print(f"\n✓ メトロノーム音声を保存しました: {output_file}")
-    print(f"  - BPM: {args.bpm}")
-    print(f"  - 長さ: {args.duration}秒")
+    if cached:
+        print("  （キャッシュから取得）")
+    print(f"  - BPM: {tempo}")
+    print(f"  - 長さ: {length}")
     print(f"  - パターン: {pattern_name}")
 
 
+def _add_cache_arguments(parser):
+    """キャッシュ関連のオプションを追加する"""
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="キャッシュの保存先（デフォルト: $METRONOME_CACHE_DIR または ~/.cache/metronome）",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_BYTES // 1024**2,
+        help=f"キャッシュの上限（MB）（デフォルト: {DEFAULT_CACHE_BYTES // 1024**2}）",
+    )
+
+    parser.add_argument("--no-cache", action="store_true", help="キャッシュを使わずに毎回生成する")
+
+
+def _add_loop_arguments(parser):
+    """ループの書き出しのオプションを追加する"""
+    group = parser.add_argument_group("ループの書き出し")
+    group.add_argument(
+        "--loop",
+        action="store_true",
+        help="全体の代わりに、継ぎ目なく繰り返せる最短の区間をWAVで書き出す\n"
+        "（ループポイントは smpl チャンクと .loop.json に保存、--duration は使わない）",
+    )
+    group.add_argument(
+        "--max-cycles",
+        type=int,
+        default=None,
+        help="ループに含めるサイクル数の上限。完全なループがこれより長い場合は\n"
+        "テンポをごくわずかに丸めて短くする（デフォルト: 上限なし）",
+    )
+
+
+def _save_loop(args):
+    """--loop: 最短のループ区間を保存する"""
+    from .loop import save_loop
+
+    output_file = args.output or f"metronome_bpm{args.bpm}_loop.wav"
+    try:
+        output_file, info = save_loop(
+            args.bpm, output_file, args.sample_rate, args.pattern, args.max_cycles
+        )
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+
+    print(f"✓ ループを保存しました: {output_file}")
+    print(f"  - 長さ: {info.seconds:.3f}秒（{info.cycles}サイクル、{info.samples}サンプル）")
+    if not info.exact:
+        print(f"  - ループ内のテンポ: {float(info.loop_bpm):.6f} BPM")
+    return 0
+
+
+def _batch_loops(args, bpms):
+    """batch --loop: BPM × パターン × サンプリングレートごとに最短のループ区間を保存する"""
+    from .batch import DEFAULT_SAMPLE_RATE
+    from .loop import save_loop
+
+    failed = 0
+    total_bytes = 0
+    start = time.perf_counter()
+    for pattern in args.pattern:
+        os.makedirs(os.path.join(args.output_dir, pattern), exist_ok=True)
+        for bpm in bpms:
+            for sample_rate in args.sample_rate:
+                filename = f"metronome_bpm{bpm:03d}_loop"
+                if sample_rate != DEFAULT_SAMPLE_RATE:
+                    filename += f"_{sample_rate}hz"
+                output_file = os.path.join(args.output_dir, pattern, filename + ".wav")
+                try:
+                    output_file, info = save_loop(
+                        bpm, output_file, sample_rate, pattern, args.max_cycles
+                    )
+                except ValueError as e:
+                    failed += 1
+                    print(f"✗ {output_file}: {e}")
+                    continue
+                total_bytes += os.path.getsize(output_file)
+                print(f"✓ {output_file}（{info.seconds:.3f}秒、{info.cycles}サイクル）")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n完了！合計 {total_bytes / 1e6:.1f}MB（{elapsed:.1f}秒）")
+    return 1 if failed else 0
+
+
+def _add_profile_argument(parser):
+    """--profile オプションを追加する"""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="JSON",
+        help="処理段ごとの所要時間・書き込み量・配列のサイズを表示する"
+        "（ファイル名を指定するとJSONで保存）",
+    )
+
+
+@contextmanager
+def _profiled(target):
+    """
+    --profile の指定に応じて with 文の間を計測し、結果を表示または保存する
+
+    Args:
+        target: None なら計測しない、"-" なら表形式で表示、それ以外はJSONの保存先
+    """
+    if target is None:
+        yield
+        return
+
+    with Profile() as profile:
+        yield
+    if target == "-":
+        print(f"\n{profile.summary()}")
+    else:
+        with open(target, "w") as f:
+            json.dump(profile.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"\nプロファイルを保存しました: {target}")
+
+
+def _make_cache(args):
+    """コマンドライン引数からキャッシュを作成する"""
+    if args.no_cache:
+        return None
+    return RenderCache(args.cache_dir, max_bytes=args.cache_size * 1024**2)
+
+
+def _parse_pattern(value):
+    """パターン名またはパターン記法を検証する"""
+    try:
+        canonicalize(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return value
+
+
+def _parse_tempo_map(value):
+    """--tempo-map の値を TempoMap に変換する"""
+    try:
+        return parse_tempo_map(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _parse_bpm_range(value):
+    """START:END[:STEP] 形式のBPM範囲を解析する（END を含む）"""
+    try:
+        return parse_bpm_range(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def batch_main(argv):
+    """一括生成サブコマンド"""
+    parser = argparse.ArgumentParser(
+        prog="metronome batch",
+        description="BPM範囲×パターン×長さ×サンプリングレートのメトロノームを一括生成",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  uv run python -m metronome.cli batch --bpm-range 160:300:10 --pattern 4beat 4to8
+  uv run python -m metronome.cli batch --bpm-range 190:270:10 --jobs 8 -o out
+  uv run python -m metronome.cli batch --bpm 120 140 --duration 30 60 --sample-rate 48000
+  uv run python -m metronome.cli batch --bpm-range 160:300:10 --pipeline --encoders 4
+        """,
+    )
+
+    parser.add_argument(
+        "--bpm-range",
+        type=_parse_bpm_range,
+        action="append",
+        default=[],
+        metavar="START:END[:STEP]",
+        help="BPM範囲（END を含む、複数指定可）例: 160:300:10",
+    )
+
+    parser.add_argument("--bpm", type=int, nargs="+", default=[], help="個別のBPM（複数指定可）")
+
+    parser.add_argument(
+        "--pattern",
+        type=str,
+        nargs="+",
+        default=["4beat"],
+        choices=list(PATTERNS),
+        help="リズムパターン（複数指定可、デフォルト: 4beat）",
+    )
+
+    parser.add_argument(
+        "--duration", type=int, nargs="+", default=[60], help="音声の長さ（秒）（デフォルト: 60秒）"
+    )
+
+    parser.add_argument(
+        "--sample-rate",
+        type=int,
+        nargs="+",
+        default=[44100],
+        help="サンプリングレート（デフォルト: 44100 Hz）",
+    )
+
+    parser.add_argument(
+        "--bitrate", type=str, default="192k", help="MP3のビットレート（デフォルト: 192k）"
+    )
+
+    parser.add_argument(
+        "--timing",
+        type=str,
+        default="accumulate",
+        choices=list(TIMING_MODES),
+        help="クリック位置の計算方法（デフォルト: accumulate）",
+    )
+
+    parser.add_argument(
+        "-o", "--output-dir", type=str, default="mp3", help="出力ディレクトリ（デフォルト: mp3）"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="並列ワーカー数（デフォルト: CPU数）"
+    )
+
+    pipeline = parser.add_argument_group("パイプライン処理（合成とエンコードを並行させる）")
+    pipeline.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="プロセスプールの代わりに合成段とエンコード段のパイプラインで生成する",
+    )
+    pipeline.add_argument(
+        "--render-workers", type=int, default=1, help="合成ワーカー数（デフォルト: 1）"
+    )
+    pipeline.add_argument(
+        "--encoders", type=int, default=None, help="エンコードワーカー数（デフォルト: CPU数）"
+    )
+    pipeline.add_argument(
+        "--queue-size",
+        type=int,
+        default=4,
+        help="合成段とエンコード段の間で待たせる波形の数（デフォルト: 4）",
+    )
+
+    _add_loop_arguments(parser)
+    _add_cache_arguments(parser)
+    _add_profile_argument(parser)
+
+    args = parser.parse_args(argv)
+    if args.profile and not args.pipeline and args.jobs != 1:
+        # 子プロセスで計測した結果は集められない
+        parser.error("--profile は --pipeline または --jobs 1 と組み合わせて指定してください")
+
+    from .batch import expand_tasks, run_batch
+
+    # 重複を除いて昇順に並べる
+    bpms = sorted(set(args.bpm).union(*args.bpm_range))
+    if not bpms:
+        parser.error("--bpm-range または --bpm を指定してください")
+    if args.loop:
+        return _batch_loops(args, bpms)
+
+    tasks = expand_tasks(
+        bpms,
+        patterns=args.pattern,
+        durations=args.duration,
+        sample_rates=args.sample_rate,
+        output_dir=args.output_dir,
+        bitrate=args.bitrate,
+        timing=args.timing,
+    )
+    total = len(tasks)
+
+    print(f"\n{'=' * 60}")
+    print(f"BPM {bpms[0]}〜{bpms[-1]} のメトロノームを一括生成します")
+    print(f"パターン: {', '.join(PATTERN_NAMES[p] for p in args.pattern)}")
+    print(f"合計: {total}ファイル")
+    print(f"出力先: {args.output_dir}/")
+    print(f"{'=' * 60}\n")
+
+    cache = _make_cache(args)
+    executor = None
+    if args.pipeline:
+        from .pipeline import BatchPipeline
+
+        try:
+            executor = BatchPipeline(
+                render_workers=args.render_workers,
+                encode_workers=args.encoders,
+                queue_size=args.queue_size,
+                cache=cache,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        results = executor.run(tasks)
+    else:
+        results = run_batch(tasks, jobs=args.jobs, cache=cache)
+
+    start = time.perf_counter()
+    failed = 0
+    hits = 0
+    with _profiled(args.profile):
+        for idx, result in enumerate(results, 1):
+            output_file = result.task.output_file
+            if result.error:
+                failed += 1
+                print(f"[{idx}/{total}] ✗ {output_file}: {result.error}")
+            elif result.cached:
+                hits += 1
+                print(f"[{idx}/{total}] ✓ {output_file}（キャッシュ）")
+            else:
+                print(f"[{idx}/{total}] ✓ {output_file}")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'=' * 60}")
+    print(f"完了！{total - failed}/{total}個のファイルを生成しました（{elapsed:.1f}秒）")
+    if cache is not None:
+        print(f"キャッシュ: ヒット {hits} / ミス {total - failed - hits}")
+    if executor is not None:
+        print(f"\n{executor.timings.summary()}")
+    print(f"{'=' * 60}\n")
+
+    return 1 if failed else 0
+
+
+def build_main(argv):
+    """ジョブファイルによる差分生成サブコマンド"""
+    parser = argparse.ArgumentParser(
+        prog="metronome build",
+        description="ジョブファイルの出力のうち、ない・設定が変わった・壊れたものだけを生成",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+ジョブファイルの例（catalog.toml）:
+  output_dir = "mp3"
+  bpm_range = ["160:300:10"]
+  patterns = ["4beat", "4to8"]
+  durations = [60]
+  formats = ["mp3", "wav"]
+
+使用例:
+  uv run python -m metronome.cli build catalog.toml
+  uv run python -m metronome.cli build catalog.json --encoders 4
+  uv run python -m metronome.cli build catalog.yaml --dry-run
+        """,
+    )
+
+    parser.add_argument("job", type=str, help="ジョブファイル（.json / .toml / .yaml）")
+    parser.add_argument(
+        "--state",
+        type=str,
+        default=None,
+        help="状態ファイル（デフォルト: <output_dir>/.metronome-build.json）",
+    )
+    parser.add_argument(
+        "--verify",
+        type=str,
+        default="checksum",
+        choices=list(VERIFY_MODES),
+        help="既存の出力の確認方法（デフォルト: checksum）\n"
+        "checksum: サイズとSHA-256を確認、size: サイズのみ確認",
+    )
+    parser.add_argument("--force", action="store_true", help="全ての出力を生成し直す")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="生成が必要な出力を表示するだけで生成しない"
+    )
+    parser.add_argument(
+        "--render-workers", type=int, default=1, help="合成ワーカー数（デフォルト: 1）"
+    )
+    parser.add_argument(
+        "--encoders", type=int, default=None, help="エンコードワーカー数（デフォルト: CPU数）"
+    )
+    _add_cache_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    from .manifest import build, check_job, load_job
+
+    try:
+        job = load_job(args.job)
+    except (OSError, ValueError, ImportError) as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    if args.dry_run:
+        checked = check_job(job, args.state, args.verify, args.force)
+        outdated = [(entry, reason) for entry, reason in checked if reason is not None]
+        for entry, reason in outdated:
+            print(f"{reason:<8} {entry.task.output_file}")
+        print(f"\n生成が必要: {len(outdated)}/{len(checked)}個")
+        return 0
+
+    counts = {"up-to-date": 0, "built": 0, "failed": 0}
+    try:
+        results = build(
+            job,
+            state_file=args.state,
+            render_workers=args.render_workers,
+            encode_workers=args.encoders,
+            verify=args.verify,
+            force=args.force,
+            cache=_make_cache(args),
+        )
+        for result in results:
+            counts[result.status] += 1
+            output_file = result.entry.task.output_file
+            if result.status == "built":
+                print(f"✓ {output_file}（{result.reason}）")
+            elif result.status == "failed":
+                print(f"✗ {output_file}: {result.error}")
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    print(
+        f"\n完了！生成 {counts['built']} / 最新 {counts['up-to-date']} / "
+        f"失敗 {counts['failed']}（全{total}個、{elapsed:.1f}秒）"
+    )
+    return 1 if counts["failed"] else 0
+
+
+def play_main(argv):
+    """リアルタイム再生サブコマンド"""
+    parser = argparse.ArgumentParser(
+        prog="metronome play",
+        description="メトロノームをリアルタイムに再生（デバイス出力には sounddevice が必要）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  uv run python -m metronome.cli play -b 120
+  uv run python -m metronome.cli play -b 180 --pattern 4to8 --block-size 128
+  uv run python -m metronome.cli play -b 120 --duration 10 --output take.wav
+        """,
+    )
+
+    parser.add_argument(
+        "-b", "--bpm", type=int, required=True, help="テンポ（Beats Per Minute）例: 120"
+    )
+
+    parser.add_argument(
+        "--pattern",
+        type=_parse_pattern,
+        default="4beat",
+        help="リズムパターン（デフォルト: 4beat）、またはパターン記法",
+    )
+
+    parser.add_argument(
+        "--sample-rate", type=int, default=44100, help="サンプリングレート（デフォルト: 44100 Hz）"
+    )
+
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="再生する長さ（秒）（デフォルト: Ctrl+C まで）",
+    )
+
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=PLAY_DEFAULTS["block_size"],
+        help=f"1回のコールバックのサンプル数（デフォルト: {PLAY_DEFAULTS['block_size']}）",
+    )
+
+    parser.add_argument(
+        "--buffer-blocks",
+        type=int,
+        default=PLAY_DEFAULTS["buffer_blocks"],
+        help=f"リングバッファのブロック数（デフォルト: {PLAY_DEFAULTS['buffer_blocks']}）",
+    )
+
+    sink = parser.add_mutually_exclusive_group()
+    sink.add_argument(
+        "-o", "--output", type=str, default=None, help="デバイスの代わりにWAVファイルへ書き出す"
+    )
+    sink.add_argument(
+        "--null", action="store_true", help="デバイスの代わりに出力を破棄する（動作確認用）"
+    )
+
+    args = parser.parse_args(argv)
+
+    # BPMの妥当性チェック
+    if args.bpm < 20 or args.bpm > 300:
+        parser.error("BPMは20〜300の範囲で指定してください")
+    if (args.output or args.null) and args.duration is None:
+        parser.error("--output / --null では --duration を指定してください")
+
+    from .playback import DeviceSink, FileSink, NullSink, PlaybackEngine
+
+    try:
+        engine = PlaybackEngine(
+            args.bpm,
+            args.pattern,
+            sample_rate=args.sample_rate,
+            block_size=args.block_size,
+            buffer_blocks=args.buffer_blocks,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output:
+        sink = FileSink(args.output)
+    elif args.null:
+        sink = NullSink()
+    else:
+        sink = DeviceSink()
+
+    latency_ms = engine.ring.capacity / args.sample_rate * 1000
+    print(f"BPM {args.bpm} で再生します（バッファ {latency_ms:.1f}ms）")
+    try:
+        sink.run(engine, args.duration)
+    except KeyboardInterrupt:
+        pass
+    except ImportError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+
+    info = engine.info()
+    print(f"小節: {info['bars']} / アンダーラン: {info['underruns']}")
+    if args.output:
+        print(f"✓ {args.output} を保存しました")
+    return 0
+
+
+def serve_main(argv):
+    """HTTPサーバーサブコマンド"""
+    parser = argparse.ArgumentParser(
+        prog="metronome serve",
+        description="メトロノーム音声をHTTPで返すサーバーを起動",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用例:
+  uv run python -m metronome.cli serve --port 8765 --workers 4
+
+リクエスト例:
+  curl -o click.wav "http://127.0.0.1:8765/render?bpm=120&duration=30"
+  curl -o click.mp3 -d '{"bpm": 180, "pattern": "4to8", "format": "mp3"}' \\
+       http://127.0.0.1:8765/render
+  curl http://127.0.0.1:8765/health
+        """,
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=SERVE_DEFAULTS["host"],
+        help=f"待ち受けるホスト（デフォルト: {SERVE_DEFAULTS['host']}）",
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=SERVE_DEFAULTS["port"],
+        help=f"待ち受けるポート（デフォルト: {SERVE_DEFAULTS['port']}）",
+    )
+
+    parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="生成ワーカー数（デフォルト: CPU数、最大4）"
+    )
+
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="同時に受け付けるリクエスト数（超えると503、デフォルト: ワーカー数の2倍）",
+    )
+
+    parser.add_argument(
+        "--queue-chunks",
+        type=int,
+        default=SERVE_DEFAULTS["queue_chunks"],
+        help=f"1リクエストあたりの送信待ちブロック数（デフォルト: {SERVE_DEFAULTS['queue_chunks']}）",
+    )
+
+    parser.add_argument(
+        "--max-duration",
+        type=int,
+        default=SERVE_DEFAULTS["max_duration"],
+        help=f"生成できる長さの上限（秒）（デフォルト: {SERVE_DEFAULTS['max_duration']}）",
+    )
+
+    parser.add_argument("--quiet", action="store_true", help="アクセスログを出力しない")
+
+    args = parser.parse_args(argv)
+
+    from .server import RenderService, serve
+
+    service = RenderService(
+        workers=args.workers,
+        max_requests=args.max_requests,
+        queue_chunks=args.queue_chunks,
+        max_duration=args.max_duration,
+    )
+    print(f"http://{args.host}:{args.port}/ で待ち受けます（Ctrl+C で終了）")
+    serve(args.host, args.port, service=service, quiet=args.quiet)
+    return 0
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,6 +1,34 @@
 """メトロノーム音声生成のコアロジック"""
 
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from fractions import Fraction
+
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from . import profiling
+from .patterns import CLICK_ACCENT, CLICK_NORMAL, REST, TIMING_MODES, compile_pattern
+from .tempo import parse_tempo_map
+
+# クリック音の設定（種類ごとの周波数[Hz]と、共通の長さ[秒]）
+CLICK_FREQUENCIES = {CLICK_NORMAL: 800, CLICK_ACCENT: 1600}
+CLICK_DURATION = 0.05
+
+# 合成時の作業用バッファの型
+# float64: 従来どおりの基準となる経路
+# float32: 作業用メモリが半分。クリック音を float32 に丸めるため ±1 LSB の差が出ることがある
+# int32: クリック音を16ビットの値に変換してから整数で加算。クリック同士が重ならなければ
+#        float64 と完全に一致し、重なる場合は重なり1つあたり ±1 LSB の差が出ることがある
+SYNTH_DTYPES = (np.float64, np.float32, np.int32)
+
+# ストリーミング生成時の1ブロックあたりのサンプル数（デフォルト）
+DEFAULT_CHUNK_SAMPLES = 65536
+
+# タイリング時に探索する繰り返し単位（サイクル数）の上限
+_MAX_TILE_CYCLES = 64
 
 
 def generate_click_sound(sample_rate=44100, frequency=1000, duration=0.05):
@@ -31,7 +59,112 @@ def generate_click_sound(sample_rate=44100, frequency=1000, duration=0.05):
     return wave
 
 
-def generate_metronome(bpm, duration_seconds=60, sample_rate=44100, pattern="4beat"):
+class ClickBank:
+    """
+    生成済みクリック音のキャッシュ（LRU方式）
+
+    (sample_rate, frequency, duration) ごとに波形を1度だけ生成し、
+    読み取り専用の配列として使い回す。スレッドセーフ。
+    """
+
+    def __init__(self, maxsize=32):
+        """
+        Args:
+            maxsize: 保持するクリック音の最大数（超えると最も古いものから破棄）
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize は1以上を指定してください")
+        self._maxsize = maxsize
+        self._clicks = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        """保持するクリック音の最大数"""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if value < 1:
+            raise ValueError("maxsize は1以上を指定してください")
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    def get(self, sample_rate=44100, frequency=1000, duration=0.05):
+        """
+        クリック音を取得する（未生成なら生成してキャッシュする）
+
+        Args:
+            sample_rate: サンプリングレート (Hz)
+            frequency: クリック音の周波数 (Hz)
+            duration: クリック音の長さ (秒)
+
+        Returns:
+            numpy.ndarray: 読み取り専用のクリック音の波形データ
+        """
+        key = (sample_rate, frequency, duration)
+        with self._lock:
+            click = self._clicks.get(key)
+            if click is not None:
+                self._clicks.move_to_end(key)
+                self.hits += 1
+                return click
+            self.misses += 1
+
+        click = generate_click_sound(sample_rate, frequency, duration)
+        click.flags.writeable = False
+
+        with self._lock:
+            # 別スレッドが先に登録していればそちらを使う
+            click = self._clicks.setdefault(key, click)
+            self._clicks.move_to_end(key)
+            self._evict()
+        return click
+
+    def info(self):
+        """
+        キャッシュの統計情報を取得する
+
+        Returns:
+            dict: hits, misses, size, maxsize
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._clicks),
+                "maxsize": self._maxsize,
+            }
+
+    def clear(self):
+        """キャッシュと統計情報をリセットする"""
+        with self._lock:
+            self._clicks.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self):
+        while len(self._clicks) > self._maxsize:
+            self._clicks.popitem(last=False)
+
+
+# パターン生成で共有するクリックバンク
+click_bank = ClickBank()
+
+
+def generate_metronome(
+    bpm,
+    duration_seconds=60,
+    sample_rate=44100,
+    pattern="4beat",
+    dtype=np.float64,
+    timing="accumulate",
+    out=None,
+    tempo_map=None,
+):
     """
     メトロノームの音声データを生成する
 
@@ -39,35 +172,205 @@ def generate_metronome(bpm, duration_seconds=60, sample_rate=44100, pattern="4be
         bpm: テンポ（Beats Per Minute）
         duration_seconds: 生成する音声の長さ（秒）
         sample_rate: サンプリングレート (Hz)
-        pattern: リズムパターン（"4beat" or "4to8"）
+        pattern: リズムパターン（"4beat" or "4to8"、パターン記法、または CompiledPattern）
                  "4beat": 通常の4つ打ち
-                 "4to8": 4つ打ち2小節→8つ打ち1小節（12拍1サイクル）
+                 "4to8": 4つ打ち2拍→8つ打ち2拍を2回（8拍1サイクル）
+                 パターン記法は patterns.parse_pattern() を参照
+        dtype: 合成時の作業用バッファの型（np.float64, np.float32, np.int32）
+               float32/int32 は作業用メモリが少ない代わりに ±1 LSB の差が出ることがある
+        timing: オンセット位置の計算方法（"accumulate" or "exact"）
+                "accumulate": 従来どおりの浮動小数点の逐次加算（長時間では誤差が蓄積する）
+                "exact": 拍番号から有理数で直接計算（誤差 0.5 サンプル以下、蓄積なし）
+        out: 結果を書き込む16ビット整数の配列（io.memmap_output() の np.memmap など）。
+             長さは count_samples() と同じにする。指定するとブロック単位で合成して
+             直接書き込むため、作業用メモリは長さによらず一定になる
+        tempo_map: テンポマップ（tempo.parse_tempo_map() の記法または TempoMap）。
+                   指定すると bpm と timing は使わず、テンポの変化に沿って各クリックの時刻を
+                   閉じた式で計算する。duration_seconds が None ならテンポマップの長さ
 
     Returns:
-        numpy.ndarray: メトロノームの波形データ（16ビット整数）
+        numpy.ndarray: メトロノームの波形データ（16ビット整数、out を指定した場合は out）
+
+    Raises:
+        ValueError: パターンが正しくない場合、または out の型・長さが正しくない場合
     """
-    if pattern == "4to8":
-        return _generate_4to8_pattern(bpm, duration_seconds, sample_rate)
-    else:
-        return _generate_4beat_pattern(bpm, duration_seconds, sample_rate)
+    if out is not None:
+        return _render_into(
+            out, bpm, duration_seconds, sample_rate, pattern, dtype, timing, tempo_map
+        )
+    return _render_pattern(
+        bpm, duration_seconds, sample_rate, pattern, dtype, timing, tempo_map=tempo_map
+    )
+
+
+def iter_metronome_chunks(
+    bpm,
+    duration_seconds=60,
+    sample_rate=44100,
+    pattern="4beat",
+    chunk_samples=DEFAULT_CHUNK_SAMPLES,
+    dtype=np.float64,
+    timing="accumulate",
+    tempo_map=None,
+):
+    """
+    メトロノームの音声データをブロック単位で生成する
+
+    全体の波形をメモリ上に確保せず、固定長の16ビット整数ブロックを順に返す。
+    連結すると generate_metronome() の結果と完全に一致する。
+
+    Args:
+        bpm: テンポ（Beats Per Minute）
+        duration_seconds: 生成する音声の長さ（秒）
+        sample_rate: サンプリングレート (Hz)
+        pattern: リズムパターン（generate_metronome() と同じ）
+        chunk_samples: 1ブロックあたりのサンプル数（最後のブロックのみ短くなる）
+        dtype: 合成時の作業用バッファの型（generate_metronome() と同じ）
+        timing: オンセット位置の計算方法（generate_metronome() と同じ）
+        tempo_map: テンポマップ（generate_metronome() と同じ）
+
+    Yields:
+        numpy.ndarray: 波形データのブロック（16ビット整数）
+    """
+    if chunk_samples < 1:
+        raise ValueError("chunk_samples は1以上を指定してください")
+
+    positions, variants, total_samples = _compute_onsets(
+        bpm, duration_seconds, sample_rate, pattern, timing, tempo_map
+    )
+    clicks = _make_clicks(sample_rate, dtype)
+    for _, chunk in _iter_mixed_chunks(total_samples, positions, variants, clicks, chunk_samples):
+        yield chunk
+
+
+def count_samples(
+    bpm,
+    duration_seconds=60,
+    sample_rate=44100,
+    pattern="4beat",
+    timing="accumulate",
+    tempo_map=None,
+):
+    """
+    generate_metronome() が返す波形のサンプル数を計算する（波形は生成しない）
+
+    Args:
+        bpm: テンポ（Beats Per Minute）
+        duration_seconds: 生成する音声の長さ（秒）
+        sample_rate: サンプリングレート (Hz)
+        pattern: リズムパターン（generate_metronome() と同じ）
+        timing: オンセット位置の計算方法（generate_metronome() と同じ）
+        tempo_map: テンポマップ（generate_metronome() と同じ）
+
+    Returns:
+        int: サンプル数
+    """
+    return _compute_onsets(bpm, duration_seconds, sample_rate, pattern, timing, tempo_map)[2]
 
 
-def _generate_4beat_pattern(bpm, duration_seconds, sample_rate):
+def _generate_4beat_pattern(bpm, duration_seconds, sample_rate, dtype=np.float64):
     """通常の4つ打ちパターンを生成"""
-    # 1拍の間隔を計算（秒）
-    beat_interval = 60.0 / bpm
+    return _render_pattern(bpm, duration_seconds, sample_rate, "4beat", dtype)
+
+
+def _generate_4to8_pattern(bpm, duration_seconds, sample_rate, dtype=np.float64):
+    """
+    4つ打ち→8つ打ちを2拍ずつ交互に繰り返すパターンを生成
+    1サイクル = 8拍
+    - 1〜2拍目: 4つ打ち（2回）
+    - 3〜4拍目: 8つ打ち（4回、倍速）
+    - 5〜6拍目: 4つ打ち（2回）
+    - 7〜8拍目: 8つ打ち（4回、倍速）
+    """
+    return _render_pattern(bpm, duration_seconds, sample_rate, "4to8", dtype)
+
+
+def _make_clicks(sample_rate, dtype=np.float64):
+    """
+    パターン用のクリック音一式（インデックス = クリックの種類）を取得
+
+    整数型の場合は16ビットの値に変換したもの（従来の変換と同じく0方向へ切り捨て）を返す。
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in SYNTH_DTYPES:
+        raise ValueError(f"サポートされていない dtype です: {dtype}")
+
+    with profiling.stage("clicks") as timer:
+        clicks = np.empty((len(CLICK_FREQUENCIES), int(sample_rate * CLICK_DURATION)))
+        # 通常のクリック音（2〜4拍目用）と頭拍用のクリック音（1拍目用、少し高い音）
+        for variant, frequency in CLICK_FREQUENCIES.items():
+            clicks[variant] = click_bank.get(sample_rate, frequency, CLICK_DURATION)
+
+        if dtype.kind == "i":
+            clicks = (np.clip(clicks, -1.0, 1.0) * 32767).astype(dtype)
+        else:
+            clicks = clicks.astype(dtype, copy=False)
+        timer.array_bytes = clicks.nbytes
+    return clicks
+
+
+def _compute_onsets(
+    bpm, duration_seconds, sample_rate, pattern, timing="accumulate", tempo_map=None
+):
+    """
+    全クリックの開始サンプル位置と種類を配列として計算する
+
+    timing="accumulate" では旧実装の `current_time += interval` による逐次加算と
+    `int(current_time * sample_rate)` による丸めをそのまま再現する。
+    休符のステップは時間だけ進め、結果には含めない。
+
+    Returns:
+        tuple: (開始位置の配列, クリック種類の配列, 総サンプル数)
+    """
+    with profiling.stage("schedule") as timer:
+        schedule = _compute_schedule(bpm, duration_seconds, pattern, timing, tempo_map)
+        positions, variants, total_samples = _sample_schedule(schedule, sample_rate)
+        timer.array_bytes = positions.nbytes + variants.nbytes
+    return positions, variants, total_samples
+
 
-    # 通常のクリック音（2〜4拍目用）
-    click_normal = generate_click_sound(sample_rate, frequency=800)
+@dataclass(frozen=True)
+class _Schedule:
+    """
+    サンプリングレートによらないオンセットの予定表
+
+    Attributes:
+        times: 各ステップの時刻（秒、休符を含む）。timing="exact" では None
+        variants: 各ステップのクリックの種類
+        end: 全体の長さ（秒）
+        rounding: サンプル位置への丸め方（"floor"、"nearest"、または "exact"）
+        exact_args: timing="exact" の場合の (bpm, duration_seconds, CompiledPattern)
+    """
 
-    # 頭拍用のクリック音（1拍目用、少し高い音）
-    click_accent = generate_click_sound(sample_rate, frequency=1600)
+    times: "np.ndarray"
+    variants: "np.ndarray"
+    end: float
+    rounding: str
+    exact_args: tuple = None
 
-    click_samples = len(click_normal)
 
-    # 4拍で1サイクル
-    cycle_beats = 4
-    cycle_duration = beat_interval * cycle_beats
+def _compute_schedule(bpm, duration_seconds, pattern, timing="accumulate", tempo_map=None):
+    """
+    オンセットの予定表を計算する（複数のサンプリングレートで共有できる）
+
+    timing="exact" では位置をサンプリングレートごとに有理数で計算するため、
+    予定表には計算に必要な設定だけを持たせる。
+    """
+    compiled = compile_pattern(pattern)
+    if tempo_map is not None:
+        times, variants, end = _compute_tempo_map_times(
+            parse_tempo_map(tempo_map), duration_seconds, compiled
+        )
+        return _Schedule(times, variants, end, "nearest")
+    if timing == "exact":
+        return _Schedule(None, None, None, "exact", (bpm, duration_seconds, compiled))
+    if timing != "accumulate":
+        raise ValueError(f"timing は {' / '.join(TIMING_MODES)} のいずれかを指定してください")
+
+    beat_interval = 60.0 / bpm
+
+    # 1サイクルの拍数
+    cycle_duration = beat_interval * compiled.cycle_beats
 
     # 指定秒数以上で1サイクル完結するサイクル数を計算
     num_cycles = int(duration_seconds / cycle_duration)
@@ -76,136 +379,360 @@ def _generate_4beat_pattern(bpm, duration_seconds, sample_rate):
 
     # 実際の長さを計算（1サイクル完結）
     actual_duration = num_cycles * cycle_duration
-    total_samples = int(sample_rate * actual_duration)
-
-    # 空の波形を作成
-    metronome_wave = np.zeros(total_samples)
 
-    current_time = 0.0
+    step_intervals = beat_interval * compiled.step_beats
 
-    for cycle in range(num_cycles):
-        for beat in range(4):
-            position = int(current_time * sample_rate)
+    # np.cumsum は先頭から順に加算するため、逐次加算と同じ丸め誤差になる
+    intervals = np.tile(step_intervals, num_cycles)
+    times = np.zeros(len(intervals))
+    np.cumsum(intervals[:-1], out=times[1:])
 
-            # 1拍目は高い音を使用
-            if beat == 0:
-                current_click = click_accent
-            else:
-                current_click = click_normal
+    variants = np.tile(compiled.variants, num_cycles)
+    return _Schedule(times, variants, actual_duration, "floor")
 
-            # 範囲チェック
-            if position + click_samples <= total_samples:
-                metronome_wave[position : position + click_samples] += current_click
-
-            current_time += beat_interval
-
-    # クリッピング防止
-    metronome_wave = np.clip(metronome_wave, -1.0, 1.0)
 
-    # 16ビット整数に変換
-    metronome_wave = (metronome_wave * 32767).astype(np.int16)
+def _sample_schedule(schedule, sample_rate):
+    """
+    予定表をサンプル位置に変換する（休符は取り除く）
 
-    return metronome_wave
+    Returns:
+        tuple: (開始位置の配列, クリック種類の配列, 総サンプル数)
+    """
+    if schedule.rounding == "exact":
+        bpm, duration_seconds, compiled = schedule.exact_args
+        positions, variants, total_samples = _compute_exact_onsets(
+            bpm, duration_seconds, sample_rate, compiled
+        )
+    elif schedule.rounding == "nearest":
+        positions = np.floor(schedule.times * sample_rate + 0.5).astype(np.int64)
+        total_samples = math.floor(schedule.end * sample_rate + 0.5)
+        variants = schedule.variants
+    else:
+        positions = (schedule.times * sample_rate).astype(np.int64)
+        total_samples = int(sample_rate * schedule.end)
+        variants = schedule.variants
+    return _drop_rests(positions, variants, total_samples)
 
 
-def _generate_4to8_pattern(bpm, duration_seconds, sample_rate):
+def _compute_exact_onsets(bpm, duration_seconds, sample_rate, compiled):
     """
-    4つ打ち→8つ打ちを2拍ずつ交互に繰り返すパターンを生成
-    1サイクル = 8拍
-    - 1〜2拍目: 4つ打ち（2回）
-    - 3〜4拍目: 8つ打ち（4回、倍速）
-    - 5〜6拍目: 4つ打ち（2回）
-    - 7〜8拍目: 8つ打ち（4回、倍速）
+    各オンセットの位置を拍番号から有理数で直接計算する
+
+    サイクル k のステップ j の位置は (k * サイクル長 + ステップの開始拍) * 60 * sample_rate / bpm
+    を最も近い整数に丸めたもの。誤差は蓄積せず、常に 0.5 サンプル以下。
     """
-    # 1拍の間隔を計算（秒）
-    beat_interval = 60.0 / bpm
+    bpm = Fraction(bpm)
+    duration = Fraction(duration_seconds)
 
-    # 通常のクリック音（2〜4拍目用）
-    click_normal = generate_click_sound(sample_rate, frequency=800)
+    # 全ステップの長さを共通の分母 units_per_beat の整数で表す
+    units_per_beat = math.lcm(*(beats.denominator for beats in compiled.step_fractions))
+    step_units = [int(beats * units_per_beat) for beats in compiled.step_fractions]
+    offset_units = np.cumsum([0] + step_units[:-1], dtype=np.int64)
+    cycle_units = sum(step_units)
 
-    # 頭拍用のクリック音（1拍目用、少し高い音）
-    click_accent = generate_click_sound(sample_rate, frequency=1600)
+    # 指定秒数以上で1サイクル完結するサイクル数を計算
+    cycle_seconds = Fraction(cycle_units, units_per_beat) * 60 / bpm
+    num_cycles = math.ceil(duration / cycle_seconds)
 
-    click_samples = len(click_normal)
+    # 1単位あたりのサンプル数（有理数）
+    samples_per_unit = Fraction(60 * sample_rate) / (bpm * units_per_beat)
+    numerator = samples_per_unit.numerator
+    denominator = samples_per_unit.denominator
 
-    # 8拍で1サイクル
-    cycle_beats = 8
-    cycle_duration = beat_interval * cycle_beats
+    units = np.arange(num_cycles, dtype=np.int64)[:, np.newaxis] * cycle_units + offset_units
+    units = units.ravel()
 
-    # 指定秒数以上で1サイクル完結するサイクル数を計算
-    num_cycles = int(duration_seconds / cycle_duration)
-    if duration_seconds % cycle_duration > 0:
-        num_cycles += 1  # 余りがある場合は1サイクル追加
+    # 四捨五入: floor((2 * units * numerator + denominator) / (2 * denominator))
+    largest = num_cycles * cycle_units
+    if 2 * largest * numerator + denominator >= 2**63:
+        # int64 に収まらない場合は Python の整数で計算する
+        units = units.astype(object)
+    positions = ((2 * units * numerator + denominator) // (2 * denominator)).astype(np.int64)
+    total_samples = int((2 * largest * numerator + denominator) // (2 * denominator))
 
-    # 実際の長さを計算（1サイクル完結）
-    actual_duration = num_cycles * cycle_duration
-    total_samples = int(sample_rate * actual_duration)
+    variants = np.tile(compiled.variants, num_cycles)
+    return positions, variants, total_samples
 
-    # 空の波形を作成
-    metronome_wave = np.zeros(total_samples)
 
-    current_time = 0.0
+def _round_half_up(value):
+    """有理数を最も近い整数に丸める（0.5は切り上げ）"""
+    return (2 * value.numerator + value.denominator) // (2 * value.denominator)
 
-    for cycle in range(num_cycles):
-        # セグメント1: 4つ打ち2拍（2回）
-        for beat in range(2):
-            position = int(current_time * sample_rate)
 
-            # 1拍目にアクセント
-            if beat == 0:
-                current_click = click_accent
-            else:
-                current_click = click_normal
+def _compute_tempo_map_times(tempo_map, duration_seconds, compiled):
+    """
+    テンポマップに沿って各ステップの時刻を計算する
 
-            if position + click_samples <= total_samples:
-                metronome_wave[position : position + click_samples] += current_click
+    各ステップの拍の位置を TempoMap.beat_times() で時刻に変換する（サンプル位置には
+    最も近いサンプルに丸める）。長さは固定テンポと同じく、指定秒数以上で1サイクル完結する
+    サイクル数にする（duration_seconds が None ならテンポマップの終わりを含むサイクルまで）。
 
-            current_time += beat_interval
+    Returns:
+        tuple: (各ステップの時刻の配列, クリック種類の配列, 全体の長さ[秒])
+    """
+    cycle_beats = compiled.cycle_beats
+    map_beats = tempo_map.total_beats(cycle_beats)
+    if duration_seconds is None:
+        num_cycles = max(1, math.ceil(map_beats / cycle_beats - 1e-9))
+    else:
+        # テンポマップの後は最後のテンポのまま続くため、必要なサイクル数の上限を求めて探す
+        extra_seconds = max(0.0, duration_seconds - tempo_map.total_seconds(cycle_beats))
+        limit = math.ceil((map_beats + extra_seconds * tempo_map.end_bpm / 60) / cycle_beats) + 1
+        boundaries = tempo_map.beat_times(np.arange(limit + 1) * cycle_beats, cycle_beats)
+        num_cycles = max(1, int(np.searchsorted(boundaries, duration_seconds, side="left")))
 
-        # セグメント2: 8つ打ち4つ（2拍分、倍速）
-        half_interval = beat_interval / 2
-        for beat in range(4):
-            position = int(current_time * sample_rate)
+    offsets = np.concatenate([[0.0], np.cumsum(compiled.step_beats[:-1])])
+    beats = (np.arange(num_cycles)[:, np.newaxis] * cycle_beats + offsets).ravel()
+    times = tempo_map.beat_times(np.append(beats, num_cycles * cycle_beats), cycle_beats)
 
-            # 8つ打ちは全て通常音
-            current_click = click_normal
+    variants = np.tile(compiled.variants, num_cycles)
+    return times[:-1], variants, float(times[-1])
 
-            if position + click_samples <= total_samples:
-                metronome_wave[position : position + click_samples] += current_click
 
-            current_time += half_interval
+def _drop_rests(positions, variants, total_samples):
+    """休符のステップをオンセット表から取り除く"""
+    sounding = variants != REST
+    if not np.all(sounding):
+        positions = positions[sounding]
+        variants = variants[sounding]
+    return positions, variants, total_samples
 
-        # セグメント3: 4つ打ち2拍（2回）
-        for beat in range(2):
-            position = int(current_time * sample_rate)
 
-            # 1拍目にアクセント
-            if beat == 0:
-                current_click = click_accent
-            else:
-                current_click = click_normal
+def _iter_mixed_chunks(total_samples, positions, variants, clicks, chunk_samples):
+    """
+    オンセット表から chunk_samples ずつ合成する
 
-            if position + click_samples <= total_samples:
-                metronome_wave[position : position + click_samples] += current_click
+    Yields:
+        tuple: (ブロックの開始サンプル位置, 16ビット整数のブロック)
+    """
+    click_samples = clicks.shape[1]
+
+    # 末尾からはみ出すクリックは書き込まない
+    in_range = positions + click_samples <= total_samples
+    positions = positions[in_range]
+    variants = variants[in_range]
+
+    buffer = np.empty(chunk_samples, dtype=clicks.dtype)
+    for chunk_start in range(0, total_samples, chunk_samples):
+        chunk_end = min(chunk_start + chunk_samples, total_samples)
+        chunk = buffer[: chunk_end - chunk_start]
+        chunk.fill(0)
+
+        # このブロックにかかるクリック（前のブロックから続くものを含む）
+        first = np.searchsorted(positions, chunk_start - click_samples, side="right")
+        last = np.searchsorted(positions, chunk_end, side="left")
+        for position, variant in zip(positions[first:last], variants[first:last]):
+            begin = max(position, chunk_start)
+            end = min(position + click_samples, chunk_end)
+            chunk[begin - chunk_start : end - chunk_start] += clicks[variant][
+                begin - position : end - position
+            ]
+
+        yield chunk_start, _to_int16(chunk)
+
+
+def _render_into(out, bpm, duration_seconds, sample_rate, pattern, dtype, timing, tempo_map=None):
+    """出力先の配列へブロック単位で合成して書き込む（作業用メモリは1ブロック分）"""
+    positions, variants, total_samples = _compute_onsets(
+        bpm, duration_seconds, sample_rate, pattern, timing, tempo_map
+    )
+    if out.dtype != np.int16 or out.ndim != 1:
+        raise ValueError(f"out には16ビット整数の1次元配列を指定してください: {out.dtype}")
+    if len(out) != total_samples:
+        raise ValueError(
+            f"out の長さが正しくありません: {len(out)}（必要なサンプル数: {total_samples}）"
+        )
+
+    clicks = _make_clicks(sample_rate, dtype)
+    with profiling.stage("render.chunks"):
+        for start, chunk in _iter_mixed_chunks(
+            total_samples, positions, variants, clicks, DEFAULT_CHUNK_SAMPLES
+        ):
+            out[start : start + len(chunk)] = chunk
+    return out
+
+
+def _render_clicks(total_samples, positions, variants, clicks):
+    """
+    クリックを波形バッファへまとめて書き込む
 
-            current_time += beat_interval
+    Args:
+        total_samples: 出力の総サンプル数
+        positions: 各クリックの開始サンプル位置（昇順）
+        variants: 各クリックの種類（clicks の行インデックス）
+        clicks: クリック波形の2次元配列（種類 × サンプル）
 
-        # セグメント4: 8つ打ち4つ（2拍分、倍速）
-        for beat in range(4):
-            position = int(current_time * sample_rate)
+    Returns:
+        numpy.ndarray: clicks と同じ型の波形データ
+    """
+    metronome_wave = np.zeros(total_samples, dtype=clicks.dtype)
+    click_samples = clicks.shape[1]
+
+    # 末尾からはみ出すクリックは書き込まない
+    in_range = positions + click_samples <= total_samples
+    positions = positions[in_range]
+    variants = variants[in_range]
+
+    if len(positions) == 0:
+        return metronome_wave
+
+    if np.any(np.diff(positions) < click_samples):
+        # クリック同士が重なる場合は加算順序を保つため逐次加算
+        for position, variant in zip(positions, variants):
+            metronome_wave[position : position + click_samples] += clicks[variant]
+        return metronome_wave
+
+    # 重なりがなければ 0 + click == click なので一括代入で同じ結果になる。
+    # 各行が1クリック分の窓になるビューを作り、種類ごとにまとめて代入する
+    step = metronome_wave.strides[0]
+    windows = as_strided(
+        metronome_wave,
+        shape=(total_samples - click_samples + 1, click_samples),
+        strides=(step, step),
+    )
+    for variant in np.unique(variants):
+        windows[positions[variants == variant]] = clicks[variant]
 
-            # 8つ打ちは全て通常音
-            current_click = click_normal
+    return metronome_wave
 
-            if position + click_samples <= total_samples:
-                metronome_wave[position : position + click_samples] += current_click
 
-            current_time += half_interval
+def _to_int16(metronome_wave):
+    """合成した波形をクリッピングして16ビット整数に変換（入力バッファを上書きする）"""
+    if metronome_wave.dtype.kind == "i":
+        # 整数で合成した波形は既に16ビットの値なのでクリッピングのみ
+        np.clip(metronome_wave, -32767, 32767, out=metronome_wave)
+        return metronome_wave.astype(np.int16)
 
     # クリッピング防止
-    metronome_wave = np.clip(metronome_wave, -1.0, 1.0)
+    np.clip(metronome_wave, -1.0, 1.0, out=metronome_wave)
 
     # 16ビット整数に変換
-    metronome_wave = (metronome_wave * 32767).astype(np.int16)
+    metronome_wave *= 32767
+    return metronome_wave.astype(np.int16)
+
+
+def _render_pattern(
+    bpm,
+    duration_seconds,
+    sample_rate,
+    pattern,
+    dtype=np.float64,
+    timing="accumulate",
+    clicks=None,
+    tempo_map=None,
+):
+    """
+    パターンのオンセット表を計算し、一括でレンダリングする
 
-    return metronome_wave
+    clicks には _make_clicks() の結果を渡して使い回せる（None なら取得する）。
+    テンポマップではサイクルの形が毎回変わるため、タイリングせずに1回で合成する。
+    """
+    positions, variants, total_samples = _compute_onsets(
+        bpm, duration_seconds, sample_rate, pattern, timing, tempo_map
+    )
+    if clicks is None:
+        clicks = _make_clicks(sample_rate, dtype)
+
+    if tempo_map is None:
+        steps_per_cycle = compile_pattern(pattern).sounding_steps
+        # タイリングではサイクルごとの配置と16ビット整数への変換を合わせて計測する
+        with profiling.stage("render.tiled") as timer:
+            tiled = _render_tiled(total_samples, positions, variants, clicks, steps_per_cycle)
+            if tiled is not None:
+                timer.array_bytes = tiled.nbytes
+        if tiled is not None:
+            return tiled
+
+    with profiling.stage("render.place") as timer:
+        metronome_wave = _render_clicks(total_samples, positions, variants, clicks)
+        timer.array_bytes = metronome_wave.nbytes
+    with profiling.stage("render.int16") as timer:
+        wave_data = _to_int16(metronome_wave)
+        timer.array_bytes = wave_data.nbytes
+    return wave_data
+
+
+def _find_period(grid):
+    """
+    サンプル単位で完全に繰り返す最小のサイクル数を探す
+
+    Args:
+        grid: サイクル × ステップのオンセット位置
+
+    Returns:
+        tuple: (繰り返しサイクル数, 繰り返し単位のサンプル数)。見つからなければ None
+    """
+    for cycles in range(1, min(len(grid), _MAX_TILE_CYCLES + 1)):
+        shift = grid[cycles:] - grid[:-cycles]
+        if np.all(shift == shift[0, 0]):
+            return cycles, int(shift[0, 0])
+    return None
+
+
+def _render_tiled(total_samples, positions, variants, clicks, steps_per_cycle):
+    """
+    1サイクル分（または完全に繰り返す数サイクル分）だけ合成し、並べて全体を作る
+
+    浮動小数点の逐次加算による丸めでサイクルの形がずれる場合は、
+    同じ形のサイクルごとにテンプレートを1回だけ合成して使い回す。
+    クリック同士が重なる場合は None を返す（通常の経路で合成する）。
+
+    Returns:
+        numpy.ndarray: 16ビット整数の波形データ、または None
+    """
+    click_samples = clicks.shape[1]
+    if len(positions) == 0 or np.any(np.diff(positions) < click_samples):
+        return None
+
+    grid = positions.reshape(-1, steps_per_cycle)
+    cycle_variants = variants[:steps_per_cycle]
+    starts = grid[:, 0]
+    ends = np.append(starts[1:], total_samples)
+
+    # 最終サイクルはクリックが末尾からはみ出す可能性があるため通常どおり合成する
+    body = len(grid) - 1
+    out = np.empty(total_samples, dtype=np.int16)
+    # 先頭が休符のパターンでは最初のクリックまで無音
+    out[: starts[0]] = 0
+
+    done = 0
+    period = _find_period(grid[:body])
+    if period is not None:
+        cycles, period_samples = period
+        # 繰り返し単位は最初のクリック（先頭の休符の後）から始まる
+        first = starts[0]
+        template = _to_int16(
+            _render_clicks(
+                period_samples,
+                grid[:cycles].ravel() - first,
+                np.tile(cycle_variants, cycles),
+                clicks,
+            )
+        )
+        repeats = body // cycles
+        # 周期は grid[:body] の中でしか確認していないため、最後の繰り返しの終わりが
+        # 最終サイクルの先頭とずれる場合は1回減らす（残りはサイクルの形ごとに合成する）
+        if first + repeats * period_samples != starts[repeats * cycles]:
+            repeats -= 1
+        tiles = out[first : first + repeats * period_samples]
+        tiles.reshape(repeats, period_samples)[:] = template
+        done = repeats * cycles
+
+    if done < body:
+        relative = grid[done:body] - starts[done:body, np.newaxis]
+        lengths = ends[done:body] - starts[done:body]
+        shapes, inverse = np.unique(
+            np.column_stack([relative, lengths]), axis=0, return_inverse=True
+        )
+        templates = [
+            _to_int16(_render_clicks(shape[-1], shape[:-1], cycle_variants, clicks))
+            for shape in shapes
+        ]
+        for start, length, shape_index in zip(starts[done:body], lengths, inverse.ravel()):
+            out[start : start + length] = templates[shape_index]
+
+    last = starts[body]
+    out[last:] = _to_int16(
+        _render_clicks(total_samples - last, grid[body] - last, cycle_variants, clicks)
+    )
+    return out
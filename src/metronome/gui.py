@@ -4,8 +4,10 @@ import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
+from .cache import RenderCache, cached_save, render_spec
 from .core import generate_metronome
-from .io import save_as_mp3
+from .io import mp3_filename, save_as_mp3
+from .patterns import PATTERNS
 
 
 class MetronomeGUI:
@@ -22,6 +24,9 @@ class MetronomeGUI:
         # 生成中フラグ
         self.is_generating = False
 
+        # 生成済みファイルのキャッシュ
+        self.cache = RenderCache()
+
         self._create_widgets()
 
     def _create_widgets(self):
@@ -108,7 +113,7 @@ class MetronomeGUI:
         pattern_combo = ttk.Combobox(
             main_frame,
             textvariable=self.pattern_var,
-            values=["4beat", "4to8"],
+            values=list(PATTERNS),
             state="readonly",
             width=15,
         )
@@ -222,17 +227,21 @@ class MetronomeGUI:
 
     def _generate_audio_thread(self, bpm, duration, sample_rate, pattern, output_file):
         """音声生成を実行（スレッド内）"""
-        try:
+
+        def save(filename):
             # メトロノーム音声を生成
             wave_data = generate_metronome(
                 bpm=bpm, duration_seconds=duration, sample_rate=sample_rate, pattern=pattern
             )
 
             # MP3として保存
-            if not output_file:
-                output_file = None
+            save_as_mp3(wave_data, sample_rate, filename)
 
-            saved_file = save_as_mp3(wave_data, sample_rate, output_file, bpm)
+        try:
+            # キャッシュにあれば再生成せずにコピーする
+            saved_file = mp3_filename(output_file or None, bpm)
+            spec = render_spec(bpm, duration, sample_rate, pattern)
+            cached_save(self.cache, spec, saved_file, save)
 
             # UIを更新（メインスレッドで実行）
             self.root.after(0, self._generation_complete, saved_file, None)
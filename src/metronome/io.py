@@ -1,60 +1,710 @@
 """ファイル入出力処理"""
 
 import os
+import struct
+import subprocess
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 
-from pydub import AudioSegment
-from scipy.io import wavfile
+import numpy as np
 
+from . import profiling
 
-def save_as_wav(wave_data, sample_rate, output_filename):
+# pydub（MP3エンコード）は使う時に読み込む（WAVの保存では読み込まない）
+
+# RIFFのサイズ欄（32ビット）に書ける最大値。これを超えるファイルは RF64 形式にする
+_RIFF_MAX_BYTES = 2**32 - 1
+
+# RF64 の ds64 チャンクの本体（RIFFサイズ・dataサイズ・サンプル数・テーブル長）
+_DS64_BODY_BYTES = 28
+
+# smpl チャンク（ループ1つ）の本体のバイト数
+_SMPL_BODY_BYTES = 36 + 24
+
+# EncoderPool が1回のffmpegの起動でまとめてエンコードするファイル数のデフォルト
+DEFAULT_ENCODE_BATCH = 16
+
+
+def save_as_wav(wave_data, sample_rate, output_filename, rf64=False, loop=None):
     """
     波形データをWAVファイルとして保存する
 
+    ブロックのイテラブル（iter_metronome_chunks() の戻り値など）を渡すと、
+    全体をメモリに載せずに少しずつ書き込む。
+
     Args:
-        wave_data: 波形データ
+        wave_data: 16ビット整数のモノラル波形データ、またはそのブロックのイテラブル
         sample_rate: サンプリングレート
         output_filename: 出力ファイル名
+        rf64: 4GBを超える場合に RF64 形式で保存する（False なら ValueError）
+        loop: ループ区間 (開始サンプル, 終了サンプル)（終了は含まない）。
+              指定すると smpl チャンクにループポイントを書き込む
+
+    Returns:
+        str: 保存されたファイル名
+
+    Raises:
+        ValueError: 16ビット整数以外のデータ、または rf64=False で4GBを超える場合
     """
     if not output_filename.endswith(".wav"):
         output_filename += ".wav"
 
-    wavfile.write(output_filename, sample_rate, wave_data)
+    with profiling.stage("wav.write") as timer:
+        with _atomic_output(output_filename) as temp_filename:
+            with WavWriter(temp_filename, sample_rate, rf64=rf64, loop=loop) as writer:
+                writer.write(wave_data)
+        if timer:
+            timer.bytes = os.path.getsize(output_filename)
     return output_filename
 
 
-def save_as_mp3(wave_data, sample_rate, output_filename=None, bpm=None):
+class WavWriter:
+    """
+    16ビットモノラルPCMのWAVファイルを少しずつ書き込む
+
+    ヘッダのサイズ欄は close() の時に書き換える。rf64=True の場合は ds64 チャンク用の
+    領域（JUNKチャンク）を確保しておき、4GBを超えた場合のみ RF64 形式に切り替える
+    （超えなければ通常のWAVファイルのまま）。loop を指定すると close() の時に
+    data チャンクの後ろへ smpl チャンクを追加する。
+    """
+
+    def __init__(self, file, sample_rate, rf64=False, loop=None):
+        """
+        Args:
+            file: 出力ファイル名、またはシーク可能なバイナリファイルオブジェクト
+            sample_rate: サンプリングレート
+            rf64: 4GBを超える場合に RF64 形式にする（False なら超えた時点で ValueError）
+            loop: ループ区間 (開始サンプル, 終了サンプル)（終了は含まない）
+
+        Raises:
+            ValueError: ループ区間が正しくない場合
+        """
+        if loop is not None:
+            start, end = loop
+            if not 0 <= start < end <= 2**32:
+                raise ValueError(f"ループ区間が正しくありません: {loop}")
+        self.sample_rate = sample_rate
+        self.rf64 = rf64
+        self.loop = loop
+        self.data_bytes = 0
+        self._owns_file = isinstance(file, (str, os.PathLike))
+        self._file = open(file, "wb") if self._owns_file else file
+        self._start = self._file.tell()
+        # サイズが決まるまでは仮のヘッダを書いておく
+        self._file.write(_wav_header(0, sample_rate, rf64))
+
+    @property
+    def num_samples(self):
+        """書き込んだサンプル数"""
+        return self.data_bytes // 2
+
+    def write(self, wave_data):
+        """
+        波形データを追記する
+
+        Args:
+            wave_data: 16ビット整数のモノラル波形データ、またはそのブロックのイテラブル
+
+        Raises:
+            ValueError: 16ビット整数以外のデータ、または rf64=False で4GBを超える場合
+        """
+        if isinstance(wave_data, np.ndarray):
+            wave_data = (wave_data,)
+
+        for chunk in wave_data:
+            chunk = np.asarray(chunk)
+            if chunk.dtype != np.int16:
+                raise ValueError(f"16ビット整数の波形データを指定してください: {chunk.dtype}")
+            data = memoryview(np.ascontiguousarray(chunk, dtype="<i2")).cast("B")
+            if not self.rf64:
+                # 書き込む前に確認し、壊れたファイルを残さない
+                _wav_header(self.data_bytes + len(data), self.sample_rate)
+            self._file.write(data)
+            self.data_bytes += len(data)
+
+    def close(self):
+        """ヘッダのサイズ欄を書き換えて閉じる"""
+        if self._file is None:
+            return
+        try:
+            trailer = b""
+            if self.loop is not None:
+                if self.loop[1] > self.num_samples:
+                    raise ValueError(
+                        f"ループ区間がデータの範囲を超えています: {self.loop}"
+                        f"（サンプル数: {self.num_samples}）"
+                    )
+                trailer = _smpl_chunk(self.sample_rate, *self.loop)
+                self._file.write(trailer)
+            end = self._file.tell()
+            self._file.seek(self._start)
+            self._file.write(
+                _wav_header(self.data_bytes, self.sample_rate, self.rf64, len(trailer))
+            )
+            self._file.seek(end)
+        finally:
+            if self._owns_file:
+                self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def memmap_output(output_filename, num_samples, sample_rate=44100, format="wav", rf64=False):
+    """
+    出力ファイルを先に確保し、波形データ部分を np.memmap として渡す
+
+    generate_metronome(..., out=...) と組み合わせると、全体をメモリに載せずに
+    ファイル上へ直接書き込める。with ブロックを抜けるとディスクへ書き出し、
+    出力ファイル名にリネームする（例外時はファイルを残さない）。
+    マップはブロックを抜ける時に閉じるため、その後は out を参照しないこと。
+    WAVの内容は save_as_wav() で保存したものと同じになる。
+
+        with memmap_output("long.wav", count_samples(120, 3600, 48000), 48000) as out:
+            generate_metronome(120, 3600, 48000, out=out)
+
+    Args:
+        output_filename: 出力ファイル名
+        num_samples: 全体のサンプル数
+        sample_rate: サンプリングレート
+        format: "wav"（ヘッダ付き）または "raw"（16ビットリトルエンディアンのPCMのみ）
+        rf64: 4GBを超えるWAVを RF64 形式で保存する（False なら ValueError）
+
+    Yields:
+        numpy.memmap: 16ビット整数のデータ部分（初期値は無音）
+
+    Raises:
+        ValueError: format が正しくない場合、または rf64=False で4GBを超える場合
+    """
+    if format == "wav":
+        header = _wav_header(num_samples * 2, sample_rate, rf64)
+    elif format == "raw":
+        header = b""
+    else:
+        raise ValueError(f"format は wav または raw を指定してください: {format}")
+
+    with _atomic_output(output_filename) as temp_filename:
+        with open(temp_filename, "wb") as f:
+            f.write(header)
+            # 疎なファイルとして確保する（書き込まれていない部分は0 = 無音）
+            f.truncate(len(header) + num_samples * 2)
+        out = np.memmap(
+            temp_filename, dtype="<i2", mode="r+", offset=len(header), shape=num_samples
+        )
+        try:
+            yield out
+            out.flush()
+        finally:
+            # Windows ではマップを開いたままのファイルをリネーム・削除できないため、
+            # 呼び出し側の参照が残っていても GC を待たずに閉じる
+            out._mmap.close()
+
+
+def save_as_mp3(wave_data, sample_rate, output_filename=None, bpm=None, bitrate="192k"):
     """
     波形データをMP3ファイルとして保存する
 
     Args:
-        wave_data: 波形データ
+        wave_data: 波形データ（16ビット整数の配列、またはそのブロックのイテラブル）
         sample_rate: サンプリングレート
         output_filename: 出力ファイル名
         bpm: BPM値（ファイル名に含める、オプション）
+        bitrate: MP3のビットレート
 
     Returns:
         str: 保存されたファイル名
     """
-    # 一時的にWAVファイルとして保存
-    temp_wav = "temp_metronome.wav"
-    wavfile.write(temp_wav, sample_rate, wave_data)
+    output_filename = mp3_filename(output_filename, bpm)
+
+    # MP3として保存
+    encode_mp3(wave_data, sample_rate, output_filename, bitrate=bitrate)
+
+    return output_filename
+
+
+def mp3_filename(output_filename=None, bpm=None):
+    """
+    MP3の出力ファイル名を決める
 
-    # WAVファイルをMP3に変換
-    audio = AudioSegment.from_wav(temp_wav)
+    Args:
+        output_filename: 指定されたファイル名（None ならデフォルト名）
+        bpm: BPM値（デフォルト名に含める、オプション）
 
+    Returns:
+        str: 拡張子 .mp3 付きのファイル名
+    """
     # ファイル名にBPMを含める
     if not output_filename:
         if bpm:
-            output_filename = f"metronome_bpm{bpm}_1min.mp3"
+            return f"metronome_bpm{bpm}_1min.mp3"
+        return "metronome_1min.mp3"
+    if not output_filename.endswith(".mp3"):
+        return output_filename + ".mp3"
+    return output_filename
+
+
+def encode_mp3(wave_data, sample_rate, output_filename, bitrate="192k"):
+    """
+    波形データをffmpegの標準入力へ直接流し込み、MP3にエンコードする
+
+    一時WAVファイルを経由しないため、ディスクへの書き込みは最終的なMP3のみ。
+    出力は同じディレクトリの一時ファイルに書き出してからリネームするため、
+    並行して呼び出しても書きかけのファイルが見えることはない。
+    ブロックのイテラブル（iter_metronome_chunks() の戻り値など）を渡すと、
+    合成とエンコードが並行して進む。
+
+    Args:
+        wave_data: 16ビット整数のモノラル波形データ、またはそのブロックのイテラブル
+        sample_rate: サンプリングレート
+        output_filename: 出力ファイル名
+        bitrate: MP3のビットレート
+
+    Raises:
+        CouldntEncodeError: ffmpegがエンコードに失敗した場合
+    """
+    with profiling.stage("mp3.encode") as timer:
+        with _atomic_output(output_filename) as temp_filename:
+            _run_encoder(_mp3_command(sample_rate, bitrate) + [temp_filename], wave_data)
+        if timer:
+            timer.bytes = os.path.getsize(output_filename)
+
+
+class EncoderPool:
+    """
+    多数のMP3をまとめてエンコードする常駐ワーカーのプール
+
+    短いファイルではffmpegの起動時間が処理時間の大半を占めるため、同じサンプリングレート・
+    ビットレートのファイルを batch_size 個ずつ集め、1回のffmpegで複数のファイルに出力する
+    （連結したPCMを標準入力へ流し、asplit/atrim で各出力に切り分ける）。
+    出力は1ファイルずつ encode_mp3() でエンコードした場合と同じになる。
+    集めたファイルはワーカースレッドで並行してエンコードする。
+    """
+
+    def __init__(self, workers=None, batch_size=DEFAULT_ENCODE_BATCH, bitrate="192k"):
+        """
+        Args:
+            workers: 同時に起動するffmpegの数（None ならCPU数、最大4）
+            batch_size: 1回のffmpegの起動でエンコードするファイル数
+            bitrate: submit() でビットレートを省略した場合のビットレート
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size は1以上を指定してください: {batch_size}")
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.bitrate = bitrate
+        self._lock = threading.Lock()
+        # (サンプリングレート, ビットレート) → [(波形, ファイル名, Future)]
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="metronome-mp3")
+        self.batches = 0
+
+    def submit(self, wave_data, sample_rate, output_filename=None, bpm=None, bitrate=None):
+        """
+        エンコードを予約する（batch_size 個たまるとエンコードを開始する）
+
+        Args:
+            wave_data: 16ビット整数のモノラル波形データ
+            sample_rate: サンプリングレート
+            output_filename: 出力ファイル名（save_as_mp3() と同じく .mp3 を補う）
+            bpm: BPM値（デフォルトのファイル名に含める、オプション）
+            bitrate: MP3のビットレート（None ならプールのビットレート）
+
+        Returns:
+            concurrent.futures.Future: 結果は保存したファイル名。失敗した場合は
+            CouldntEncodeError（同じバッチのファイルはすべて失敗になる）
+        """
+        item = (np.asarray(wave_data), mp3_filename(output_filename, bpm), Future())
+        key = (sample_rate, bitrate or self.bitrate)
+        with self._lock:
+            batch = self._pending.setdefault(key, [])
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._dispatch(key)
+        return item[2]
+
+    def flush(self):
+        """たまっているファイルのエンコードをすべて開始する"""
+        with self._lock:
+            for key in list(self._pending):
+                self._dispatch(key)
+
+    def close(self):
+        """残りのファイルをエンコードし、完了を待ってワーカーを停止する"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def info(self):
+        """
+        プールの状態を取得する
+
+        Returns:
+            dict: workers, batch_size, pending, batches
+        """
+        with self._lock:
+            pending = sum(len(batch) for batch in self._pending.values())
+        return {
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "pending": pending,
+            "batches": self.batches,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _dispatch(self, key):
+        batch = self._pending.pop(key)
+        self.batches += 1
+        self._executor.submit(self._encode, key, batch)
+
+    def _encode(self, key, batch):
+        """ワーカースレッド: 1バッチ分をエンコードし、各 Future に結果を設定する"""
+        sample_rate, bitrate = key
+        # キャンセルされたファイルを除いてエンコードする
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        futures = [future for _, _, future in batch]
+        try:
+            _encode_mp3_batch(
+                [wave_data for wave_data, _, _ in batch],
+                sample_rate,
+                [filename for _, filename, _ in batch],
+                bitrate,
+            )
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
         else:
-            output_filename = "metronome_1min.mp3"
-    elif not output_filename.endswith(".mp3"):
-        output_filename += ".mp3"
+            for (_, filename, _), future in zip(batch, futures):
+                future.set_result(filename)
 
-    # MP3として保存
-    audio.export(output_filename, format="mp3", bitrate="192k")
 
-    # 一時ファイルを削除
-    os.remove(temp_wav)
+def encode_many(items, bitrate="192k", workers=None, batch_size=DEFAULT_ENCODE_BATCH):
+    """
+    多数の波形をMP3ファイルとして保存する（EncoderPool でまとめてエンコードする）
 
-    return output_filename
+    Args:
+        items: (波形データ, サンプリングレート, 出力ファイル名) のイテラブル
+        bitrate: MP3のビットレート
+        workers: 同時に起動するffmpegの数（None ならCPU数、最大4）
+        batch_size: 1回のffmpegの起動でエンコードするファイル数
+
+    Returns:
+        list: 保存されたファイル名（items と同じ順）
+
+    Raises:
+        CouldntEncodeError: ffmpegがエンコードに失敗した場合（他のファイルの完了を待ってから送出）
+    """
+    with EncoderPool(workers, batch_size, bitrate) as pool:
+        futures = [
+            pool.submit(wave_data, sample_rate, output_filename)
+            for wave_data, sample_rate, output_filename in items
+        ]
+    return [future.result() for future in futures]
+
+
+def iter_wav_bytes(wave_data, sample_rate, num_samples):
+    """
+    WAVファイルの内容をヘッダから順にバイト列として生成する（ストリーミング送信用）
+
+    Args:
+        wave_data: 16ビット整数のモノラル波形データ、またはそのブロックのイテラブル
+        sample_rate: サンプリングレート
+        num_samples: 全体のサンプル数（ヘッダに書き込む）
+
+    Yields:
+        bytes | memoryview: WAVファイルのバイト列
+    """
+    yield _wav_header(num_samples * 2, sample_rate)
+    yield from _iter_pcm_chunks(wave_data)
+
+
+def iter_mp3_bytes(wave_data, sample_rate, bitrate="192k", read_size=65536):
+    """
+    ffmpegでMP3にエンコードし、エンコード済みのバイト列を出力された順に生成する
+
+    PCMの書き込みは別スレッドで行い、ffmpegの出力を読み出した分だけ合成が進む。
+    途中で close() した場合はffmpegを終了させる。
+
+    Args:
+        wave_data: 16ビット整数のモノラル波形データ、またはそのブロックのイテラブル
+        sample_rate: サンプリングレート
+        bitrate: MP3のビットレート
+        read_size: 1回に読み出す最大バイト数
+
+    Yields:
+        bytes: MP3のバイト列
+
+    Raises:
+        CouldntEncodeError: ffmpegがエンコードに失敗した場合
+    """
+    process = subprocess.Popen(
+        _mp3_command(sample_rate, bitrate) + ["pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    errors = []
+
+    def feed():
+        try:
+            for chunk in _iter_pcm_chunks(wave_data):
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # ffmpegが途中で終了した、または読み出し側が close() した
+            pass
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    completed = False
+    try:
+        while True:
+            data = process.stdout.read1(read_size)
+            if not data:
+                break
+            yield data
+        completed = True
+    finally:
+        if not completed:
+            process.kill()
+        process.stdout.close()
+        feeder.join()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+
+    if errors:
+        raise errors[0]
+    if returncode != 0:
+        from pydub.exceptions import CouldntEncodeError
+
+        raise CouldntEncodeError(
+            f"ffmpegによるMP3エンコードに失敗しました（終了コード {returncode}）:\n"
+            + stderr.decode(errors="replace")
+        )
+
+
+def _mp3_command(sample_rate, bitrate):
+    """標準入力のPCMをMP3にエンコードするffmpegのコマンド（出力先は呼び出し側が付加する）"""
+    from pydub import AudioSegment
+
+    return [
+        AudioSegment.converter,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        "1",
+        "-i",
+        "pipe:0",
+        "-f",
+        "mp3",
+        "-b:a",
+        bitrate,
+    ]
+
+
+def _encode_mp3_batch(waves, sample_rate, output_filenames, bitrate):
+    """
+    複数の波形を1回のffmpegの起動でそれぞれのMP3ファイルにエンコードする
+
+    出力は encode_mp3() と同じく一時ファイルに書き出し、成功した場合のみリネームする。
+    """
+    if len(waves) == 1:
+        encode_mp3(waves[0], sample_rate, output_filenames[0], bitrate=bitrate)
+        return
+
+    with profiling.stage("mp3.batch") as timer:
+        with ExitStack() as stack:
+            temp_filenames = [
+                stack.enter_context(_atomic_output(filename)) for filename in output_filenames
+            ]
+            command = _mp3_batch_command(
+                sample_rate, bitrate, [len(wave_data) for wave_data in waves], temp_filenames
+            )
+            _run_encoder(command, waves)
+        if timer:
+            timer.bytes = sum(os.path.getsize(filename) for filename in output_filenames)
+
+
+def _mp3_batch_command(sample_rate, bitrate, lengths, output_filenames):
+    """
+    連結したPCMを各出力に切り分けてMP3にするffmpegのコマンド
+
+    Args:
+        lengths: 各出力のサンプル数（標準入力には先頭から順に連結して書き込む）
+        output_filenames: 出力ファイル名（lengths と同じ順）
+    """
+    command = _mp3_command(sample_rate, bitrate)
+    # 入力までの引数を使い、出力の設定（-f mp3 -b:a ...）は出力ごとに付け直す
+    command = command[: command.index("-i") + 2]
+
+    labels = "".join(f"[s{i}]" for i in range(len(lengths)))
+    filters = [f"[0:a]asplit={len(lengths)}{labels}"]
+    start = 0
+    for i, length in enumerate(lengths):
+        filters.append(
+            f"[s{i}]atrim=start_sample={start}:end_sample={start + length},"
+            f"asetpts=PTS-STARTPTS[a{i}]"
+        )
+        start += length
+    command += ["-filter_complex", ";".join(filters)]
+
+    for i, output_filename in enumerate(output_filenames):
+        command += ["-map", f"[a{i}]", "-f", "mp3", "-b:a", bitrate, output_filename]
+    return command
+
+
+def _wav_header(data_bytes, sample_rate, reserve_ds64=False, trailer_bytes=0):
+    """
+    16ビットモノラルPCMのWAVヘッダ
+
+    reserve_ds64=False なら標準の44バイト。True なら fmt の前に ds64 チャンク用の
+    JUNKチャンクを置き（80バイト）、4GBを超える場合は RF64 形式のヘッダにする。
+    trailer_bytes は data チャンクの後ろに続くチャンク（smpl など）のバイト数。
+
+    Raises:
+        ValueError: reserve_ds64=False で4GBを超える場合
+    """
+    junk = 8 + _DS64_BODY_BYTES if reserve_ds64 else 0
+    riff_bytes = 4 + junk + (8 + 16) + 8 + data_bytes + trailer_bytes
+    fmt = struct.pack(
+        "<4sIHHIIHH",
+        b"fmt ",
+        16,
+        1,  # PCM
+        1,  # モノラル
+        sample_rate,
+        sample_rate * 2,
+        2,
+        16,
+    )
+
+    if riff_bytes <= _RIFF_MAX_BYTES:
+        header = struct.pack("<4sI4s", b"RIFF", riff_bytes, b"WAVE")
+        if reserve_ds64:
+            header += struct.pack("<4sI", b"JUNK", _DS64_BODY_BYTES) + bytes(_DS64_BODY_BYTES)
+        return header + fmt + struct.pack("<4sI", b"data", data_bytes)
+
+    if not reserve_ds64:
+        raise ValueError(
+            f"WAVファイルは4GBを超えられません（{data_bytes}バイト）。"
+            "rf64=True を指定すると RF64 形式で保存できます"
+        )
+    # RF64: 32ビットのサイズ欄は 0xFFFFFFFF とし、実際のサイズは ds64 チャンクに書く
+    ds64 = struct.pack(
+        "<4sIQQQI", b"ds64", _DS64_BODY_BYTES, riff_bytes, data_bytes, data_bytes // 2, 0
+    )
+    return (
+        struct.pack("<4sI4s", b"RF64", 0xFFFFFFFF, b"WAVE")
+        + ds64
+        + fmt
+        + struct.pack("<4sI", b"data", 0xFFFFFFFF)
+    )
+
+
+def _smpl_chunk(sample_rate, start, end):
+    """
+    ループポイントを表す smpl チャンク（前方向の無限ループ1つ）
+
+    dwEnd はループの最後のサンプル（含む）なので end - 1 を書く。
+    """
+    header = struct.pack(
+        "<4sIIIIIIIIII",
+        b"smpl",
+        _SMPL_BODY_BYTES,
+        0,  # メーカー
+        0,  # 製品
+        round(1e9 / sample_rate),  # 1サンプルの長さ（ナノ秒）
+        60,  # 基準のMIDIノート（C4）
+        0,  # ピッチの微調整
+        0,  # SMPTEフォーマット
+        0,  # SMPTEオフセット
+        1,  # ループ数
+        0,  # 追加データのバイト数
+    )
+    loop = struct.pack("<IIIIII", 0, 0, start, end - 1, 0, 0)
+    return header + loop
+
+
+def _run_encoder(command, wave_data):
+    """エンコーダを起動し、標準入力へPCMを書き込んで終了を待つ"""
+    process = subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+    try:
+        try:
+            for chunk in _iter_pcm_chunks(wave_data):
+                process.stdin.write(chunk)
+        finally:
+            process.stdin.close()
+    except BrokenPipeError:
+        # ffmpegが途中で終了した（エラー内容は下で報告する）
+        pass
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    stderr = process.stderr.read()
+    process.stderr.close()
+    if process.wait() != 0:
+        from pydub.exceptions import CouldntEncodeError
+
+        raise CouldntEncodeError(
+            f"ffmpegによるMP3エンコードに失敗しました（終了コード {process.returncode}）:\n"
+            + stderr.decode(errors="replace")
+        )
+
+
+@contextmanager
+def _atomic_output(output_filename):
+    """
+    出力先と同じディレクトリの一意な一時ファイル名を渡し、成功時にリネームする
+
+    失敗時は一時ファイルを削除し、既存の出力ファイルには触れない。
+    """
+    directory, basename = os.path.split(os.path.abspath(output_filename))
+    temp_filename = os.path.join(directory, f".{basename}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp_filename
+        os.replace(temp_filename, output_filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+def _iter_pcm_chunks(wave_data):
+    """波形データ（配列またはブロックのイテラブル）をリトルエンディアンのPCMバイト列にする"""
+    if isinstance(wave_data, np.ndarray):
+        wave_data = (wave_data,)
+
+    for chunk in wave_data:
+        chunk = np.ascontiguousarray(chunk, dtype="<i2")
+        if chunk.size:
+            yield memoryview(chunk).cast("B")
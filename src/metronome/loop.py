@@ -0,0 +1,220 @@
+"""継ぎ目なくループできる最短の区間の書き出し
+
+練習アプリやDAWのテンプレートのようにクリックをループ再生する用途では、60〜600秒の
+ファイルを作らなくても、サンプル単位で完全に繰り返す最短の区間があれば足りる。
+
+1サイクルのサンプル数 sample_rate × 60 × サイクルの拍数 / bpm が整数でない場合は、
+分母の数だけサイクルを並べると整数になる（例: 44100 Hz・4beat・173 BPM では173サイクル）。
+各クリックの位置は timing="exact" と同じく拍番号から有理数で計算するため、ループを
+何回繰り返しても timing="exact" で長く生成した波形と同じ位置にクリックが鳴る。
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from fractions import Fraction
+
+import numpy as np
+
+from .core import (
+    _compute_exact_onsets,
+    _drop_rests,
+    _make_clicks,
+    _render_clicks,
+    _render_tiled,
+    _round_half_up,
+    _to_int16,
+)
+from .io import save_as_wav
+from .patterns import compile_pattern
+
+# max_cycles を指定しない場合に許すループの最大の長さ（秒）
+MAX_EXACT_LOOP_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class LoopInfo:
+    """
+    ループ区間の情報
+
+    Attributes:
+        bpm: 指定したテンポ
+        loop_bpm: ループ内の実際のテンポ（max_cycles で短くした場合のみ bpm とわずかに異なる）
+        sample_rate: サンプリングレート
+        pattern: 正規化したパターン記法
+        cycles: ループに含まれるサイクル数
+        samples: ループのサンプル数
+    """
+
+    bpm: float
+    loop_bpm: Fraction
+    sample_rate: int
+    pattern: str
+    cycles: int
+    samples: int
+
+    @property
+    def exact(self):
+        """指定したテンポのままサンプル単位で完全に繰り返す場合 True"""
+        return self.loop_bpm == Fraction(self.bpm)
+
+    @property
+    def seconds(self):
+        """ループの長さ（秒）"""
+        return self.samples / self.sample_rate
+
+    def to_dict(self):
+        """
+        ループのメタデータ（サイドカーJSONの内容）
+
+        Returns:
+            dict: テンポ・ループ区間（サンプル、終了は含まない）などの辞書
+        """
+        return {
+            "bpm": self.bpm,
+            "loop_bpm": float(self.loop_bpm),
+            "exact": self.exact,
+            "pattern": self.pattern,
+            "sample_rate": self.sample_rate,
+            "cycles": self.cycles,
+            "loop_start": 0,
+            "loop_end": self.samples,
+            "samples": self.samples,
+            "seconds": self.seconds,
+        }
+
+
+def find_loop(bpm, sample_rate=44100, pattern="4beat", max_cycles=None):
+    """
+    サンプル単位で完全に繰り返す最短のループ区間を求める（波形は生成しない）
+
+    max_cycles を指定すると、完全なループがそれより長い場合は max_cycles 以下の
+    サイクル数のうちテンポの誤差が最も小さいものを選び、ループの長さを整数のサンプル数に
+    丸める（ループ内のテンポがわずかに変わる。loop_bpm を参照）。
+
+    Args:
+        bpm: テンポ（Beats Per Minute）
+        sample_rate: サンプリングレート (Hz)
+        pattern: リズムパターン（generate_metronome() と同じ）
+        max_cycles: ループに含めるサイクル数の上限（None なら上限なし）
+
+    Returns:
+        LoopInfo: ループ区間の情報
+
+    Raises:
+        ValueError: パターンが正しくない場合、max_cycles が1未満の場合、
+                    または max_cycles なしで完全なループが長すぎる場合
+    """
+    if max_cycles is not None and max_cycles < 1:
+        raise ValueError(f"max_cycles は1以上を指定してください: {max_cycles}")
+    compiled = compile_pattern(pattern)
+    cycle_beats = sum(compiled.step_fractions, Fraction(0))
+    cycle_samples = Fraction(60 * sample_rate) * cycle_beats / Fraction(bpm)
+
+    cycles = cycle_samples.denominator
+    if max_cycles is None or cycles <= max_cycles:
+        samples = cycle_samples.numerator
+        if max_cycles is None and samples > MAX_EXACT_LOOP_SECONDS * sample_rate:
+            raise ValueError(
+                f"完全に繰り返すループが長すぎます（{samples / sample_rate:.0f}秒）。"
+                "max_cycles を指定してください"
+            )
+        return LoopInfo(bpm, Fraction(bpm), sample_rate, compiled.canonical, cycles, samples)
+
+    # テンポの相対誤差 |丸めた長さ - 正確な長さ| / 正確な長さ が最小のサイクル数（同じなら短い方）
+    def tempo_error(n):
+        exact = n * cycle_samples
+        return abs(_round_half_up(exact) - exact) / exact, n
+
+    cycles = min(range(1, max_cycles + 1), key=tempo_error)
+    samples = _round_half_up(cycles * cycle_samples)
+    loop_bpm = Fraction(60 * sample_rate) * cycle_beats * cycles / samples
+    return LoopInfo(bpm, loop_bpm, sample_rate, compiled.canonical, cycles, samples)
+
+
+def render_loop(bpm, sample_rate=44100, pattern="4beat", max_cycles=None, dtype=np.float64):
+    """
+    最短のループ区間の波形を生成する
+
+    ループの末尾からはみ出すクリックの余韻は先頭に重ねるため、繰り返し再生しても
+    継ぎ目で音が途切れない。
+
+    Args:
+        bpm: テンポ（Beats Per Minute）
+        sample_rate: サンプリングレート (Hz)
+        pattern: リズムパターン（generate_metronome() と同じ）
+        max_cycles: ループに含めるサイクル数の上限（find_loop() を参照）
+        dtype: 合成時の作業用バッファの型（generate_metronome() と同じ）
+
+    Returns:
+        tuple: (16ビット整数の波形データ, LoopInfo)
+    """
+    info = find_loop(bpm, sample_rate, pattern, max_cycles)
+    compiled = compile_pattern(pattern)
+    cycle_beats = sum(compiled.step_fractions, Fraction(0))
+    loop_seconds = info.cycles * cycle_beats * 60 / info.loop_bpm
+    positions, variants, total_samples = _drop_rests(
+        *_compute_exact_onsets(info.loop_bpm, loop_seconds, sample_rate, compiled)
+    )
+    clicks = _make_clicks(sample_rate, dtype)
+    click_samples = clicks.shape[1]
+
+    if len(positions) and positions[-1] + click_samples <= total_samples:
+        # 末尾からはみ出すクリックがなければ通常の合成と同じ
+        wave_data = _render_tiled(
+            total_samples, positions, variants, clicks, compiled.sounding_steps
+        )
+        if wave_data is None:
+            wave_data = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+        return wave_data, info
+
+    # はみ出す分を含めて合成し、はみ出した部分を先頭に重ねる
+    # （ループがクリックより短い場合は何周分も重なる）
+    padded = _render_clicks(total_samples + click_samples, positions, variants, clicks)
+    wave = padded[:total_samples].copy()
+    for start in range(total_samples, len(padded), total_samples):
+        tail = padded[start : start + total_samples]
+        wave[: len(tail)] += tail
+    return _to_int16(wave), info
+
+
+def save_loop(
+    bpm, output_filename, sample_rate=44100, pattern="4beat", max_cycles=None, sidecar=True
+):
+    """
+    最短のループ区間をWAVファイルとして保存する
+
+    ループポイントは WAV の smpl チャンクに書き込む。sidecar=True なら同じ内容を
+    `<ファイル名>.loop.json` にも保存する（smpl チャンクを読まないプレーヤー向け）。
+    MP3はエンコーダが先頭と末尾に無音を加えるため、ループの書き出しはWAVのみ。
+
+    Args:
+        bpm: テンポ（Beats Per Minute）
+        output_filename: 出力ファイル名（.wav が付いていなければ付加する）
+        sample_rate: サンプリングレート (Hz)
+        pattern: リズムパターン（generate_metronome() と同じ）
+        max_cycles: ループに含めるサイクル数の上限（find_loop() を参照）
+        sidecar: ループのメタデータをJSONでも保存するか
+
+    Returns:
+        tuple: (保存したWAVファイル名, LoopInfo)
+    """
+    wave_data, info = render_loop(bpm, sample_rate, pattern, max_cycles)
+    output_filename = save_as_wav(wave_data, sample_rate, output_filename, loop=(0, info.samples))
+    if sidecar:
+        with open(loop_metadata_filename(output_filename), "w") as f:
+            json.dump(info.to_dict(), f, indent=2, ensure_ascii=False)
+    return output_filename, info
+
+
+def loop_metadata_filename(output_filename):
+    """
+    ループのWAVファイルに対応するサイドカーJSONのファイル名
+
+    Args:
+        output_filename: WAVファイル名
+
+    Returns:
+        str: 拡張子を .loop.json に置き換えたファイル名
+    """
+    return os.path.splitext(output_filename)[0] + ".loop.json"
@@ -0,0 +1,442 @@
+"""ジョブファイルによる差分生成（中断からの再開・変更分のみの再生成）
+
+ジョブファイル（JSON / TOML / YAML）に BPM範囲 × パターン × 長さ × サンプリングレート ×
+形式 を書いておくと、出力ディレクトリの状態ファイルに完了した出力ごとの設定のハッシュと
+ファイルのチェックサムを記録する。再実行すると、出力がない・設定が変わった・ファイルが
+壊れている（チェックサムが一致しない）ものだけを生成する。
+
+ジョブファイルの例（TOML）:
+    output_dir = "mp3"
+    bpm_range = ["160:300:10"]
+    patterns = ["4beat", "4to8"]
+    durations = [60]
+    formats = ["mp3"]
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from .cache import RenderCache, render_spec
+from .patterns import PATTERNS, TIMING_MODES
+
+# 状態ファイルのデフォルト名（出力ディレクトリに置く）
+STATE_FILENAME = ".metronome-build.json"
+
+# 状態ファイルの形式のバージョン
+STATE_VERSION = 1
+
+# 出力できる形式
+FORMATS = ("mp3", "wav")
+
+# 完了を状態ファイルへ書き出す最短の間隔（秒）。中断時は直前の完了まで失われない
+# （終了時と例外時にも書き出す）
+CHECKPOINT_INTERVAL = 1.0
+
+# 既存の出力の確認方法
+# checksum: サイズと SHA-256 を確認する（壊れたファイルも検出する）
+# size: サイズのみ確認する（大きなカタログで確認を速くしたい場合）
+VERIFY_MODES = ("checksum", "size")
+
+# ジョブファイルの項目とデフォルト値
+_JOB_DEFAULTS = {
+    "output_dir": "mp3",
+    "bpm_range": [],
+    "bpms": [],
+    "patterns": ["4beat"],
+    "durations": [60],
+    "sample_rates": [44100],
+    "formats": ["mp3"],
+    "bitrate": "192k",
+    "timing": "accumulate",
+}
+
+
+@dataclass(frozen=True)
+class BuildEntry:
+    """
+    ジョブの1出力分
+
+    Attributes:
+        task: 生成する BatchTask（output_file の拡張子が形式）
+        name: 出力ディレクトリからの相対パス（状態ファイルのキー）
+        spec_hash: 出力の内容を決める設定のハッシュ
+    """
+
+    task: object
+    name: str
+    spec_hash: str
+
+
+@dataclass(frozen=True)
+class BuildResult:
+    """
+    1出力分の結果
+
+    Attributes:
+        entry: BuildEntry
+        status: "up-to-date"（生成不要）、"built"、"failed"
+        reason: 生成した理由（"new"、"missing"、"changed"、"corrupt"、"forced"）
+        error: 失敗した場合のエラーメッセージ
+    """
+
+    entry: BuildEntry
+    status: str
+    reason: str = None
+    error: str = None
+
+
+def parse_bpm_range(value):
+    """
+    START:END[:STEP] 形式のBPM範囲を解析する（END を含む）
+
+    Raises:
+        ValueError: 形式が正しくない場合
+    """
+    try:
+        parts = [int(part) for part in str(value).split(":")]
+    except ValueError:
+        parts = []
+    if len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] <= 0):
+        raise ValueError(f"BPM範囲は START:END[:STEP] の形式で指定してください: {value}")
+    start, end = parts[:2]
+    step = parts[2] if len(parts) == 3 else 1
+    return list(range(start, end + 1, step))
+
+
+def load_job(path):
+    """
+    ジョブファイルを読み込む
+
+    拡張子で形式を判定する（.json、.toml、.yaml / .yml）。TOML は Python 3.11 以降の
+    tomllib（それ以前は tomli）、YAML は PyYAML が必要。相対パスの output_dir は
+    ジョブファイルのあるディレクトリからのパスとして扱う。
+
+    Args:
+        path: ジョブファイル名
+
+    Returns:
+        dict: 検証済みのジョブ（validate_job() の結果）
+
+    Raises:
+        ValueError: 形式・内容が正しくない場合
+        ImportError: TOML / YAML の読み込みに必要なライブラリがない場合
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path) as f:
+            job = json.load(f)
+    elif extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python 3.10 以前
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError(
+                    "TOMLのジョブファイルには tomli が必要です: pip install tomli"
+                ) from None
+        with open(path, "rb") as f:
+            job = tomllib.load(f)
+    elif extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(
+                "YAMLのジョブファイルには PyYAML が必要です: pip install pyyaml"
+            ) from None
+        with open(path) as f:
+            job = yaml.safe_load(f)
+    else:
+        raise ValueError(f"ジョブファイルの形式を判定できません（.json / .toml / .yaml）: {path}")
+
+    job = validate_job(job)
+    if not os.path.isabs(job["output_dir"]):
+        job["output_dir"] = os.path.join(os.path.dirname(path), job["output_dir"])
+    return job
+
+
+def validate_job(job):
+    """
+    ジョブの内容を検証し、省略した項目にデフォルト値を補う
+
+    単独の値はリストとして扱う（例: durations = 60）。
+
+    Args:
+        job: ジョブの辞書
+
+    Returns:
+        dict: 全ての項目を含むジョブ
+
+    Raises:
+        ValueError: 内容が正しくない場合
+    """
+    if not isinstance(job, dict):
+        raise ValueError("ジョブファイルの内容はキーと値の組にしてください")
+    unknown = sorted(set(job) - set(_JOB_DEFAULTS))
+    if unknown:
+        raise ValueError(f"不明な項目があります: {', '.join(unknown)}")
+
+    job = {**_JOB_DEFAULTS, **job}
+    for key in ("bpm_range", "bpms", "patterns", "durations", "sample_rates", "formats"):
+        if not isinstance(job[key], list):
+            job[key] = [job[key]]
+
+    bpms = set(job["bpms"])
+    for value in job["bpm_range"]:
+        bpms.update(parse_bpm_range(value))
+    if not bpms:
+        raise ValueError("bpm_range または bpms を指定してください")
+    job["bpms"] = sorted(bpms)
+
+    for pattern in job["patterns"]:
+        if pattern not in PATTERNS:
+            raise ValueError(f"パターンは {' / '.join(PATTERNS)} のいずれかを指定してください")
+    for format in job["formats"]:
+        if format not in FORMATS:
+            raise ValueError(f"形式は {' / '.join(FORMATS)} のいずれかを指定してください")
+    if job["timing"] not in TIMING_MODES:
+        raise ValueError(f"timing は {' / '.join(TIMING_MODES)} のいずれかを指定してください")
+    return job
+
+
+def plan_job(job):
+    """
+    ジョブを出力ごとの BuildEntry に展開する
+
+    出力先は batch サブコマンドと同じ `<output_dir>/<pattern>/metronome_bpmXXX_<duration>sec`
+    （デフォルト以外のサンプリングレートは `_<rate>hz`）に形式の拡張子を付けたもの。
+
+    Args:
+        job: validate_job() の結果
+
+    Returns:
+        list: BuildEntry のリスト
+    """
+    from .batch import BatchTask, expand_tasks
+
+    entries = []
+    for format in job["formats"]:
+        tasks = expand_tasks(
+            job["bpms"],
+            patterns=job["patterns"],
+            durations=job["durations"],
+            sample_rates=job["sample_rates"],
+            output_dir=job["output_dir"],
+            bitrate=job["bitrate"],
+            timing=job["timing"],
+        )
+        for task in tasks:
+            output_file = os.path.splitext(task.output_file)[0] + "." + format
+            task = BatchTask(
+                task.bpm,
+                task.duration,
+                task.sample_rate,
+                task.pattern,
+                output_file,
+                task.bitrate,
+                task.timing,
+            )
+            spec = render_spec(
+                task.bpm,
+                task.duration,
+                task.sample_rate,
+                task.pattern,
+                format=format,
+                bitrate=task.bitrate,
+                timing=task.timing,
+            )
+            name = os.path.relpath(output_file, job["output_dir"]).replace(os.sep, "/")
+            entries.append(BuildEntry(task, name, RenderCache.key(spec)))
+    return entries
+
+
+def check_entry(entry, record, verify="checksum"):
+    """
+    既存の出力が最新かどうかを判定する
+
+    Args:
+        entry: BuildEntry
+        record: 状態ファイルの記録（なければ None）
+        verify: 確認方法（VERIFY_MODES のいずれか）
+
+    Returns:
+        str: 生成が必要な理由（"new"、"missing"、"changed"、"corrupt"）、最新なら None
+    """
+    if record is None:
+        return "new"
+    try:
+        size = os.path.getsize(entry.task.output_file)
+    except FileNotFoundError:
+        return "missing"
+    if record.get("spec_hash") != entry.spec_hash:
+        return "changed"
+    if size != record.get("bytes"):
+        return "corrupt"
+    if verify == "checksum" and file_sha256(entry.task.output_file) != record.get("sha256"):
+        return "corrupt"
+    return None
+
+
+def check_job(job, state_file=None, verify="checksum", force=False):
+    """
+    ジョブの各出力について生成が必要かどうかを判定する（生成はしない）
+
+    Args:
+        job: validate_job() または load_job() の結果
+        state_file: 状態ファイル名（None なら `<output_dir>/.metronome-build.json`）
+        verify: 既存の出力の確認方法（"checksum" または "size"）
+        force: True なら全ての出力を生成が必要とする
+
+    Returns:
+        list: (BuildEntry, 生成が必要な理由または None) のリスト
+    """
+    return _check_job(job, state_file, verify, force)[1]
+
+
+def build(
+    job,
+    state_file=None,
+    render_workers=1,
+    encode_workers=None,
+    verify="checksum",
+    force=False,
+    cache=None,
+):
+    """
+    ジョブのうち生成が必要な出力だけを生成する
+
+    生成が不要な出力の結果を先に返し、残りは BatchPipeline で合成とエンコードを
+    並行させながら完了した順に返す。完了した出力は状態ファイルに記録するため、
+    途中で中断しても次回は残りから再開する。ジョブに含まれなくなった出力の記録は
+    状態ファイルから取り除く（ファイルは削除しない）。
+
+    Args:
+        job: validate_job() または load_job() の結果
+        state_file: 状態ファイル名（None なら `<output_dir>/.metronome-build.json`）
+        render_workers: 合成ワーカースレッド数
+        encode_workers: エンコードワーカースレッド数（None ならCPU数）
+        verify: 既存の出力の確認方法（"checksum" または "size"）
+        force: True なら全ての出力を生成し直す
+        cache: RenderCache（None ならキャッシュを使わない）
+
+    Yields:
+        BuildResult: 各出力の結果
+    """
+    from .pipeline import BatchPipeline
+
+    state, checked = _check_job(job, state_file, verify, force)
+    pending = {}
+    for entry, reason in checked:
+        if reason is None:
+            yield BuildResult(entry, "up-to-date")
+        else:
+            pending[id(entry.task)] = (entry, reason)
+
+    pipeline = BatchPipeline(
+        render_workers=render_workers,
+        encode_workers=encode_workers,
+        cache=cache,
+        encode=_save_entry,
+    )
+    try:
+        for result in pipeline.run([entry.task for entry, _ in pending.values()]):
+            entry, reason = pending[id(result.task)]
+            if result.error:
+                state.forget(entry.name)
+                yield BuildResult(entry, "failed", reason, result.error)
+                continue
+            state.record(entry)
+            yield BuildResult(entry, "built", reason)
+    finally:
+        state.save()
+
+
+def file_sha256(filename):
+    """
+    ファイルの SHA-256 を16進数の文字列で返す
+
+    Args:
+        filename: ファイル名
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_job(job, state_file, verify, force):
+    """状態ファイルを読み込み、各出力を判定する（状態と判定結果を返す）"""
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"verify は {' / '.join(VERIFY_MODES)} のいずれかを指定してください")
+    if state_file is None:
+        state_file = os.path.join(job["output_dir"], STATE_FILENAME)
+
+    entries = plan_job(job)
+    state = _BuildState(state_file, {entry.name for entry in entries})
+    checked = [
+        (entry, "forced" if force else check_entry(entry, state.outputs.get(entry.name), verify))
+        for entry in entries
+    ]
+    return state, checked
+
+
+class _BuildState:
+    """状態ファイル（完了した出力ごとの設定のハッシュ・サイズ・チェックサム）"""
+
+    def __init__(self, path, names):
+        self.path = path
+        self.outputs = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.outputs = data.get("outputs", {})
+        except (FileNotFoundError, ValueError):
+            # 状態ファイルがない・壊れている場合は全て作り直す
+            pass
+        # ジョブに含まれなくなった出力の記録は残さない
+        self.outputs = {name: record for name, record in self.outputs.items() if name in names}
+        self._saved = time.monotonic()
+
+    def record(self, entry):
+        output_file = entry.task.output_file
+        self.outputs[entry.name] = {
+            "spec_hash": entry.spec_hash,
+            "bytes": os.path.getsize(output_file),
+            "sha256": file_sha256(output_file),
+        }
+        if time.monotonic() - self._saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def forget(self, name):
+        self.outputs.pop(name, None)
+
+    def save(self):
+        from .io import _atomic_output
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _atomic_output(self.path) as temp_filename:
+            with open(temp_filename, "w") as f:
+                json.dump(
+                    {"version": STATE_VERSION, "outputs": self.outputs},
+                    f,
+                    indent=2,
+                    sort_keys=True,
+                )
+        self._saved = time.monotonic()
+
+
+def _save_entry(wave_data, task):
+    """出力ファイルの拡張子に応じてMP3またはWAVで保存する（エンコードワーカーで実行）"""
+    from .io import encode_mp3, save_as_wav
+
+    if task.output_file.endswith(".wav"):
+        save_as_wav(wave_data, task.sample_rate, task.output_file)
+    else:
+        encode_mp3(wave_data, task.sample_rate, task.output_file, bitrate=task.bitrate)
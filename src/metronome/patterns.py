@@ -0,0 +1,177 @@
+"""リズムパターンの定義とコンパイル"""
+
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# クリック音の種類（クリックバンク内のインデックス）
+CLICK_NORMAL = 0
+CLICK_ACCENT = 1
+# 休符（クリックを鳴らさずに時間だけ進める）
+REST = -1
+
+# パターン記法の記号とクリックの種類
+_SYMBOLS = {"A": CLICK_ACCENT, "x": CLICK_NORMAL, ".": REST}
+_SYMBOL_NAMES = {variant: symbol for symbol, variant in _SYMBOLS.items()}
+
+# 1ステップ = 記号 + 長さ（拍）。例: "A"（1拍）, "x/2"（半拍）, "x*2"（2拍）, "x*3/2"
+_STEP_RE = re.compile(r"^([Ax.])(?:\*(\d+))?(?:/(\d+))?$")
+
+# オンセット位置の計算方法
+# accumulate: 従来どおり拍間隔を浮動小数点で逐次加算し、切り捨てる（従来と完全に一致）
+# exact: 拍番号から有理数で直接計算し、最も近いサンプルに丸める（誤差 0.5 サンプル以下）
+TIMING_MODES = ("accumulate", "exact")
+
+# 組み込みパターン（名前 → パターン記法）
+PATTERNS = {
+    # 通常の4つ打ち
+    "4beat": "A x x x",
+    # 4つ打ち2拍→8つ打ち2拍を2回（8拍1サイクル）
+    "4to8": "A x x/2 x/2 x/2 x/2 A x x/2 x/2 x/2 x/2",
+}
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledPattern:
+    """
+    コンパイル済みのパターン（1サイクル分のオンセット表）
+
+    Attributes:
+        canonical: 正規化したパターン記法（メモ化のキー）
+        step_beats: 各ステップの長さ（拍、次のステップまでの間隔）
+        variants: 各ステップのクリックの種類（REST は休符）
+        cycle_beats: 1サイクルの拍数
+        step_fractions: 各ステップの長さ（拍、有理数）
+    """
+
+    canonical: str
+    step_beats: "np.ndarray"
+    variants: "np.ndarray"
+    cycle_beats: float
+    step_fractions: tuple
+
+    @property
+    def sounding_steps(self):
+        """1サイクル中にクリックを鳴らすステップ数"""
+        return int((self.variants != REST).sum())
+
+
+def parse_pattern(text):
+    """
+    パターン記法を (長さ[拍], クリックの種類) のリストに変換する
+
+    記法: 空白区切りのステップ列。各ステップは記号と省略可能な長さ。
+      A = アクセント, x = 通常, . = 休符
+      長さ: 省略時1拍、"*N" でN拍、"/N" で1/N拍、"*N/M" でN/M拍
+
+    例: "A x x x"（4つ打ち）, "A x/2 x/2 . x"（8分2つと休符を含む）
+
+    Raises:
+        ValueError: 記法が正しくない場合
+    """
+    steps = []
+    for token in text.split():
+        match = _STEP_RE.match(token)
+        if match is None:
+            raise ValueError(f"パターンのステップが正しくありません: {token!r}")
+        symbol, numerator, denominator = match.groups()
+        if denominator == "0":
+            raise ValueError(f"ステップの長さが正しくありません: {token!r}")
+        beats = Fraction(int(numerator or 1), int(denominator or 1))
+        if beats <= 0:
+            raise ValueError(f"ステップの長さが正しくありません: {token!r}")
+        steps.append((beats, _SYMBOLS[symbol]))
+
+    if not steps:
+        raise ValueError("パターンが空です")
+    return steps
+
+
+def canonicalize(pattern):
+    """
+    パターンを正規化した記法に変換する
+
+    Args:
+        pattern: パターン名、パターン記法、または (分割数, アクセント) のシーケンス
+                 （分割数 N のステップは 1/N 拍、アクセントは True/False/None=休符）
+
+    Returns:
+        str: 正規化したパターン記法
+    """
+    if isinstance(pattern, str):
+        if pattern in PATTERNS:
+            steps = parse_pattern(PATTERNS[pattern])
+        else:
+            try:
+                steps = parse_pattern(pattern)
+            except ValueError as e:
+                names = ", ".join(PATTERNS)
+                raise ValueError(
+                    f"不明なパターンです: {pattern!r}（{names} またはパターン記法で指定）: {e}"
+                ) from None
+    else:
+        steps = []
+        for subdivision, accent in pattern:
+            subdivision = Fraction(subdivision)
+            if subdivision <= 0:
+                raise ValueError(f"分割数が正しくありません: {subdivision}")
+            variant = REST if accent is None else (CLICK_ACCENT if accent else CLICK_NORMAL)
+            steps.append((1 / subdivision, variant))
+        if not steps:
+            raise ValueError("パターンが空です")
+
+    tokens = []
+    for beats, variant in steps:
+        token = _SYMBOL_NAMES[variant]
+        if beats.numerator != 1:
+            token += f"*{beats.numerator}"
+        if beats.denominator != 1:
+            token += f"/{beats.denominator}"
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def compile_pattern(pattern):
+    """
+    パターンをオンセット表にコンパイルする（正規化した記法ごとにメモ化）
+
+    Args:
+        pattern: パターン名、パターン記法、(分割数, アクセント) のシーケンス、
+                 または CompiledPattern
+
+    Returns:
+        CompiledPattern: コンパイル済みのパターン
+
+    Raises:
+        ValueError: パターンが正しくない場合
+    """
+    if isinstance(pattern, CompiledPattern):
+        return pattern
+    return _compile_canonical(canonicalize(pattern))
+
+
+@lru_cache(maxsize=128)
+def _compile_canonical(canonical):
+    # NumPy は必要になるまで読み込まない（CLIの起動を速くするため）
+    import numpy as np
+
+    steps = parse_pattern(canonical)
+    cycle_beats = sum(beats for beats, _ in steps)
+
+    step_beats = np.array([float(beats) for beats, _ in steps])
+    variants = np.array([variant for _, variant in steps], dtype=np.intp)
+    step_beats.flags.writeable = False
+    variants.flags.writeable = False
+
+    return CompiledPattern(
+        canonical,
+        step_beats,
+        variants,
+        float(cycle_beats),
+        tuple(beats for beats, _ in steps),
+    )
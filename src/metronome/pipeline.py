@@ -0,0 +1,349 @@
+"""合成とエンコードを並行させる一括生成（パイプライン処理）"""
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from .batch import BatchResult, render_many
+from .cache import render_spec
+from .io import encode_mp3
+from .patterns import compile_pattern
+
+# 合成段とエンコード段の間で待たせる波形の数のデフォルト
+DEFAULT_QUEUE_SIZE = 4
+
+# 停止要求を確認する間隔（秒）
+_POLL_INTERVAL = 0.1
+
+# キューの終端
+_DONE = object()
+
+
+@dataclass
+class StageTimings:
+    """
+    パイプラインの各段の所要時間（秒、全ワーカーの合計）
+
+    Attributes:
+        render: 合成にかかった時間
+        render_blocked: エンコード段の空きを待った時間（長ければエンコードが律速）
+        encode: エンコード・保存にかかった時間
+        encode_idle: 合成結果を待った時間（長ければ合成が律速）
+        elapsed: 全体の実時間
+        render_workers: 合成ワーカー数
+        encode_workers: エンコードワーカー数
+    """
+
+    render: float = 0.0
+    render_blocked: float = 0.0
+    encode: float = 0.0
+    encode_idle: float = 0.0
+    elapsed: float = 0.0
+    render_workers: int = 1
+    encode_workers: int = 1
+
+    def utilization(self, stage):
+        """
+        段の稼働率（処理時間 / (ワーカー数 × 実時間)）
+
+        Args:
+            stage: "render" または "encode"
+        """
+        workers = self.render_workers if stage == "render" else self.encode_workers
+        if self.elapsed <= 0:
+            return 0.0
+        return getattr(self, stage) / (workers * self.elapsed)
+
+    @property
+    def bottleneck(self):
+        """稼働率の高い段（"render" または "encode"）"""
+        if self.utilization("render") >= self.utilization("encode"):
+            return "render"
+        return "encode"
+
+    def summary(self):
+        """
+        各段の所要時間を表形式の文字列にする
+
+        Returns:
+            str: 複数行の文字列
+        """
+        names = {"render": "合成", "encode": "エンコード"}
+        lines = [f"{'段':<10} {'ワーカー':>8} {'処理[s]':>9} {'待ち[s]':>9} {'稼働率':>7}"]
+        for stage, workers, waited in (
+            ("render", self.render_workers, self.render_blocked),
+            ("encode", self.encode_workers, self.encode_idle),
+        ):
+            lines.append(
+                f"{names[stage]:<10} {workers:>8} {getattr(self, stage):>9.2f} "
+                f"{waited:>9.2f} {self.utilization(stage):>7.0%}"
+            )
+        lines.append(f"実時間 {self.elapsed:.2f}秒、律速: {names[self.bottleneck]}")
+        return "\n".join(lines)
+
+
+class BatchPipeline:
+    """
+    合成段とエンコード段を有限長のキューでつないだ一括生成
+
+    合成ワーカーは render_many() で同じサンプリングレート・パターンの波形を共有しながら
+    合成し、エンコードワーカーはそれぞれ1つずつffmpegを起動してMP3にする。
+    キューが一杯になると合成は待つため、メモリ上の波形は queue_size + ワーカー数 程度に
+    収まる。1つのタスクが失敗しても残りのタスクは続行される。
+    """
+
+    def __init__(
+        self,
+        render_workers=1,
+        encode_workers=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        cache=None,
+        encode=None,
+    ):
+        """
+        Args:
+            render_workers: 合成ワーカースレッド数
+            encode_workers: エンコードワーカースレッド数（None ならCPU数）
+            queue_size: 合成段とエンコード段の間で待たせる波形の数
+            cache: RenderCache（None ならキャッシュを使わない）
+            encode: (波形, BatchTask) を受け取り task.output_file に保存する関数
+                    （None なら encode_mp3() でMP3にする）
+        """
+        if render_workers < 1:
+            raise ValueError(f"合成ワーカー数は1以上を指定してください: {render_workers}")
+        if queue_size < 1:
+            raise ValueError(f"キューの長さは1以上を指定してください: {queue_size}")
+        self.render_workers = render_workers
+        self.encode_workers = encode_workers or os.cpu_count() or 1
+        if self.encode_workers < 1:
+            raise ValueError(f"エンコードワーカー数は1以上を指定してください: {encode_workers}")
+        self.queue_size = queue_size
+        self.cache = cache
+        self.encode = encode or _encode_task
+        self.timings = StageTimings()
+        self._lock = threading.Lock()
+
+    def run(self, tasks):
+        """
+        タスクを実行し、完了した順に結果を返す
+
+        途中で close() した場合は残りのタスクを中止する（処理中のファイルは完了を待つ）。
+        実行後は timings に各段の所要時間が入る。
+
+        Args:
+            tasks: BatchTask のリスト
+
+        Yields:
+            BatchResult: 各タスクの結果
+        """
+        tasks = list(tasks)
+        self.timings = StageTimings(
+            render_workers=self.render_workers, encode_workers=self.encode_workers
+        )
+        start = time.perf_counter()
+
+        groups = queue.SimpleQueue()
+        for group in _group_tasks(tasks):
+            groups.put(group)
+        work = queue.Queue(self.queue_size)
+        results = queue.SimpleQueue()
+        stop = threading.Event()
+
+        renderers = [
+            threading.Thread(
+                target=self._render_worker,
+                args=(groups, work, results, stop),
+                name=f"metronome-render-{i}",
+                daemon=True,
+            )
+            for i in range(self.render_workers)
+        ]
+        encoders = [
+            threading.Thread(
+                target=self._encode_worker,
+                args=(work, results, stop),
+                name=f"metronome-encode-{i}",
+                daemon=True,
+            )
+            for i in range(self.encode_workers)
+        ]
+        for thread in renderers + encoders:
+            thread.start()
+
+        def finish_rendering():
+            for thread in renderers:
+                thread.join()
+            for _ in encoders:
+                _put(work, _DONE, stop)
+
+        closer = threading.Thread(target=finish_rendering, daemon=True)
+        closer.start()
+
+        try:
+            for _ in range(len(tasks)):
+                yield results.get()
+        finally:
+            stop.set()
+            closer.join()
+            for thread in encoders:
+                thread.join()
+            self.timings.elapsed = time.perf_counter() - start
+
+    def info(self):
+        """
+        パイプラインの設定を取得する
+
+        Returns:
+            dict: render_workers, encode_workers, queue_size
+        """
+        return {
+            "render_workers": self.render_workers,
+            "encode_workers": self.encode_workers,
+            "queue_size": self.queue_size,
+        }
+
+    def _add_time(self, field, seconds):
+        with self._lock:
+            setattr(self.timings, field, getattr(self.timings, field) + seconds)
+
+    def _render_worker(self, groups, work, results, stop):
+        """合成ワーカー: BPM・パターンごとのタスク群を取り出して合成し、キューへ渡す"""
+        while not stop.is_set():
+            try:
+                group = groups.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.perf_counter()
+            # 結果を返した、またはエンコード段へ渡したタスク
+            reported = set()
+            try:
+                pending = []
+                for task in group:
+                    try:
+                        cached = self._fetch_cached(task)
+                    except Exception as e:
+                        # パターンが正しくない場合などもタスクごとのエラーとして報告する
+                        reported.add(id(task))
+                        results.put(BatchResult(task, f"{type(e).__name__}: {e}"))
+                        continue
+                    if cached:
+                        reported.add(id(task))
+                        results.put(BatchResult(task, cached=True))
+                    else:
+                        pending.append(task)
+
+                rendered = render_many(pending)
+                try:
+                    for task, wave_data in rendered:
+                        reported.add(id(task))
+                        self._add_time("render", time.perf_counter() - started)
+                        waited = time.perf_counter()
+                        if not _put(work, (task, wave_data), stop):
+                            return
+                        started = time.perf_counter()
+                        self._add_time("render_blocked", started - waited)
+                finally:
+                    rendered.close()
+            except Exception as e:
+                # run() は全タスクの結果を待つため、グループの残りは必ずエラーとして返す
+                error = f"{type(e).__name__}: {e}"
+                for task in group:
+                    if id(task) not in reported:
+                        results.put(BatchResult(task, error))
+            self._add_time("render", time.perf_counter() - started)
+
+    def _encode_worker(self, work, results, stop):
+        """エンコードワーカー: キューの波形を1ファイルずつ保存する"""
+        while True:
+            waited = time.perf_counter()
+            item = _get(work, stop)
+            started = time.perf_counter()
+            self._add_time("encode_idle", started - waited)
+            if item is _DONE:
+                return
+
+            task, wave_data = item
+            try:
+                self.encode(wave_data, task)
+                self._store_cached(task)
+            except Exception as e:
+                results.put(BatchResult(task, f"{type(e).__name__}: {e}"))
+            else:
+                results.put(BatchResult(task))
+            finally:
+                self._add_time("encode", time.perf_counter() - started)
+
+    def _fetch_cached(self, task):
+        directory = os.path.dirname(task.output_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.cache is None:
+            return False
+        return self.cache.fetch(self.cache.key(_task_spec(task)), task.output_file)
+
+    def _store_cached(self, task):
+        if self.cache is None:
+            return
+        try:
+            self.cache.store(self.cache.key(_task_spec(task)), task.output_file)
+        except OSError:
+            # キャッシュに書き込めなくても出力自体は成功している
+            pass
+
+
+def _encode_task(wave_data, task):
+    """波形をMP3にエンコードして task.output_file に保存する"""
+    encode_mp3(wave_data, task.sample_rate, task.output_file, bitrate=task.bitrate)
+
+
+def _task_spec(task):
+    return render_spec(
+        task.bpm,
+        task.duration,
+        task.sample_rate,
+        task.pattern,
+        bitrate=task.bitrate,
+        timing=task.timing,
+    )
+
+
+def _group_tasks(tasks):
+    """
+    同じ波形を共有できるタスク（サンプリングレート・パターン・タイミング・BPMが同じ）をまとめる
+
+    パターンが正しくないタスクは単独のグループにする（キャッシュの確認時または合成時に
+    エラーとして報告される）。
+    """
+    groups = {}
+    for task in tasks:
+        try:
+            pattern = compile_pattern(task.pattern).canonical
+        except ValueError:
+            pattern = id(task)
+        key = (task.sample_rate, pattern, task.timing, task.bpm)
+        groups.setdefault(key, []).append(task)
+    return list(groups.values())
+
+
+def _put(work, item, stop):
+    """停止要求があるまでキューへの追加を試みる（追加できたら True）"""
+    while not stop.is_set():
+        try:
+            work.put(item, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(work, stop):
+    """停止要求があるまでキューから取り出す（停止した場合は _DONE）"""
+    while not stop.is_set():
+        try:
+            return work.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _DONE
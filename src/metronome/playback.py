@@ -0,0 +1,393 @@
+"""リアルタイム再生（リングバッファ経由でオーディオコールバックへ供給する）"""
+
+import math
+import threading
+import time
+from fractions import Fraction
+
+import numpy as np
+
+from .core import _make_clicks, _render_clicks, _round_half_up, _to_int16
+from .io import WavWriter, _atomic_output
+from .patterns import REST, compile_pattern
+
+# 1回のコールバックで渡すサンプル数のデフォルト
+DEFAULT_BLOCK_SIZE = 256
+
+# リングバッファの容量（ブロック数）のデフォルト
+DEFAULT_BUFFER_BLOCKS = 8
+
+
+class RingBuffer:
+    """
+    16ビット整数のサンプルを保持する固定長のリングバッファ
+
+    書き込み側（生成スレッド）と読み出し側（オーディオコールバック）が1つずつの場合、
+    ロックなしで同時に使用できる。各側は自分のカウンタだけを更新し、
+    書き込み側はデータを書いてから、読み出し側はデータを読んでからカウンタを進める。
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: 保持できるサンプル数
+        """
+        if capacity <= 0:
+            raise ValueError(f"容量は1以上を指定してください: {capacity}")
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=np.int16)
+        # 書き込み・読み出し済みのサンプル数の累計（単調増加）
+        self._written = 0
+        self._read = 0
+
+    @property
+    def available(self):
+        """読み出せるサンプル数"""
+        return self._written - self._read
+
+    @property
+    def free(self):
+        """書き込めるサンプル数"""
+        return self.capacity - (self._written - self._read)
+
+    def write(self, data):
+        """
+        空いている分だけサンプルを書き込む
+
+        Args:
+            data: 16ビット整数の配列
+
+        Returns:
+            int: 書き込んだサンプル数
+        """
+        count = min(len(data), self.free)
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        self._buffer[start : start + first] = data[:first]
+        if count > first:
+            self._buffer[: count - first] = data[first:count]
+        self._written += count
+        return count
+
+    def read_into(self, out):
+        """
+        読み出せる分だけ out の先頭へコピーする（新しい配列は確保しない）
+
+        Args:
+            out: 書き込み先の配列
+
+        Returns:
+            int: 読み出したサンプル数
+        """
+        count = min(len(out), self._written - self._read)
+        start = self._read % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self._buffer[start : start + first]
+        if count > first:
+            out[first:count] = self._buffer[: count - first]
+        self._read += count
+        return count
+
+
+class PlaybackEngine:
+    """
+    パターンを1小節（1サイクル）ずつ生成し、リングバッファ経由でコールバックへ供給する
+
+    テンポ・パターンの変更は次に生成する小節から反映される。各小節の位置は
+    timing="exact" と同じく有理数で計算するため、テンポを変えてもずれが蓄積しない。
+    小節の境界をまたぐクリックの残りは次の小節に加算するため、境界で音が途切れない。
+    """
+
+    def __init__(
+        self,
+        bpm,
+        pattern="4beat",
+        sample_rate=44100,
+        block_size=DEFAULT_BLOCK_SIZE,
+        buffer_blocks=DEFAULT_BUFFER_BLOCKS,
+    ):
+        """
+        Args:
+            bpm: テンポ（Beats Per Minute）
+            pattern: リズムパターン（名前、パターン記法、または CompiledPattern）
+            sample_rate: サンプリングレート
+            block_size: 1回のコールバックで渡すサンプル数
+            buffer_blocks: リングバッファの容量（ブロック数）
+        """
+        if block_size <= 0:
+            raise ValueError(f"ブロックサイズは1以上を指定してください: {block_size}")
+        if buffer_blocks < 2:
+            raise ValueError(f"バッファのブロック数は2以上を指定してください: {buffer_blocks}")
+
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.ring = RingBuffer(block_size * buffer_blocks)
+        self._clicks = _make_clicks(sample_rate)
+
+        # 次の小節に使う (BPM, パターン)。差し替えは1回の代入で行う
+        self._next = (_check_bpm(bpm), compile_pattern(pattern))
+        self._settings_lock = threading.Lock()
+
+        # 次の小節の開始位置（サンプル、有理数）
+        self._bar_start = Fraction(0)
+        # 前の小節からはみ出したクリックの残り（クリッピング前）
+        self._carry = np.zeros(0)
+        # 生成済みでリングバッファへ書き込んでいないサンプル
+        self._queued = np.zeros(0, dtype=np.int16)
+        self._queued_offset = 0
+
+        self.bars = 0
+        self.blocks = 0
+        self.underruns = 0
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def bpm(self):
+        """次の小節のBPM"""
+        return self._next[0]
+
+    @property
+    def pattern(self):
+        """次の小節のパターン（CompiledPattern）"""
+        return self._next[1]
+
+    @property
+    def running(self):
+        """生成スレッドが動作中かどうか"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_tempo(self, bpm):
+        """テンポを変更する（次の小節から反映）"""
+        bpm = _check_bpm(bpm)
+        with self._settings_lock:
+            self._next = (bpm, self._next[1])
+
+    def set_pattern(self, pattern):
+        """パターンを変更する（次の小節から反映）"""
+        compiled = compile_pattern(pattern)
+        with self._settings_lock:
+            self._next = (self._next[0], compiled)
+
+    def fill(self):
+        """
+        リングバッファに空きがなくなるまで小節を生成して書き込む（生成側）
+
+        Returns:
+            int: 書き込んだサンプル数
+        """
+        written = 0
+        while self.ring.free:
+            if self._queued_offset == len(self._queued):
+                self._queued = self._render_bar()
+                self._queued_offset = 0
+            count = self.ring.write(self._queued[self._queued_offset :])
+            self._queued_offset += count
+            written += count
+        return written
+
+    def callback(self, out):
+        """
+        オーディオコールバック（読み出し側）。out をリングバッファの内容で埋める
+
+        波形用のメモリを確保せず、ロックも取らない。データが足りない場合は
+        残りを無音で埋め、アンダーランとして数える。
+
+        Args:
+            out: 16ビット整数の出力バッファ（1次元）
+        """
+        count = self.ring.read_into(out)
+        if count < len(out):
+            out[count:] = 0
+            self.underruns += 1
+        self.blocks += 1
+
+    def start(self):
+        """生成スレッドを開始する"""
+        if self.running:
+            return
+        self.fill()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """生成スレッドを停止する"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def info(self):
+        """
+        再生の統計情報を取得する
+
+        Returns:
+            dict: bars, blocks, underruns, buffered
+        """
+        return {
+            "bars": self.bars,
+            "blocks": self.blocks,
+            "underruns": self.underruns,
+            "buffered": self.ring.available,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _produce(self):
+        """生成スレッド: 1ブロック分の時間ごとにリングバッファを補充する"""
+        interval = self.block_size / self.sample_rate
+        while not self._stop.wait(interval):
+            self.fill()
+
+    def _render_bar(self):
+        """次の1小節を生成する"""
+        bpm, compiled = self._next
+        samples_per_beat = Fraction(60 * self.sample_rate) / bpm
+
+        bar_start = self._bar_start
+        start = _round_half_up(bar_start)
+        positions = []
+        variants = []
+        beat = Fraction(0)
+        for step, variant in zip(compiled.step_fractions, compiled.variants):
+            if variant != REST:
+                positions.append(_round_half_up(bar_start + beat * samples_per_beat) - start)
+                variants.append(variant)
+            beat += step
+        self._bar_start = bar_start + beat * samples_per_beat
+        length = _round_half_up(self._bar_start) - start
+
+        carry = self._carry
+        total_samples = max(length + self._clicks.shape[1], len(carry))
+        bar = _render_clicks(
+            total_samples,
+            np.array(positions, dtype=np.int64),
+            np.array(variants, dtype=np.intp),
+            self._clicks,
+        )
+        bar[: len(carry)] += carry
+        self._carry = bar[length:].copy()
+        self.bars += 1
+        return _to_int16(bar[:length])
+
+
+class NullSink:
+    """
+    オーディオデバイスの代わりにコールバックを呼び出すシンク（ヘッドレス実行・テスト用）
+
+    realtime=False ではブロックを待ち時間なしで処理する。生成スレッドが動いていなければ
+    各コールバックの前に fill() を呼ぶ。realtime=True では実際の再生と同じ間隔で
+    コールバックを呼ぶ。
+    """
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+
+    def run(self, engine, duration_seconds):
+        """
+        指定秒数分のコールバックを呼び出す
+
+        Args:
+            engine: PlaybackEngine
+            duration_seconds: 再生する長さ（秒）
+        """
+        block = np.zeros(engine.block_size, dtype=np.int16)
+        num_blocks = math.ceil(duration_seconds * engine.sample_rate / engine.block_size)
+        interval = engine.block_size / engine.sample_rate
+
+        deadline = time.perf_counter()
+        for _ in range(num_blocks):
+            if not engine.running:
+                engine.fill()
+            engine.callback(block)
+            self.consume(block)
+            if self.realtime:
+                deadline += interval
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def consume(self, block):
+        """コールバックで埋めたブロックを受け取る（サブクラスで上書きする）"""
+
+
+class FileSink(NullSink):
+    """コールバックで埋めたブロックをWAVファイルへ書き出すシンク"""
+
+    def __init__(self, filename, realtime=False):
+        super().__init__(realtime)
+        self.filename = filename
+        self._writer = None
+
+    def run(self, engine, duration_seconds):
+        with _atomic_output(self.filename) as temp_filename:
+            with WavWriter(temp_filename, engine.sample_rate) as writer:
+                self._writer = writer
+                try:
+                    super().run(engine, duration_seconds)
+                finally:
+                    self._writer = None
+
+    def consume(self, block):
+        self._writer.write(block)
+
+
+class DeviceSink:
+    """sounddevice（オプション）でオーディオデバイスへ出力するシンク"""
+
+    def __init__(self, device=None):
+        """
+        Args:
+            device: 出力デバイス（None ならデフォルト）
+        """
+        self.device = device
+
+    def run(self, engine, duration_seconds=None):
+        """
+        再生する（duration_seconds が None なら Ctrl+C まで）
+
+        Raises:
+            ImportError: sounddevice がインストールされていない場合
+        """
+        try:
+            import sounddevice
+        except ImportError:
+            raise ImportError(
+                "デバイスへの再生には sounddevice が必要です: pip install metronome[playback]"
+            ) from None
+
+        def callback(outdata, frames, time_info, status):
+            engine.callback(outdata[:, 0])
+
+        started = not engine.running
+        if started:
+            engine.start()
+        try:
+            with sounddevice.OutputStream(
+                samplerate=engine.sample_rate,
+                blocksize=engine.block_size,
+                device=self.device,
+                channels=1,
+                dtype="int16",
+                callback=callback,
+            ):
+                if duration_seconds is None:
+                    while True:
+                        time.sleep(0.1)
+                time.sleep(duration_seconds)
+        finally:
+            if started:
+                engine.stop()
+
+
+def _check_bpm(bpm):
+    """BPMを有理数に変換する（0以下はエラー）"""
+    bpm = Fraction(bpm)
+    if bpm <= 0:
+        raise ValueError(f"BPMは正の値を指定してください: {bpm}")
+    return bpm
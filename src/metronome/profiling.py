@@ -0,0 +1,213 @@
+"""処理段ごとの所要時間の計測（プロファイリング）
+
+generate_metronome()・save_as_wav()・save_as_mp3() などの内部の各段（オンセットの計算、
+クリック音の用意、クリックの配置、16ビット整数への変換、WAVの書き込み、ffmpegによる
+エンコード）で、実時間・書き込んだバイト数・確保した配列のバイト数を記録する。
+
+計測はフックが1つも登録されていない間は行わない。各段の入口は共有の無効な計測器を
+返すだけなので、通常の実行への影響は無視できる。
+
+使用例:
+    with Profile() as profile:
+        save_as_wav(generate_metronome(bpm=120), 44100, "click.wav")
+    print(profile.summary())
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+# 計測結果を受け取るフック（StageRecord を引数に呼ばれる）
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class StageRecord:
+    """
+    1つの処理段の計測結果
+
+    Attributes:
+        stage: 段の名前（"render.place"、"mp3.encode" など）
+        seconds: 実時間（秒）
+        bytes: 書き込んだバイト数（ファイル出力の段のみ、それ以外は 0）
+        array_bytes: 確保した配列のバイト数（合成の段のみ、それ以外は 0）
+        thread: 計測したスレッドの名前
+    """
+
+    stage: str
+    seconds: float
+    bytes: int = 0
+    array_bytes: int = 0
+    thread: str = ""
+
+
+def add_hook(hook):
+    """
+    計測結果を受け取るフックを登録する
+
+    フックは計測した段のスレッドから呼ばれるため、スレッドセーフにする。
+
+    Args:
+        hook: StageRecord を受け取る関数
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """
+    登録したフックを解除する（登録されていなければ何もしない）
+
+    Args:
+        hook: add_hook() で登録した関数
+    """
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def is_enabled():
+    """フックが登録されていれば True"""
+    return bool(_hooks)
+
+
+def stage(name):
+    """
+    処理段の計測器を取得する（with 文で囲んだ範囲を計測する）
+
+    フックがなければ共有の無効な計測器を返す。無効な計測器は偽と評価されるため、
+    バイト数などを求めるのに手間がかかる場合は `if timer:` で囲む。
+
+    Args:
+        name: 段の名前
+
+    Returns:
+        計測器（bytes・array_bytes 属性に値を設定すると記録に含まれる）
+    """
+    if not _hooks:
+        return _DISABLED
+    return _StageTimer(name)
+
+
+class _StageTimer:
+    """有効な計測器"""
+
+    __slots__ = ("name", "bytes", "array_bytes", "_start")
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+        self.array_bytes = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record = StageRecord(
+            self.name,
+            time.perf_counter() - self._start,
+            self.bytes,
+            self.array_bytes,
+            threading.current_thread().name,
+        )
+        with _hooks_lock:
+            hooks = list(_hooks)
+        for hook in hooks:
+            hook(record)
+
+
+class _DisabledTimer:
+    """何も記録しない計測器（全ての呼び出しで共有する）"""
+
+    __slots__ = ("bytes", "array_bytes")
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_DISABLED = _DisabledTimer()
+
+
+class Profile:
+    """
+    with 文の間の計測結果を集める
+
+    他のスレッド（BatchPipeline のワーカーなど）で計測した段も記録する。
+    """
+
+    def __init__(self):
+        self.records = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._start = None
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_hook(self)
+        self.elapsed = time.perf_counter() - self._start
+
+    def totals(self):
+        """
+        段ごとの合計を求める
+
+        Returns:
+            dict: 段の名前 → {"calls", "seconds", "bytes", "array_bytes"}（最初に記録された順）
+        """
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            total = totals.setdefault(
+                record.stage, {"calls": 0, "seconds": 0.0, "bytes": 0, "array_bytes": 0}
+            )
+            total["calls"] += 1
+            total["seconds"] += record.seconds
+            total["bytes"] += record.bytes
+            total["array_bytes"] += record.array_bytes
+        return totals
+
+    def summary(self):
+        """
+        段ごとの合計を表形式の文字列にする
+
+        Returns:
+            str: 複数行の文字列
+        """
+        lines = [
+            f"{'段':<14} {'回数':>6} {'時間[s]':>9} {'割合':>6} {'書込[MB]':>9} {'配列[MB]':>9}"
+        ]
+        for name, total in self.totals().items():
+            share = total["seconds"] / self.elapsed if self.elapsed > 0 else 0.0
+            lines.append(
+                f"{name:<14} {total['calls']:>6} {total['seconds']:>9.3f} {share:>6.0%} "
+                f"{total['bytes'] / 1e6:>9.2f} {total['array_bytes'] / 1e6:>9.2f}"
+            )
+        lines.append(f"実時間 {self.elapsed:.3f}秒")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        """
+        計測結果をJSONに変換できる形にする
+
+        Returns:
+            dict: elapsed（実時間）、stages（段ごとの合計）、records（個々の記録）
+        """
+        with self._lock:
+            records = [asdict(record) for record in self.records]
+        return {"elapsed": self.elapsed, "stages": self.totals(), "records": records}
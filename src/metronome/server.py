@@ -0,0 +1,420 @@
+"""ローカルHTTPサーバー（常駐プロセスで生成し、結果をストリーミングで返す）"""
+
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .core import (
+    DEFAULT_CHUNK_SAMPLES,
+    TIMING_MODES,
+    count_samples,
+    generate_metronome,
+    iter_metronome_chunks,
+)
+from .io import iter_mp3_bytes, iter_wav_bytes
+from .patterns import compile_pattern
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 生成できる長さの上限（秒）のデフォルト
+DEFAULT_MAX_DURATION = 600
+
+# 1リクエストあたりの送信待ちブロック数（これを超えると生成を待たせる）
+DEFAULT_QUEUE_CHUNKS = 8
+
+# 出力形式とContent-Type
+FORMATS = {"wav": "audio/wav", "mp3": "audio/mpeg"}
+
+# ストリームの終端
+_END = object()
+
+
+class ServiceBusyError(Exception):
+    """同時リクエスト数の上限に達している"""
+
+
+@dataclass(frozen=True)
+class RenderRequest:
+    """1リクエスト分の生成設定"""
+
+    bpm: int
+    duration: int = 60
+    sample_rate: int = 44100
+    pattern: str = "4beat"
+    format: str = "wav"
+    bitrate: str = "192k"
+    timing: str = "accumulate"
+
+    @property
+    def filename(self):
+        """ダウンロード時のファイル名"""
+        return f"metronome_bpm{self.bpm}_{self.duration}sec.{self.format}"
+
+
+def parse_render_request(params, max_duration=DEFAULT_MAX_DURATION):
+    """
+    クエリ文字列やJSONのパラメータを検証して RenderRequest を作成する
+
+    Args:
+        params: パラメータ名 → 値（文字列または数値）
+        max_duration: 長さ（秒）の上限
+
+    Returns:
+        RenderRequest: 検証済みの設定
+
+    Raises:
+        ValueError: パラメータが正しくない場合
+    """
+    fields = RenderRequest.__dataclass_fields__
+    unknown = set(params) - set(fields)
+    if unknown:
+        raise ValueError(f"不明なパラメータです: {', '.join(sorted(unknown))}")
+    if "bpm" not in params:
+        raise ValueError("bpm を指定してください")
+
+    values = {}
+    for name, value in params.items():
+        if fields[name].type is int:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} は整数で指定してください: {value!r}") from None
+        elif not isinstance(value, str):
+            raise ValueError(f"{name} は文字列で指定してください: {value!r}")
+        values[name] = value
+    request = RenderRequest(**values)
+
+    if not 20 <= request.bpm <= 300:
+        raise ValueError(f"BPMは20〜300の範囲で指定してください: {request.bpm}")
+    if not 0 < request.duration <= max_duration:
+        raise ValueError(f"長さは1〜{max_duration}秒で指定してください: {request.duration}")
+    if not 8000 <= request.sample_rate <= 192000:
+        raise ValueError(f"サンプリングレートが正しくありません: {request.sample_rate}")
+    if request.format not in FORMATS:
+        raise ValueError(f"出力形式は {', '.join(FORMATS)} のいずれかです: {request.format}")
+    if request.timing not in TIMING_MODES:
+        raise ValueError(f"timing は {', '.join(TIMING_MODES)} のいずれかです: {request.timing}")
+    compile_pattern(request.pattern)
+    return request
+
+
+class RenderStream:
+    """
+    ワーカーが生成したバイト列を受け取るイテレータ
+
+    ワーカーとの間のキューは長さに上限があり、読み出しが遅いと生成も待たされる。
+    途中で close() すると生成を中止する。
+    """
+
+    def __init__(self, queue_chunks, on_close):
+        self.queue = queue.Queue(maxsize=queue_chunks)
+        self.cancelled = threading.Event()
+        self.future = None
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        item = self.queue.get()
+        if item is _END:
+            self.close()
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self.close()
+            raise item
+        return item
+
+    def put(self, item):
+        """
+        キューに空きができるまで待って書き込む（ワーカー側）
+
+        Returns:
+            bool: 中止された場合 False
+        """
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """生成を中止し、同時リクエスト数の枠を返す"""
+        if self._closed:
+            return
+        self._closed = True
+        self.cancelled.set()
+        self._on_close(self)
+
+
+class RenderService:
+    """
+    常駐するワーカースレッドのプールで生成する
+
+    同時に受け付けるリクエスト数（生成中 + 待機中）には上限があり、
+    超えた場合は ServiceBusyError を送出する。
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        max_requests=None,
+        queue_chunks=DEFAULT_QUEUE_CHUNKS,
+        chunk_samples=DEFAULT_CHUNK_SAMPLES,
+        max_duration=DEFAULT_MAX_DURATION,
+    ):
+        """
+        Args:
+            workers: ワーカースレッド数（None ならCPU数、最大4）
+            max_requests: 同時に受け付けるリクエスト数（None なら workers の2倍）
+            queue_chunks: 1リクエストあたりの送信待ちブロック数
+            chunk_samples: 1ブロックあたりのサンプル数
+            max_duration: 長さ（秒）の上限
+        """
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_requests = max_requests or self.workers * 2
+        self.queue_chunks = queue_chunks
+        self.chunk_samples = chunk_samples
+        self.max_duration = max_duration
+        self._slots = threading.BoundedSemaphore(self.max_requests)
+        self._lock = threading.Lock()
+        self._streams = set()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="metronome-render")
+
+    def warm(self):
+        """クリック音とパターンを事前に生成しておく（最初のリクエストを速くする）"""
+        for sample_rate in (22050, 44100, 48000):
+            generate_metronome(bpm=120, duration_seconds=1, sample_rate=sample_rate)
+
+    def open(self, request):
+        """
+        生成を開始し、バイト列のストリームを返す
+
+        Args:
+            request: RenderRequest
+
+        Returns:
+            RenderStream: 出力ファイルのバイト列を順に返すイテレータ
+
+        Raises:
+            ServiceBusyError: 同時リクエスト数の上限に達している場合
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusyError(f"同時リクエスト数の上限（{self.max_requests}）に達しています")
+        stream = RenderStream(self.queue_chunks, self._release)
+        with self._lock:
+            self._streams.add(stream)
+        try:
+            stream.future = self._executor.submit(self._produce, request, stream)
+        except BaseException:
+            stream.close()
+            raise
+        return stream
+
+    def info(self):
+        """
+        サービスの状態を取得する
+
+        Returns:
+            dict: workers, max_requests, active
+        """
+        return {
+            "workers": self.workers,
+            "max_requests": self.max_requests,
+            "active": len(self._streams),
+        }
+
+    def close(self):
+        """生成中のストリームを中止し、ワーカーを停止する"""
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            stream.cancelled.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _release(self, stream):
+        with self._lock:
+            self._streams.discard(stream)
+        self._slots.release()
+
+    def _produce(self, request, stream):
+        """ワーカースレッド: 生成・エンコードしたバイト列をストリームへ書き込む"""
+        if stream.cancelled.is_set():
+            return
+        try:
+            chunks = iter_metronome_chunks(
+                bpm=request.bpm,
+                duration_seconds=request.duration,
+                sample_rate=request.sample_rate,
+                pattern=request.pattern,
+                chunk_samples=self.chunk_samples,
+                timing=request.timing,
+            )
+            if request.format == "mp3":
+                data = iter_mp3_bytes(chunks, request.sample_rate, bitrate=request.bitrate)
+            else:
+                num_samples = count_samples(
+                    request.bpm,
+                    request.duration,
+                    request.sample_rate,
+                    request.pattern,
+                    request.timing,
+                )
+                data = iter_wav_bytes(chunks, request.sample_rate, num_samples)
+
+            try:
+                for block in data:
+                    if not stream.put(block):
+                        return
+            finally:
+                data.close()
+        except Exception as e:
+            stream.put(e)
+            return
+        stream.put(_END)
+
+
+class MetronomeServer(ThreadingHTTPServer):
+    """RenderService を保持するHTTPサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service=None, quiet=False):
+        """
+        Args:
+            address: (ホスト, ポート)
+            service: RenderService（None ならデフォルト設定で作成）
+            quiet: アクセスログを出力しない
+        """
+        self.service = service or RenderService()
+        self.quiet = quiet
+        super().__init__(address, _RenderHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+class _RenderHandler(BaseHTTPRequestHandler):
+    """GET/POST /render と GET /health を処理する"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "metronome"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.service.info()})
+        elif url.path == "/render":
+            query = parse_qs(url.query, keep_blank_values=True)
+            self._render({name: values[-1] for name, values in query.items()})
+        else:
+            self._send_json(404, {"error": f"見つかりません: {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/render":
+            self._send_json(404, {"error": f"見つかりません: {url.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"JSONが正しくありません: {e}"})
+            return
+        if not isinstance(params, dict):
+            self._send_json(400, {"error": "JSONオブジェクトで指定してください"})
+            return
+        self._render(params)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _render(self, params):
+        service = self.server.service
+        try:
+            request = parse_render_request(params, service.max_duration)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            stream = service.open(request)
+        except ServiceBusyError as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+
+        try:
+            # 最初のブロックが出るまでに失敗した場合はエラーとして返せる
+            try:
+                first = next(stream, b"")
+            except Exception as e:
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", FORMATS[request.format])
+            self.send_header("Content-Disposition", f'attachment; filename="{request.filename}"')
+            self.send_header("X-Metronome-Request", json.dumps(asdict(request)))
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            try:
+                self._write_chunk(first)
+                for block in stream:
+                    self._write_chunk(block)
+                self.wfile.write(b"0\r\n\r\n")
+            except Exception as e:
+                # ヘッダ送信後はステータスを変えられないため、接続を切って不完全だと伝える
+                self.close_connection = True
+                if not isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                    self.log_error("生成に失敗しました: %s", e)
+        finally:
+            stream.close()
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(b"%X\r\n" % len(data))
+            self.wfile.write(data)
+            self.wfile.write(b"\r\n")
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None, quiet=False):
+    """
+    サーバーを起動し、Ctrl+C まで処理を続ける
+
+    Args:
+        host: 待ち受けるホスト
+        port: 待ち受けるポート
+        service: RenderService（None ならデフォルト設定で作成）
+        quiet: アクセスログを出力しない
+    """
+    with MetronomeServer((host, port), service, quiet) as server:
+        server.service.warm()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,267 @@
+"""テンポマップ（テンポの段階的な変化・連続的な加速/減速）"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 区間の変化のしかた
+# hold: 一定のテンポ
+# linear: 時間に対して直線的に変化
+# exp: 時間に対して指数的に変化（一定の比率で変化）
+# step: 小節ごとに一定で、小節の境目で段階的に変化（開始〜終了のテンポを等間隔に割り当てる）
+SHAPES = ("hold", "linear", "exp", "step")
+
+# 記法の区切り記号 → 変化のしかた
+_SHAPE_SYMBOLS = {"-": "linear", "~": "exp", ">": "step"}
+_SYMBOL_NAMES = {shape: symbol for symbol, shape in _SHAPE_SYMBOLS.items()}
+
+_NUMBER = r"\d+(?:\.\d+)?"
+_SEGMENT_RE = re.compile(
+    rf"^(?P<start>{_NUMBER})(?:(?P<symbol>[-~>])(?P<end>{_NUMBER}))?"
+    rf"@(?P<length>{_NUMBER})(?P<unit>[sm]?)$"
+)
+
+# 長さの単位 → 秒
+_UNIT_SECONDS = {"s": 1, "m": 60}
+
+
+@dataclass(frozen=True)
+class TempoSegment:
+    """
+    テンポマップの1区間
+
+    Attributes:
+        start_bpm: 区間の開始時のテンポ
+        end_bpm: 区間の終了時のテンポ（step では最後の小節のテンポ）
+        shape: 変化のしかた（SHAPES のいずれか）
+        length: 区間の長さ（unit が "bars" なら小節数、"seconds" なら秒）
+        unit: 長さの単位（"bars" または "seconds"）
+    """
+
+    start_bpm: float
+    end_bpm: float
+    shape: str
+    length: float
+    unit: str = "bars"
+
+
+@dataclass(frozen=True)
+class TempoMap:
+    """
+    区間を順につなげたテンポマップ
+
+    1小節はパターンの1サイクル（4beat なら4拍、4to8 なら8拍）。
+    最後の区間が終わった後は最後のテンポのまま続く。
+    """
+
+    segments: tuple
+
+    @property
+    def start_bpm(self):
+        """最初のテンポ"""
+        return self.segments[0].start_bpm
+
+    @property
+    def end_bpm(self):
+        """最後のテンポ"""
+        return self.segments[-1].end_bpm
+
+    @property
+    def canonical(self):
+        """正規化した記法（キャッシュのキー）"""
+        return " ".join(_format_segment(segment) for segment in self.segments)
+
+    def total_beats(self, cycle_beats):
+        """
+        テンポマップ全体の拍数
+
+        Args:
+            cycle_beats: 1小節（パターンの1サイクル）の拍数
+        """
+        return sum(piece[0] for piece in self._pieces(cycle_beats))
+
+    def total_seconds(self, cycle_beats):
+        """
+        テンポマップ全体の秒数
+
+        Args:
+            cycle_beats: 1小節（パターンの1サイクル）の拍数
+        """
+        return sum(piece[1] for piece in self._pieces(cycle_beats))
+
+    def beat_times(self, beats, cycle_beats):
+        """
+        拍の位置（先頭からの拍数）を時刻（秒）に変換する
+
+        区間ごとにテンポの逆数の積分を閉じた式で計算するため、誤差は蓄積しない。
+
+        Args:
+            beats: 拍の位置の配列（昇順である必要はない）
+            cycle_beats: 1小節（パターンの1サイクル）の拍数
+
+        Returns:
+            numpy.ndarray: 各拍の時刻（秒）
+        """
+        import numpy as np
+
+        beats = np.asarray(beats, dtype=np.float64)
+        pieces = self._pieces(cycle_beats)
+        # 最後のテンポのまま続く区間を末尾に追加する
+        pieces.append((math.inf, math.inf, self.end_bpm, self.end_bpm, "hold"))
+
+        piece_beats = np.array([piece[0] for piece in pieces])
+        piece_seconds = np.array([piece[1] for piece in pieces])
+        start_beats = np.concatenate([[0.0], np.cumsum(piece_beats[:-1])])
+        start_seconds = np.concatenate([[0.0], np.cumsum(piece_seconds[:-1])])
+
+        index = np.searchsorted(start_beats, beats, side="right") - 1
+        index = np.maximum(index, 0)
+        times = np.empty_like(beats)
+        for i, (length_beats, seconds, start_bpm, end_bpm, shape) in enumerate(pieces):
+            selected = index == i
+            if not np.any(selected):
+                continue
+            local = beats[selected] - start_beats[i]
+            times[selected] = start_seconds[i] + _local_times(
+                local, start_bpm, end_bpm, shape, seconds
+            )
+        return times
+
+    def _pieces(self, cycle_beats):
+        """
+        区間を (拍数, 秒数, 開始テンポ, 終了テンポ, 変化のしかた) の列に展開する
+
+        step は小節ごとの hold に展開する（変化のしかたは hold / linear / exp のみ）。
+        """
+        pieces = []
+        for segment in self.segments:
+            start, end = segment.start_bpm, segment.end_bpm
+            if segment.shape == "step":
+                bars = int(segment.length)
+                for bar in range(bars):
+                    bpm = start + (end - start) * bar / (bars - 1) if bars > 1 else start
+                    pieces.append((cycle_beats, 60 * cycle_beats / bpm, bpm, bpm, "hold"))
+                continue
+
+            shape = "hold" if start == end else segment.shape
+            if segment.unit == "bars":
+                length_beats = segment.length * cycle_beats
+                seconds = _segment_seconds(length_beats, start, end, shape)
+            else:
+                seconds = segment.length
+                length_beats = _segment_beats(seconds, start, end, shape)
+            pieces.append((length_beats, seconds, start, end, shape))
+        return pieces
+
+
+def parse_tempo_map(text):
+    """
+    テンポマップの記法を TempoMap に変換する
+
+    記法: 空白またはカンマ区切りの区間の列。各区間は「テンポ@長さ」。
+      120@8          120 BPM で8小節
+      160-300@96     160→300 BPM へ96小節かけて直線的に加速
+      160~300@10m    160→300 BPM へ10分かけて指数的に加速（一定の比率で変化）
+      160>300@15     160〜300 BPM を15小節に等間隔に割り当て、小節ごとに段階的に変化
+    長さは小節数（1小節 = パターンの1サイクル）、または "s"（秒）/ "m"（分）付きの時間。
+    段階的な変化（>）の長さは小節数（整数）で指定する。
+
+    Args:
+        text: テンポマップの記法（TempoMap をそのまま渡すこともできる）
+
+    Returns:
+        TempoMap: テンポマップ
+
+    Raises:
+        ValueError: 記法が正しくない場合
+    """
+    if isinstance(text, TempoMap):
+        return text
+
+    segments = []
+    for token in text.replace(",", " ").split():
+        match = _SEGMENT_RE.match(token)
+        if match is None:
+            raise ValueError(f"テンポマップの区間が正しくありません: {token!r}（例: 160-300@96）")
+        start = float(match["start"])
+        end = float(match["end"]) if match["end"] else start
+        shape = _SHAPE_SYMBOLS[match["symbol"]] if match["symbol"] else "hold"
+        length = float(match["length"])
+        unit = "seconds" if match["unit"] else "bars"
+        if unit == "seconds":
+            length *= _UNIT_SECONDS[match["unit"]]
+
+        if start <= 0 or end <= 0:
+            raise ValueError(f"テンポは正の値を指定してください: {token!r}")
+        if length <= 0:
+            raise ValueError(f"区間の長さは正の値を指定してください: {token!r}")
+        if shape == "step" and (unit != "bars" or not length.is_integer()):
+            raise ValueError(
+                f"段階的な変化（>）の長さは小節数（整数）で指定してください: {token!r}"
+            )
+        segments.append(TempoSegment(start, end, shape, length, unit))
+
+    if not segments:
+        raise ValueError("テンポマップが空です")
+    return TempoMap(tuple(segments))
+
+
+def _format_segment(segment):
+    """区間を記法に戻す"""
+    text = _format_number(segment.start_bpm)
+    if segment.shape != "hold":
+        text += _SYMBOL_NAMES[segment.shape] + _format_number(segment.end_bpm)
+    text += "@" + _format_number(segment.length)
+    if segment.unit == "seconds":
+        text += "s"
+    return text
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _segment_seconds(length_beats, start_bpm, end_bpm, shape):
+    """区間の拍数から秒数を求める"""
+    if shape == "hold":
+        return 60 * length_beats / start_bpm
+    if shape == "linear":
+        # 平均テンポは (開始 + 終了) / 2
+        return 120 * length_beats / (start_bpm + end_bpm)
+    # exp: 拍数 = 開始テンポ × 秒数 × (r - 1) / (60 ln r)
+    ratio = end_bpm / start_bpm
+    return 60 * length_beats * math.log(ratio) / (start_bpm * (ratio - 1))
+
+
+def _segment_beats(seconds, start_bpm, end_bpm, shape):
+    """区間の秒数から拍数を求める"""
+    if shape == "hold":
+        return start_bpm * seconds / 60
+    if shape == "linear":
+        return (start_bpm + end_bpm) * seconds / 120
+    ratio = end_bpm / start_bpm
+    return start_bpm * seconds * (ratio - 1) / (60 * math.log(ratio))
+
+
+def _local_times(beats, start_bpm, end_bpm, shape, seconds) -> "np.ndarray":
+    """
+    区間の先頭からの拍数を、区間の先頭からの秒数に変換する
+
+    テンポ f(t) [BPM] の区間で拍数は b(t) = ∫ f / 60 dt。その逆関数を閉じた式で計算する。
+    """
+    import numpy as np
+
+    if shape == "hold":
+        return 60 * beats / start_bpm
+    if shape == "linear":
+        # b = (A t + (B - A) t² / (2T)) / 60 を t について解く（桁落ちしない形）
+        slope = (end_bpm - start_bpm) / seconds
+        c = 60 * beats
+        return 2 * c / (start_bpm + np.sqrt(start_bpm**2 + 2 * slope * c))
+    # exp: b = A T (r^(t/T) - 1) / (60 ln r) を t について解く
+    log_ratio = math.log(end_bpm / start_bpm)
+    return seconds / log_ratio * np.log1p(60 * beats * log_ratio / (start_bpm * seconds))
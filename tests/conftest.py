@@ -0,0 +1,48 @@
+"""Shared test fixtures"""
+
+import sys
+
+import pytest
+from pydub import AudioSegment
+
+FAKE_ENCODER = """#!{python}
+import re
+import sys
+data = sys.stdin.buffer.read()
+if b"FAIL" in data:
+    sys.stderr.write("boom")
+    sys.exit(1)
+if "-filter_complex" in sys.argv:
+    # 複数出力: atrim の範囲ごとに、対応する出力ファイルへ書き込む
+    graph = sys.argv[sys.argv.index("-filter_complex") + 1]
+    trims = re.findall(r"start_sample=(\\d+):end_sample=(\\d+)", graph)
+    outputs = [sys.argv[i + 6] for i, arg in enumerate(sys.argv) if arg == "-map"]
+    for (start, end), output in zip(trims, outputs):
+        with open(output, "wb") as f:
+            f.write(data[int(start) * 2 : int(end) * 2])
+elif sys.argv[-1] == "pipe:1":
+    sys.stdout.buffer.write(data)
+else:
+    with open(sys.argv[-1], "wb") as f:
+        f.write(data)
+"""
+
+
+@pytest.fixture
+def fake_encoder(tmp_path, monkeypatch):
+    """Replace ffmpeg with a script that stores the raw PCM it receives"""
+    if sys.platform == "win32":
+        pytest.skip("fake encoder uses a shebang")
+    script = tmp_path / "fake_ffmpeg"
+    script.write_text(FAKE_ENCODER.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setattr(AudioSegment, "converter", str(script))
+    return script
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the render cache out of the user's home directory"""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("METRONOME_CACHE_DIR", str(cache_dir))
+    return cache_dir
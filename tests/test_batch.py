@@ -0,0 +1,292 @@
+"""Tests for batch generation"""
+
+import json
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from src.metronome.batch import (
+    BatchTask,
+    expand_tasks,
+    render_many,
+    render_variants,
+    run_batch,
+)
+from src.metronome.cache import RenderCache
+from src.metronome.cli import _parse_bpm_range, main
+from src.metronome.core import (
+    _compute_onsets,
+    _make_clicks,
+    _render_clicks,
+    _to_int16,
+    generate_metronome,
+)
+from src.metronome.patterns import compile_pattern
+
+
+class TestExpandTasks:
+    """Tests for task expansion"""
+
+    def test_cartesian_product(self):
+        """Test every combination becomes one task"""
+        tasks = expand_tasks(
+            [160, 170], patterns=["4beat", "4to8"], durations=[30, 60], sample_rates=[44100]
+        )
+        assert len(tasks) == 8
+        assert len({task.output_file for task in tasks}) == 8
+
+    def test_output_layout(self):
+        """Test files are organized per pattern like the batch script"""
+        tasks = expand_tasks(
+            [160], patterns=["4to8"], sample_rates=[44100, 48000], output_dir="out"
+        )
+        assert [task.output_file for task in tasks] == [
+            os.path.join("out", "4to8", "metronome_bpm160_60sec.mp3"),
+            os.path.join("out", "4to8", "metronome_bpm160_60sec_48000hz.mp3"),
+        ]
+
+
+class TestRunBatch:
+    """Tests for the parallel batch executor"""
+
+    def test_sequential_run_writes_files(self, fake_encoder, tmp_path):
+        """Test tasks are rendered and saved"""
+        tasks = expand_tasks([120, 150], durations=[2], output_dir=str(tmp_path))
+        results = list(run_batch(tasks, jobs=1))
+        assert [result.error for result in results] == [None, None]
+        data = np.frombuffer(open(tasks[1].output_file, "rb").read(), "<i2")
+        np.testing.assert_array_equal(data, generate_metronome(bpm=150, duration_seconds=2))
+
+    def test_errors_are_isolated_per_task(self, tmp_path):
+        """Test a failing task does not stop the others in the process pool"""
+        tasks = [
+            BatchTask(0, 2, 44100, "4beat", str(tmp_path / "bad.mp3")),
+            BatchTask(0, 2, 44100, "4to8", str(tmp_path / "bad2.mp3")),
+        ]
+        results = {result.task: result.error for result in run_batch(tasks, jobs=2)}
+        assert set(results) == set(tasks)
+        assert all("ZeroDivisionError" in error for error in results.values())
+
+    def test_cache_hits_on_rerun(self, fake_encoder, tmp_path):
+        """Test unchanged tasks are copied from the render cache"""
+        cache = RenderCache(str(tmp_path / "cache"))
+        tasks = expand_tasks([120, 150], durations=[1], output_dir=str(tmp_path / "out"))
+        assert not any(result.cached for result in run_batch(tasks, jobs=1, cache=cache))
+
+        os.remove(tasks[0].output_file)
+        results = list(run_batch(tasks, jobs=1, cache=cache))
+        assert all(result.cached for result in results)
+        assert os.path.exists(tasks[0].output_file)
+
+
+class TestRenderMany:
+    """Tests for rendering many specs with shared precomputation"""
+
+    def test_matches_individual_renders(self):
+        """Test every result equals a standalone generate_metronome call"""
+        tasks = expand_tasks(
+            [160, 233, 300],
+            patterns=["4beat", "4to8", "A x/3 x/3 x/3 . x"],
+            durations=[7, 20, 13],
+            sample_rates=[22050, 48000],
+        )
+        tasks.append(BatchTask(173, 11, 44100, "4to8", "exact.mp3", timing="exact"))
+        results = list(render_many(tasks))
+        assert sorted(map(id, (task for task, _ in results))) == sorted(map(id, tasks))
+        for task, wave_data in results:
+            expected = generate_metronome(
+                task.bpm, task.duration, task.sample_rate, task.pattern, timing=task.timing
+            )
+            np.testing.assert_array_equal(wave_data, expected)
+
+    @pytest.mark.parametrize("timing", ["accumulate", "exact"])
+    @pytest.mark.parametrize(
+        "bpm,pattern",
+        [
+            (257, "A x/8 x/8 x/8 x/8 x/8 x/8 x/8 x/8"),
+            (300, "A x/8 x/8 x/8 x/8 x/8 x/8 x/8 x/8"),
+            (700, "A x x x/4"),
+            (700, "4to8"),
+        ],
+    )
+    def test_tail_past_shorter_duration(self, bpm, pattern, timing):
+        """Test a click overflowing a shorter duration is dropped like a standalone render"""
+        tasks = [
+            BatchTask(bpm, duration, 44100, pattern, f"{duration}.mp3", timing=timing)
+            for duration in range(1, 13)
+        ]
+        for task, wave_data in render_many(tasks):
+            expected = generate_metronome(
+                task.bpm, task.duration, task.sample_rate, task.pattern, timing=task.timing
+            )
+            np.testing.assert_array_equal(wave_data, expected)
+
+    def test_groups_by_sample_rate(self):
+        """Test results come out grouped by sample rate"""
+        tasks = expand_tasks([120, 130], durations=[1], sample_rates=[22050, 44100])
+        rates = [task.sample_rate for task, _ in render_many(tasks)]
+        assert rates == [22050, 22050, 44100, 44100]
+
+    def test_shared_prefix_results_are_independent(self):
+        """Test shorter durations are copies, not views of the longest render"""
+        tasks = expand_tasks([120], durations=[2, 5])
+        results = dict(render_many(tasks))
+        results[tasks[1]][:] = 0
+        np.testing.assert_array_equal(
+            results[tasks[0]], generate_metronome(bpm=120, duration_seconds=2)
+        )
+
+    def test_is_lazy(self):
+        """Test items are rendered one group at a time"""
+        tasks = expand_tasks([120, 0], durations=[1])
+        results = render_many(tasks)
+        task, _ = next(results)
+        assert task.bpm == 120
+        with pytest.raises(ZeroDivisionError):
+            next(results)
+
+    def test_invalid_timing(self):
+        """Test an unknown timing mode is rejected before rendering starts"""
+        with pytest.raises(ValueError):
+            next(render_many([BatchTask(120, 1, 44100, "4beat", "x.mp3", timing="fast")]))
+
+
+class TestRenderVariants:
+    """Tests for rendering several sample rates and formats from one schedule"""
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"bpm": 173, "duration": 7, "pattern": "4to8"},
+            {"bpm": 173, "duration": 7, "pattern": "A x/3 x/3 x/3", "timing": "exact"},
+            {"bpm": None, "duration": None, "pattern": "4beat", "tempo_map": "120-200@2"},
+        ],
+    )
+    def test_matches_separate_renders(self, fake_encoder, tmp_path, kwargs):
+        """Test each output equals a separate generate_metronome call at that rate"""
+        base = str(tmp_path / "out" / "click")
+        manifest = render_variants(
+            sample_rates=[22050, 44100, 48000], output_base=base, workers=2, **kwargs
+        )
+        assert [(o["format"], o["sample_rate"]) for o in manifest["outputs"]] == [
+            (format, rate) for rate in (22050, 44100, 48000) for format in ("wav", "mp3")
+        ]
+        for output in manifest["outputs"]:
+            expected = generate_metronome(
+                kwargs["bpm"],
+                kwargs["duration"],
+                output["sample_rate"],
+                kwargs["pattern"],
+                timing=kwargs.get("timing", "accumulate"),
+                tempo_map=kwargs.get("tempo_map"),
+            )
+            if output["format"] == "wav":
+                with wave.open(output["path"]) as f:
+                    assert f.getframerate() == output["sample_rate"]
+                    data = np.frombuffer(f.readframes(f.getnframes()), "<i2")
+            else:
+                data = np.frombuffer(open(output["path"], "rb").read(), "<i2")
+            np.testing.assert_array_equal(data, expected)
+            assert output["samples"] == len(expected)
+            assert output["path"] == f"{base}_{output['sample_rate']}hz.{output['format']}"
+
+    def test_manifest(self, tmp_path):
+        """Test the manifest describes the run and is written as JSON"""
+        manifest_file = tmp_path / "manifest.json"
+        manifest = render_variants(
+            120,
+            2,
+            sample_rates=[8000, 16000],
+            formats=["wav"],
+            output_base=str(tmp_path / "m"),
+            pattern="A x x x",
+            manifest_file=str(manifest_file),
+        )
+        assert json.loads(manifest_file.read_text()) == manifest
+        assert manifest["pattern"] == compile_pattern("4beat").canonical
+        assert manifest["tempo_map"] is None
+        first = manifest["outputs"][0]
+        assert first["bytes"] == os.path.getsize(first["path"])
+        assert first["seconds"] == pytest.approx(2)
+        assert len(first["sha256"]) == 64
+        assert first["sha256"] != manifest["outputs"][1]["sha256"]
+
+    def test_tiles_reach_last_cycle(self, monkeypatch, tmp_path):
+        """Test a rate whose periodic tile ends short of the last cycle matches the full render"""
+        empty = np.empty
+
+        def poisoned(*args, **kwargs):
+            buffer = empty(*args, **kwargs)
+            buffer.fill(7)
+            return buffer
+
+        monkeypatch.setattr(np, "empty", poisoned)
+        manifest = render_variants(
+            69, 10, sample_rates=[48000], formats=["wav"], output_base=str(tmp_path / "v")
+        )
+        positions, variants, total_samples = _compute_onsets(69, 10, 48000, "4beat")
+        clicks = _make_clicks(48000)
+        expected = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+        with wave.open(manifest["outputs"][0]["path"]) as f:
+            data = np.frombuffer(f.readframes(f.getnframes()), "<i2")
+        np.testing.assert_array_equal(data, expected)
+
+    def test_invalid_format(self, tmp_path):
+        """Test an unknown format is rejected before anything is written"""
+        with pytest.raises(ValueError):
+            render_variants(120, 1, formats=["ogg"], output_base=str(tmp_path / "x"))
+        assert not list(tmp_path.iterdir())
+
+
+class TestBatchCli:
+    """Tests for the batch subcommand"""
+
+    def test_parse_bpm_range(self):
+        """Test START:END[:STEP] ranges include the end"""
+        assert _parse_bpm_range("160:200:20") == [160, 180, 200]
+        assert _parse_bpm_range("120:122") == [120, 121, 122]
+
+    @pytest.mark.parametrize("value", ["120", "a:b", "100:200:0"])
+    def test_parse_bpm_range_invalid(self, value):
+        """Test malformed ranges are rejected"""
+        with pytest.raises(Exception, match="START:END"):
+            _parse_bpm_range(value)
+
+    def test_batch_subcommand(self, fake_encoder, tmp_path):
+        """Test the batch subcommand renders every requested file"""
+        status = main(
+            [
+                "batch",
+                "--bpm-range",
+                "120:130:10",
+                "--bpm",
+                "200",
+                "--pattern",
+                "4beat",
+                "4to8",
+                "--duration",
+                "1",
+                "--jobs",
+                "1",
+                "-o",
+                str(tmp_path),
+            ]
+        )
+        assert status == 0
+        assert len(list(tmp_path.glob("4beat/*.mp3"))) == 3
+        assert len(list(tmp_path.glob("4to8/*.mp3"))) == 3
+
+    def test_batch_prints_cache_stats(self, fake_encoder, tmp_path, capsys):
+        """Test hit/miss statistics are reported at the end of a batch"""
+        argv = ["batch", "--bpm", "120", "130", "--duration", "1", "-j", "1", "-o", str(tmp_path)]
+        main(argv)
+        assert "キャッシュ: ヒット 0 / ミス 2" in capsys.readouterr().out
+        main(argv)
+        assert "キャッシュ: ヒット 2 / ミス 0" in capsys.readouterr().out
+
+    def test_batch_requires_bpm(self):
+        """Test the batch subcommand needs at least one BPM"""
+        with pytest.raises(SystemExit):
+            main(["batch"])
@@ -0,0 +1,111 @@
+"""Tests for the on-disk render cache"""
+
+import os
+import time
+
+from src.metronome.cache import (
+    RenderCache,
+    cached_save,
+    default_cache_dir,
+    render_spec,
+)
+
+
+def _writer(content, calls):
+    def save(output_file):
+        calls.append(output_file)
+        with open(output_file, "wb") as f:
+            f.write(content)
+
+    return save
+
+
+class TestRenderSpec:
+    """Tests for cache keys"""
+
+    def test_key_is_stable(self):
+        """Test equal specs hash to the same key"""
+        assert RenderCache.key(render_spec(120, 60, 44100, "4beat")) == RenderCache.key(
+            render_spec(120, 60, 44100, "4beat")
+        )
+
+    def test_every_parameter_changes_key(self):
+        """Test each render parameter is part of the key"""
+        base = render_spec(120, 60, 44100, "4beat")
+        variants = [
+            render_spec(121, 60, 44100, "4beat"),
+            render_spec(120, 30, 44100, "4beat"),
+            render_spec(120, 60, 48000, "4beat"),
+            render_spec(120, 60, 44100, "4to8"),
+            render_spec(120, 60, 44100, "4beat", bitrate="320k"),
+            render_spec(120, 60, 44100, "4beat", format="wav"),
+        ]
+        keys = {RenderCache.key(spec) for spec in variants + [base]}
+        assert len(keys) == len(variants) + 1
+
+    def test_spec_includes_version(self):
+        """Test the library version invalidates old entries"""
+        assert "version" in render_spec(120, 60, 44100, "4beat")
+
+    def test_default_cache_dir_from_env(self, monkeypatch, tmp_path):
+        """Test METRONOME_CACHE_DIR overrides the cache location"""
+        monkeypatch.setenv("METRONOME_CACHE_DIR", str(tmp_path))
+        assert default_cache_dir() == str(tmp_path)
+
+
+class TestRenderCache:
+    """Tests for fetch/store and eviction"""
+
+    def test_miss_then_hit(self, tmp_path):
+        """Test the second save is served from the cache"""
+        cache = RenderCache(str(tmp_path / "cache"))
+        spec = render_spec(120, 60, 44100, "4beat")
+        calls = []
+        output = str(tmp_path / "a.mp3")
+
+        assert cached_save(cache, spec, output, _writer(b"audio", calls)) is False
+        os.remove(output)
+        assert cached_save(cache, spec, output, _writer(b"other", calls)) is True
+
+        assert calls == [output]
+        assert open(output, "rb").read() == b"audio"
+        assert cache.info() == {"hits": 1, "misses": 1}
+
+    def test_no_cache(self, tmp_path):
+        """Test passing no cache always renders"""
+        calls = []
+        output = str(tmp_path / "a.mp3")
+        spec = render_spec(120, 60, 44100, "4beat")
+        cached_save(None, spec, output, _writer(b"audio", calls))
+        cached_save(None, spec, output, _writer(b"audio", calls))
+        assert len(calls) == 2
+
+    def test_eviction_removes_least_recently_used(self, tmp_path):
+        """Test the cache stays under its size limit"""
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+        specs = [render_spec(bpm, 60, 44100, "4beat") for bpm in (100, 110, 120)]
+        for spec in specs[:2]:
+            cached_save(cache, spec, str(tmp_path / "x.mp3"), _writer(b"a" * 100, []))
+
+        # 最初のエントリを使用して最近使ったことにする
+        old = time.time() - 100
+        os.utime(cache.path(cache.key(specs[1]), ".mp3"), (old, old))
+        cached_save(cache, specs[0], str(tmp_path / "x.mp3"), _writer(b"a" * 100, []))
+
+        cached_save(cache, specs[2], str(tmp_path / "x.mp3"), _writer(b"a" * 100, []))
+        assert os.path.exists(cache.path(cache.key(specs[0]), ".mp3"))
+        assert not os.path.exists(cache.path(cache.key(specs[1]), ".mp3"))
+        assert os.path.exists(cache.path(cache.key(specs[2]), ".mp3"))
+
+    def test_directory_scanned_only_when_over_limit(self, tmp_path, monkeypatch):
+        """Test stores under the limit reuse the tracked size instead of walking the cache"""
+        walks = []
+        walk = os.walk
+        monkeypatch.setattr(os, "walk", lambda *args: walks.append(args) or walk(*args))
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=450)
+        for bpm in range(100, 105):
+            spec = render_spec(bpm, 60, 44100, "4beat")
+            cached_save(cache, spec, str(tmp_path / "x.mp3"), _writer(b"a" * 100, []))
+        # 最初の登録と、上限を超えた5つ目の登録の時だけ
+        assert len(walks) == 2
+        assert sum(len(files) for _, _, files in walk(cache.directory)) == 4
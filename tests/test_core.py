@@ -1,14 +1,63 @@
 """Tests for core metronome generation logic"""
 
+import tracemalloc
+
 import numpy as np
 import pytest
 
 from src.metronome.core import (
+    TIMING_MODES,
+    ClickBank,
+    _compute_onsets,
+    _find_period,
     _generate_4beat_pattern,
     _generate_4to8_pattern,
+    _make_clicks,
+    _render_clicks,
+    _render_tiled,
+    _to_int16,
+    click_bank,
+    count_samples,
     generate_click_sound,
     generate_metronome,
+    iter_metronome_chunks,
 )
+from src.metronome.patterns import compile_pattern
+
+
+def _reference_metronome(bpm, duration_seconds, sample_rate, pattern):
+    """旧実装と同じ逐次ループによるリファレンス（比較用）"""
+    beat_interval = 60.0 / bpm
+    click_normal = generate_click_sound(sample_rate, frequency=800)
+    click_accent = generate_click_sound(sample_rate, frequency=1600)
+    click_samples = len(click_normal)
+
+    if pattern == "4to8":
+        half = beat_interval / 2
+        steps = [(beat_interval, True), (beat_interval, False)] + [(half, False)] * 4
+        steps = steps * 2
+        cycle_duration = beat_interval * 8
+    else:
+        steps = [(beat_interval, True)] + [(beat_interval, False)] * 3
+        cycle_duration = beat_interval * 4
+
+    num_cycles = int(duration_seconds / cycle_duration)
+    if duration_seconds % cycle_duration > 0:
+        num_cycles += 1
+    total_samples = int(sample_rate * (num_cycles * cycle_duration))
+
+    wave = np.zeros(total_samples)
+    current_time = 0.0
+    for _ in range(num_cycles):
+        for interval, accent in steps:
+            position = int(current_time * sample_rate)
+            click = click_accent if accent else click_normal
+            if position + click_samples <= total_samples:
+                wave[position : position + click_samples] += click
+            current_time += interval
+
+    wave = np.clip(wave, -1.0, 1.0)
+    return (wave * 32767).astype(np.int16)
 
 
 class TestClickSound:
@@ -38,6 +87,69 @@ class TestClickSound:
         assert len(sound) == expected_samples
 
 
+class TestClickBank:
+    """Tests for the memoized click sound bank"""
+
+    def test_returns_same_waveform_as_generator(self):
+        """Test cached clicks match generate_click_sound"""
+        bank = ClickBank()
+        np.testing.assert_array_equal(
+            bank.get(22050, 800, 0.05), generate_click_sound(22050, 800, 0.05)
+        )
+
+    def test_hit_and_miss_counters(self):
+        """Test repeated lookups are served from the cache"""
+        bank = ClickBank()
+        first = bank.get(44100, 800)
+        second = bank.get(44100, 800)
+        bank.get(44100, 1600)
+        assert first is second
+        assert bank.info() == {"hits": 1, "misses": 2, "size": 2, "maxsize": 32}
+
+    def test_arrays_are_read_only(self):
+        """Test cached clicks cannot be modified by callers"""
+        click = ClickBank().get()
+        with pytest.raises(ValueError):
+            click[0] = 1.0
+
+    def test_lru_eviction(self):
+        """Test least recently used clicks are evicted first"""
+        bank = ClickBank(maxsize=2)
+        bank.get(44100, 800)
+        bank.get(44100, 1600)
+        bank.get(44100, 800)
+        bank.get(44100, 1000)
+        assert bank.info()["size"] == 2
+        bank.get(44100, 800)
+        assert bank.hits == 2
+        bank.get(44100, 1600)
+        assert bank.misses == 4
+
+    def test_shrinking_maxsize_evicts(self):
+        """Test lowering maxsize drops the oldest entries"""
+        bank = ClickBank(maxsize=4)
+        for frequency in (400, 800, 1200):
+            bank.get(44100, frequency)
+        bank.maxsize = 1
+        assert bank.info()["size"] == 1
+        with pytest.raises(ValueError):
+            bank.maxsize = 0
+
+    def test_clear_resets_stats(self):
+        """Test clear empties the bank and counters"""
+        bank = ClickBank()
+        bank.get()
+        bank.clear()
+        assert bank.info() == {"hits": 0, "misses": 0, "size": 0, "maxsize": 32}
+
+    def test_generate_metronome_uses_shared_bank(self):
+        """Test pattern generators draw clicks from the shared bank"""
+        generate_metronome(bpm=120, duration_seconds=2, sample_rate=22050)
+        hits = click_bank.hits
+        generate_metronome(bpm=140, duration_seconds=2, sample_rate=22050, pattern="4to8")
+        assert click_bank.hits == hits + 2
+
+
 class TestMetronomeGeneration:
     """Tests for metronome pattern generation"""
 
@@ -130,6 +242,98 @@ class TestMetronomeGeneration:
         assert len(wave_22050) < len(wave_44100) < len(wave_48000)
 
 
+class TestChunkedGeneration:
+    """Tests for the streaming chunk iterator"""
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    @pytest.mark.parametrize("chunk_samples", [1000, 2205, 4096, 65536, 10**7])
+    def test_concatenation_matches_full_render(self, chunk_samples, pattern):
+        """Test concatenated chunks equal generate_metronome output"""
+        expected = generate_metronome(bpm=173, duration_seconds=7, pattern=pattern)
+        chunks = list(
+            iter_metronome_chunks(
+                bpm=173, duration_seconds=7, pattern=pattern, chunk_samples=chunk_samples
+            )
+        )
+        np.testing.assert_array_equal(np.concatenate(chunks), expected)
+
+    def test_fixed_chunk_size(self):
+        """Test all chunks but the last have the requested size"""
+        chunks = list(iter_metronome_chunks(bpm=120, duration_seconds=5, chunk_samples=3000))
+        assert all(len(chunk) == 3000 for chunk in chunks[:-1])
+        assert 0 < len(chunks[-1]) <= 3000
+        assert all(chunk.dtype == np.int16 for chunk in chunks)
+
+    def test_invalid_chunk_size(self):
+        """Test non-positive chunk sizes are rejected"""
+        with pytest.raises(ValueError):
+            next(iter_metronome_chunks(bpm=120, chunk_samples=0))
+
+
+class TestSynthesisDtype:
+    """Tests for the low-memory synthesis modes"""
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    @pytest.mark.parametrize("bpm", [20, 97, 173, 300])
+    def test_int32_matches_float64(self, bpm, pattern):
+        """Test integer accumulation is exact when clicks do not overlap"""
+        expected = generate_metronome(bpm=bpm, duration_seconds=10, pattern=pattern)
+        actual = generate_metronome(bpm=bpm, duration_seconds=10, pattern=pattern, dtype=np.int32)
+        np.testing.assert_array_equal(actual, expected)
+
+    @pytest.mark.parametrize("sample_rate", [22050, 44100, 48000])
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    def test_float32_within_one_lsb(self, sample_rate, pattern):
+        """Test float32 rounding differs from float64 by at most 1 LSB"""
+        expected = generate_metronome(
+            bpm=133, duration_seconds=10, sample_rate=sample_rate, pattern=pattern
+        )
+        actual = generate_metronome(
+            bpm=133,
+            duration_seconds=10,
+            sample_rate=sample_rate,
+            pattern=pattern,
+            dtype=np.float32,
+        )
+        assert actual.dtype == np.int16
+        assert len(actual) == len(expected)
+        assert np.abs(actual.astype(np.int32) - expected).max() <= 1
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.int32])
+    def test_overlapping_clicks_within_one_lsb(self, dtype):
+        """Test overlapping clicks stay within 1 LSB per overlap"""
+        positions = np.array([0, 500, 1000])
+        variants = np.array([1, 0, 1])
+        expected = _to_int16(_render_clicks(5000, positions, variants, _make_clicks(44100)))
+        actual = _to_int16(_render_clicks(5000, positions, variants, _make_clicks(44100, dtype)))
+        assert np.abs(actual.astype(np.int32) - expected).max() <= 2
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.int32])
+    def test_chunked_with_dtype(self, dtype):
+        """Test chunked output matches the full render for the same dtype"""
+        expected = generate_metronome(bpm=150, duration_seconds=5, dtype=dtype)
+        chunks = iter_metronome_chunks(bpm=150, duration_seconds=5, chunk_samples=4000, dtype=dtype)
+        np.testing.assert_array_equal(np.concatenate(list(chunks)), expected)
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.int32])
+    def test_working_memory_per_sample(self, dtype):
+        """Test the full-timeline path allocates at most 6 bytes per sample"""
+        positions, variants, total_samples = _compute_onsets(300, 60, 48000, "4to8")
+        clicks = _make_clicks(48000, dtype)
+        tracemalloc.start()
+        try:
+            _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak / total_samples < 6.5
+
+    def test_invalid_dtype(self):
+        """Test unsupported dtypes are rejected"""
+        with pytest.raises(ValueError):
+            generate_metronome(bpm=120, duration_seconds=1, dtype=np.int8)
+
+
 class TestPatternDifferences:
     """Tests to verify differences between patterns"""
 
@@ -161,5 +365,209 @@ class TestPatternDifferences:
         assert beats_4to8 > beats_4beat
 
 
+class TestVectorizedRenderer:
+    """Tests for the vectorized click placement engine"""
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    @pytest.mark.parametrize("sample_rate", [22050, 44100, 48000])
+    @pytest.mark.parametrize("bpm", [20, 97, 120, 173, 300])
+    def test_matches_reference_loop(self, bpm, sample_rate, pattern):
+        """Test output is identical to the sequential reference loop"""
+        expected = _reference_metronome(bpm, 13, sample_rate, pattern)
+        actual = generate_metronome(
+            bpm=bpm, duration_seconds=13, sample_rate=sample_rate, pattern=pattern
+        )
+        assert actual.dtype == np.int16
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_onsets_are_sorted_and_typed(self):
+        """Test onset table shape and ordering"""
+        positions, variants, total_samples = _compute_onsets(120, 5, 44100, "4to8")
+        assert len(positions) == len(variants) == 24
+        assert np.all(np.diff(positions) > 0)
+        assert positions[-1] < total_samples
+
+    def test_overlapping_clicks_fall_back_to_sequential_add(self):
+        """Test overlapping clicks are summed rather than overwritten"""
+        clicks = _make_clicks(44100)
+        click_samples = clicks.shape[1]
+        positions = np.array([0, click_samples // 2])
+        variants = np.array([0, 1])
+        wave = _render_clicks(click_samples * 2, positions, variants, clicks)
+
+        expected = np.zeros(click_samples * 2)
+        expected[:click_samples] += clicks[0]
+        expected[click_samples // 2 : click_samples // 2 + click_samples] += clicks[1]
+        np.testing.assert_array_equal(wave, expected)
+
+    def test_clicks_past_end_are_dropped(self):
+        """Test clicks that would overrun the buffer are skipped"""
+        clicks = _make_clicks(44100)
+        wave = _render_clicks(100, np.array([0]), np.array([0]), clicks)
+        assert np.all(wave == 0)
+
+
+class TestCycleTiling:
+    """Tests for the cycle tiling render path"""
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    @pytest.mark.parametrize("bpm", [60, 120, 133, 257])
+    def test_tiled_matches_full_render(self, bpm, pattern):
+        """Test tiled output is identical to rendering the whole timeline"""
+        positions, variants, total_samples = _compute_onsets(bpm, 30, 44100, pattern)
+        clicks = _make_clicks(44100)
+        expected = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+        tiled = _render_tiled(
+            total_samples, positions, variants, clicks, compile_pattern(pattern).sounding_steps
+        )
+        assert tiled is not None
+        np.testing.assert_array_equal(tiled, expected)
+
+    @pytest.mark.parametrize(
+        "pattern", [". x", ". . A", ". x x x", ". . A x", ". x . x x", ". x*7/8 x/8"]
+    )
+    @pytest.mark.parametrize("bpm", [60, 97, 120, 173, 240])
+    def test_leading_rest_tiles_from_first_click(self, bpm, pattern):
+        """Test periodic tiles start at the first click after a leading rest"""
+        positions, variants, total_samples = _compute_onsets(bpm, 20, 44100, pattern)
+        clicks = _make_clicks(44100)
+        expected = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+        tiled = _render_tiled(
+            total_samples, positions, variants, clicks, compile_pattern(pattern).sounding_steps
+        )
+        assert tiled is not None
+        np.testing.assert_array_equal(tiled, expected)
+
+    @pytest.mark.parametrize("timing", ["accumulate", "exact"])
+    @pytest.mark.parametrize("bpm,sample_rate", [(69, 48000), (88, 22050)])
+    def test_tiles_reach_last_cycle(self, monkeypatch, bpm, sample_rate, timing):
+        """Test no sample is left unwritten when the period ends short of the last cycle"""
+        empty = np.empty
+
+        def poisoned(*args, **kwargs):
+            buffer = empty(*args, **kwargs)
+            buffer.fill(7)
+            return buffer
+
+        positions, variants, total_samples = _compute_onsets(bpm, 10, sample_rate, "4beat", timing)
+        clicks = _make_clicks(sample_rate)
+        expected = _to_int16(_render_clicks(total_samples, positions, variants, clicks))
+        monkeypatch.setattr(np, "empty", poisoned)
+        tiled = _render_tiled(total_samples, positions, variants, clicks, 4)
+        assert tiled is not None
+        np.testing.assert_array_equal(tiled, expected)
+
+    def test_find_period_integer_cycle(self):
+        """Test a cycle with an integer sample count repeats every cycle"""
+        positions, _, _ = _compute_onsets(120, 10, 44100, "4beat")
+        assert _find_period(positions.reshape(-1, 4)) == (1, 88200)
+
+    def test_find_period_none_when_jittered(self):
+        """Test jittered cycles report no exact period"""
+        grid = np.array([[0, 10], [20, 31], [40, 50], [61, 70]])
+        assert _find_period(grid) is None
+
+    def test_overlapping_clicks_not_tiled(self):
+        """Test overlapping clicks are left to the full render path"""
+        clicks = _make_clicks(44100)
+        positions = np.array([0, 10, 20, 30])
+        variants = np.array([1, 0, 1, 0])
+        assert _render_tiled(50000, positions, variants, clicks, 2) is None
+
+
+class TestExactTiming:
+    """Tests for the drift-free rational onset scheduling mode"""
+
+    @staticmethod
+    def _ideal_positions(bpm, duration_seconds, sample_rate, pattern):
+        """Ideal (unrounded) onset positions from the beat index, step by step"""
+        compiled = compile_pattern(pattern)
+        offsets = np.concatenate([[0.0], np.cumsum([float(b) for b in compiled.step_fractions])])
+        cycle_seconds = compiled.cycle_beats * 60 / bpm
+        num_cycles = int(np.ceil(duration_seconds / cycle_seconds - 1e-12))
+        beats = np.arange(num_cycles)[:, np.newaxis] * compiled.cycle_beats + offsets[:-1]
+        return beats.ravel() * 60 * sample_rate / bpm
+
+    @pytest.mark.parametrize("sample_rate", [22050, 44100, 48000])
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8"])
+    def test_max_error_half_sample(self, pattern, sample_rate):
+        """Test every onset is within half a sample of its ideal position"""
+        for bpm in range(20, 301):
+            positions, _, _ = _compute_onsets(bpm, 600, sample_rate, pattern, timing="exact")
+            ideal = self._ideal_positions(bpm, 600, sample_rate, pattern)
+            assert len(positions) == len(ideal)
+            assert np.max(np.abs(positions - ideal)) <= 0.5 + 1e-6, bpm
+
+    def test_no_drift_over_long_duration(self):
+        """Test the last onset of a long render lands on the exact beat"""
+        positions, _, _ = _compute_onsets(173, 3600, 44100, "4beat", timing="exact")
+        # 拍 k の位置は k * 60 * 44100 / 173 を丸めたもの
+        k = len(positions) - 1
+        assert positions[-1] == (2 * k * 60 * 44100 + 173) // (2 * 173)
+
+    def test_default_is_accumulate(self):
+        """Test the default timing mode keeps the legacy output"""
+        assert TIMING_MODES[0] == "accumulate"
+        np.testing.assert_array_equal(
+            generate_metronome(bpm=173, duration_seconds=20),
+            _reference_metronome(173, 20, 44100, "4beat"),
+        )
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8", "A x/3 x/3 x/3 . x"])
+    def test_same_length_as_accumulate(self, pattern):
+        """Test both modes produce the same number of samples and clicks"""
+        accumulate = _compute_onsets(137, 90, 44100, pattern)
+        exact = _compute_onsets(137, 90, 44100, pattern, timing="exact")
+        assert len(exact[0]) == len(accumulate[0])
+        np.testing.assert_array_equal(exact[1], accumulate[1])
+        assert abs(exact[2] - accumulate[2]) <= 1
+
+    def test_float_bpm(self):
+        """Test fractional tempos are scheduled exactly"""
+        positions, _, _ = _compute_onsets(120.5, 60, 48000, "4beat", timing="exact")
+        ideal = self._ideal_positions(120.5, 60, 48000, "4beat")
+        assert np.max(np.abs(positions - ideal)) <= 0.5 + 1e-6
+
+    def test_chunks_match_full_render(self):
+        """Test the chunk iterator honours exact timing"""
+        expected = generate_metronome(bpm=173, duration_seconds=7, timing="exact")
+        chunks = iter_metronome_chunks(
+            bpm=173, duration_seconds=7, chunk_samples=4096, timing="exact"
+        )
+        np.testing.assert_array_equal(np.concatenate(list(chunks)), expected)
+
+    def test_invalid_timing(self):
+        """Test unknown timing modes are rejected"""
+        with pytest.raises(ValueError):
+            generate_metronome(bpm=120, duration_seconds=1, timing="drift")
+
+
+class TestRenderInto:
+    """Tests for rendering into a caller-provided buffer"""
+
+    @pytest.mark.parametrize("timing", ["accumulate", "exact"])
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8", ". x x/3 x/3 x/3"])
+    def test_matches_in_memory_render(self, pattern, timing):
+        """Test rendering into out gives the same samples"""
+        expected = generate_metronome(bpm=173, duration_seconds=20, pattern=pattern, timing=timing)
+        out = np.full(count_samples(173, 20, 44100, pattern, timing), 99, dtype=np.int16)
+        result = generate_metronome(
+            bpm=173, duration_seconds=20, pattern=pattern, timing=timing, out=out
+        )
+        assert result is out
+        np.testing.assert_array_equal(out, expected)
+
+    def test_wrong_length(self):
+        """Test a buffer of the wrong length is rejected"""
+        with pytest.raises(ValueError, match="長さ"):
+            generate_metronome(bpm=120, duration_seconds=1, out=np.zeros(10, dtype=np.int16))
+
+    def test_wrong_dtype(self):
+        """Test a non-int16 buffer is rejected"""
+        out = np.zeros(count_samples(120, 1), dtype=np.float64)
+        with pytest.raises(ValueError):
+            generate_metronome(bpm=120, duration_seconds=1, out=out)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,110 @@
+"""Tests for lazy imports of heavy dependencies"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import src.metronome
+import src.metronome.cli as cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded_modules(script):
+    """Run a script in a fresh interpreter and return which heavy modules it loaded"""
+    script += (
+        "\nimport sys\nprint(sorted(m for m in ('numpy', 'scipy', 'pydub') if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return completed.stdout.strip().splitlines()[-1]
+
+
+class TestLazyImports:
+    """Tests that startup paths do not pull in NumPy, SciPy or pydub"""
+
+    def test_package_import_is_light(self):
+        """Test importing the package loads no heavy dependency"""
+        assert _loaded_modules("import src.metronome") == "[]"
+
+    def test_cli_import_is_light(self):
+        """Test importing the CLI loads no heavy dependency"""
+        assert _loaded_modules("import src.metronome.cli") == "[]"
+
+    def test_help_is_light(self):
+        """Test --help exits before loading heavy dependencies"""
+        script = (
+            "import src.metronome.cli as cli\n"
+            "try:\n"
+            "    cli.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        assert _loaded_modules(script) == "[]"
+
+    @pytest.mark.parametrize(
+        "argv", [["play", "--help"], ["play"], ["serve", "--help"], ["serve", "--port", "x"]]
+    )
+    def test_subcommand_help_and_errors_are_light(self, argv):
+        """Test play and serve parse their arguments before loading heavy dependencies"""
+        script = (
+            "import src.metronome.cli as cli\n"
+            "try:\n"
+            f"    cli.main({argv!r})\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        assert _loaded_modules(script) == "[]"
+
+    def test_subcommand_defaults_match_modules(self):
+        """Test the CLI copies of the play and serve defaults match the library constants"""
+        from src.metronome import playback, server
+
+        assert cli.PLAY_DEFAULTS == {
+            "block_size": playback.DEFAULT_BLOCK_SIZE,
+            "buffer_blocks": playback.DEFAULT_BUFFER_BLOCKS,
+        }
+        assert cli.SERVE_DEFAULTS == {
+            "host": server.DEFAULT_HOST,
+            "port": server.DEFAULT_PORT,
+            "queue_chunks": server.DEFAULT_QUEUE_CHUNKS,
+            "max_duration": server.DEFAULT_MAX_DURATION,
+        }
+
+    def test_wav_output_skips_pydub(self, tmp_path):
+        """Test writing a WAV file never imports pydub"""
+        output = str(tmp_path / "out.wav")
+        script = (
+            "from src.metronome import generate_metronome, save_as_wav\n"
+            f"save_as_wav(generate_metronome(120, 1), 44100, {output!r})"
+        )
+        assert "pydub" not in _loaded_modules(script)
+        assert os.path.exists(output)
+
+    def test_lazy_attributes(self):
+        """Test public names resolve on first access and are listed by dir()"""
+        from src.metronome.core import generate_metronome
+
+        assert src.metronome.generate_metronome is generate_metronome
+        assert set(src.metronome.__all__) <= set(dir(src.metronome))
+
+    def test_console_script_target(self):
+        """Test the metronome:main entry point resolves without loading heavy dependencies"""
+        assert src.metronome.main is cli.main
+        script = (
+            "import importlib\n"
+            "main = getattr(importlib.import_module('src.metronome'), 'main')\n"
+            "try:\n"
+            "    main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        assert _loaded_modules(script) == "[]"
+
+    def test_unknown_attribute(self):
+        """Test unknown names still raise AttributeError"""
+        with pytest.raises(AttributeError):
+            src.metronome.does_not_exist
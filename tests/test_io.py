@@ -0,0 +1,394 @@
+"""Tests for file I/O"""
+
+import contextlib
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from pydub.exceptions import CouldntEncodeError
+from scipy.io import wavfile
+
+from src.metronome.core import count_samples, generate_metronome, iter_metronome_chunks
+from src.metronome.io import (
+    EncoderPool,
+    WavWriter,
+    encode_many,
+    encode_mp3,
+    iter_mp3_bytes,
+    iter_wav_bytes,
+    memmap_output,
+    save_as_mp3,
+    save_as_wav,
+)
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not found")
+
+
+class TestEncodeMp3Pipe:
+    """Tests for piping PCM straight into the encoder"""
+
+    def test_array_is_piped_as_pcm(self, fake_encoder, tmp_path):
+        """Test the full int16 buffer reaches the encoder unchanged"""
+        wave_data = generate_metronome(bpm=120, duration_seconds=2)
+        output = tmp_path / "out.mp3"
+        encode_mp3(wave_data, 44100, str(output))
+        np.testing.assert_array_equal(np.frombuffer(output.read_bytes(), "<i2"), wave_data)
+
+    def test_chunks_are_piped_in_order(self, fake_encoder, tmp_path):
+        """Test chunked generator output is streamed to the encoder"""
+        chunks = iter_metronome_chunks(bpm=150, duration_seconds=3, chunk_samples=5000)
+        output = tmp_path / "out.mp3"
+        encode_mp3(chunks, 44100, str(output))
+        expected = generate_metronome(bpm=150, duration_seconds=3)
+        np.testing.assert_array_equal(np.frombuffer(output.read_bytes(), "<i2"), expected)
+
+    def test_no_temp_wav_written(self, fake_encoder, tmp_path, monkeypatch):
+        """Test save_as_mp3 no longer writes temp_metronome.wav"""
+        monkeypatch.chdir(tmp_path)
+        saved = save_as_mp3(generate_metronome(bpm=120, duration_seconds=1), 44100, bpm=120)
+        assert saved == "metronome_bpm120_1min.mp3"
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "fake_ffmpeg",
+            "metronome_bpm120_1min.mp3",
+        ]
+
+    def test_encoder_failure_raises(self, fake_encoder, tmp_path):
+        """Test encoder errors surface as CouldntEncodeError"""
+        wave_data = np.frombuffer(b"FAIL", dtype="<i2")
+        with pytest.raises(CouldntEncodeError, match="boom"):
+            encode_mp3(wave_data, 44100, str(tmp_path / "out.mp3"))
+
+
+class TestConcurrentSaving:
+    """Tests for reentrant, atomic saving"""
+
+    def test_concurrent_save_as_mp3_stress(self, fake_encoder, tmp_path, monkeypatch):
+        """Test many parallel saves never clobber each other"""
+        monkeypatch.chdir(tmp_path)
+        bpms = list(range(100, 164, 2))
+        waves = {bpm: generate_metronome(bpm=bpm, duration_seconds=1) for bpm in bpms}
+
+        def save(bpm):
+            # 半分は同じファイル名に書き込む
+            name = "shared.mp3" if bpm % 4 == 0 else f"bpm{bpm}.mp3"
+            return bpm, save_as_mp3(waves[bpm], 44100, name)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(save, bpms))
+
+        for bpm, name in results:
+            if name != "shared.mp3":
+                data = np.frombuffer((tmp_path / name).read_bytes(), "<i2")
+                np.testing.assert_array_equal(data, waves[bpm])
+
+        # 共有ファイルはいずれか1回分の完全な出力になっている
+        shared = np.frombuffer((tmp_path / "shared.mp3").read_bytes(), "<i2")
+        assert any(np.array_equal(shared, waves[bpm]) for bpm in bpms if bpm % 4 == 0)
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_failed_encode_keeps_existing_output(self, fake_encoder, tmp_path):
+        """Test a failed encode leaves the previous file and no temp file"""
+        output = tmp_path / "out.mp3"
+        output.write_bytes(b"previous")
+        with pytest.raises(CouldntEncodeError):
+            encode_mp3(np.frombuffer(b"FAIL", dtype="<i2"), 44100, str(output))
+        assert output.read_bytes() == b"previous"
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_concurrent_save_as_wav(self, tmp_path):
+        """Test parallel WAV saves to one path always leave a complete file"""
+        waves = [generate_metronome(bpm=bpm, duration_seconds=1) for bpm in range(100, 132)]
+        output = str(tmp_path / "shared.wav")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda wave: save_as_wav(wave, 44100, output), waves))
+
+        _, data = wavfile.read(output)
+        assert any(np.array_equal(data, wave) for wave in waves)
+        assert not list(tmp_path.glob(".*.tmp"))
+
+
+@requires_ffmpeg
+def test_encode_mp3_with_ffmpeg(tmp_path):
+    """Test a real MP3 is produced by ffmpeg"""
+    output = tmp_path / "out.mp3"
+    encode_mp3(generate_metronome(bpm=120, duration_seconds=2), 44100, str(output))
+    decoded = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", str(output), "-f", "s16le", "-ac", "1", "-"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    samples = len(decoded) // 2
+    assert 0.95 * 88200 < samples < 1.05 * 88200
+
+
+class TestEncoderPool:
+    """Tests for batching many encodes into few encoder processes"""
+
+    def test_encode_many_splits_outputs(self, fake_encoder, tmp_path):
+        """Test every output receives exactly its own PCM"""
+        waves = [generate_metronome(bpm=bpm, duration_seconds=1) for bpm in range(100, 110)]
+        items = [(wave, 44100, str(tmp_path / f"out{i}")) for i, wave in enumerate(waves)]
+        saved = encode_many(items, batch_size=4, workers=2)
+        assert saved == [str(tmp_path / f"out{i}.mp3") for i in range(len(waves))]
+        for name, wave in zip(saved, waves):
+            np.testing.assert_array_equal(np.frombuffer(open(name, "rb").read(), "<i2"), wave)
+
+    def test_batches_by_sample_rate_and_bitrate(self, fake_encoder, tmp_path):
+        """Test only compatible files share an encoder invocation"""
+        wave = generate_metronome(bpm=120, duration_seconds=1)
+        with EncoderPool(workers=1, batch_size=2) as pool:
+            futures = [
+                pool.submit(wave, 44100, str(tmp_path / "a.mp3")),
+                pool.submit(wave, 48000, str(tmp_path / "b.mp3")),
+                pool.submit(wave, 44100, str(tmp_path / "c.mp3"), bitrate="128k"),
+                pool.submit(wave, 44100, str(tmp_path / "d.mp3")),
+            ]
+            assert pool.info()["pending"] == 2
+        assert [future.result() for future in futures] == [
+            str(tmp_path / name) for name in ("a.mp3", "b.mp3", "c.mp3", "d.mp3")
+        ]
+        assert pool.info()["batches"] == 3
+
+    def test_failure_fails_whole_batch(self, fake_encoder, tmp_path):
+        """Test a failing batch reports the error and leaves no partial files"""
+        good = generate_metronome(bpm=120, duration_seconds=1)
+        bad = np.frombuffer(b"FAIL", dtype="<i2")
+        items = [(good, 44100, str(tmp_path / "good.mp3")), (bad, 44100, str(tmp_path / "bad"))]
+        with pytest.raises(CouldntEncodeError, match="boom"):
+            encode_many(items)
+        assert not list(tmp_path.glob("*.mp3"))
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_invalid_batch_size(self):
+        """Test non-positive batch sizes are rejected"""
+        with pytest.raises(ValueError):
+            EncoderPool(batch_size=0)
+
+
+@requires_ffmpeg
+def test_encode_many_matches_encode_mp3(tmp_path):
+    """Test batched ffmpeg output is byte-identical to encoding files one by one"""
+    waves = [generate_metronome(bpm=bpm, duration_seconds=2, pattern="4to8") for bpm in (90, 173)]
+    items = [(wave, 44100, str(tmp_path / f"many{i}.mp3")) for i, wave in enumerate(waves)]
+    encode_many(items)
+    for i, wave in enumerate(waves):
+        encode_mp3(wave, 44100, str(tmp_path / f"single{i}.mp3"))
+        assert (tmp_path / f"many{i}.mp3").read_bytes() == (
+            tmp_path / f"single{i}.mp3"
+        ).read_bytes()
+
+
+class TestStreamingBytes:
+    """Tests for the in-memory WAV/MP3 byte streams"""
+
+    def test_wav_bytes_form_a_valid_file(self):
+        """Test streamed WAV bytes parse back to the original samples"""
+        expected = generate_metronome(bpm=133, duration_seconds=3)
+        chunks = iter_metronome_chunks(bpm=133, duration_seconds=3, chunk_samples=4000)
+        data = b"".join(iter_wav_bytes(chunks, 44100, len(expected)))
+        sample_rate, decoded = wavfile.read(io.BytesIO(data))
+        assert sample_rate == 44100
+        np.testing.assert_array_equal(decoded, expected)
+
+    def test_mp3_bytes_come_from_encoder_stdout(self, fake_encoder):
+        """Test the encoder output is yielded as it is read"""
+        expected = generate_metronome(bpm=120, duration_seconds=2)
+        data = b"".join(iter_mp3_bytes(expected, 44100))
+        np.testing.assert_array_equal(np.frombuffer(data, "<i2"), expected)
+
+    def test_mp3_bytes_failure_raises(self, fake_encoder):
+        """Test encoder errors surface after the stream ends"""
+        with pytest.raises(CouldntEncodeError, match="boom"):
+            list(iter_mp3_bytes(np.frombuffer(b"FAIL", dtype="<i2"), 44100))
+
+    @requires_ffmpeg
+    def test_mp3_bytes_with_ffmpeg_closed_early(self):
+        """Test closing the stream early stops ffmpeg cleanly"""
+        chunks = iter_metronome_chunks(bpm=120, duration_seconds=600)
+        stream = iter_mp3_bytes(chunks, 44100)
+        assert next(stream)
+        stream.close()
+
+
+class TestWavWriter:
+    """Tests for the built-in RIFF/WAVE writer"""
+
+    def test_matches_scipy_output(self, tmp_path):
+        """Test the canonical 44-byte layout is byte-identical to scipy's"""
+        wave_data = generate_metronome(bpm=150, duration_seconds=3)
+        ours = tmp_path / "ours.wav"
+        reference = tmp_path / "reference.wav"
+        save_as_wav(wave_data, 44100, str(ours))
+        wavfile.write(str(reference), 44100, wave_data)
+        assert ours.read_bytes() == reference.read_bytes()
+
+    def test_streamed_chunks_match_array(self, tmp_path):
+        """Test an iterator of chunks produces the same file as the full array"""
+        chunks = iter_metronome_chunks(bpm=150, duration_seconds=3, chunk_samples=3000)
+        streamed = tmp_path / "streamed.wav"
+        whole = tmp_path / "whole.wav"
+        save_as_wav(chunks, 44100, str(streamed))
+        save_as_wav(generate_metronome(bpm=150, duration_seconds=3), 44100, str(whole))
+        assert streamed.read_bytes() == whole.read_bytes()
+
+    def test_streaming_uses_constant_memory(self, tmp_path):
+        """Test a long chunked render never holds the whole waveform"""
+        tracemalloc.start()
+        try:
+            chunks = iter_metronome_chunks(bpm=120, duration_seconds=600)
+            save_as_wav(chunks, 44100, str(tmp_path / "long.wav"))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # 全体（600秒 × 44100 × 2バイト ≈ 53MB）の1割未満
+        assert peak < 600 * 44100 * 2 // 10
+
+    def test_file_object_header_is_patched(self):
+        """Test sizes are patched at close when writing to a file object"""
+        buffer = io.BytesIO()
+        writer = WavWriter(buffer, 22050)
+        writer.write(np.arange(10, dtype=np.int16))
+        writer.write([np.arange(5, dtype=np.int16)])
+        writer.close()
+        assert writer.num_samples == 15
+        sample_rate, data = wavfile.read(io.BytesIO(buffer.getvalue()))
+        assert sample_rate == 22050
+        np.testing.assert_array_equal(data, np.r_[np.arange(10), np.arange(5)])
+
+    def test_rejects_non_int16(self, tmp_path):
+        """Test float data is rejected instead of silently truncated"""
+        with pytest.raises(ValueError):
+            save_as_wav(np.zeros(10), 44100, str(tmp_path / "out.wav"))
+        assert not list(tmp_path.iterdir())
+
+    def test_over_4gb_raises_without_rf64(self, tmp_path, monkeypatch):
+        """Test exceeding the RIFF size limit is a clear error"""
+        monkeypatch.setattr("src.metronome.io._RIFF_MAX_BYTES", 1000)
+        with pytest.raises(ValueError, match="rf64"):
+            save_as_wav(np.zeros(1000, dtype=np.int16), 44100, str(tmp_path / "big.wav"))
+        assert not list(tmp_path.iterdir())
+
+    def test_over_4gb_switches_to_rf64(self, tmp_path, monkeypatch):
+        """Test rf64=True promotes the header to RF64 with a ds64 chunk"""
+        monkeypatch.setattr("src.metronome.io._RIFF_MAX_BYTES", 1000)
+        wave_data = np.arange(1000, dtype=np.int16)
+        output = tmp_path / "big.wav"
+        save_as_wav(wave_data, 44100, str(output), rf64=True)
+
+        content = output.read_bytes()
+        riff_id, riff_size, wave_id = struct.unpack_from("<4sI4s", content, 0)
+        assert (riff_id, riff_size, wave_id) == (b"RF64", 0xFFFFFFFF, b"WAVE")
+        ds64_id, _, riff_bytes, data_bytes, samples = struct.unpack_from("<4sIQQQ", content, 12)
+        assert ds64_id == b"ds64"
+        assert riff_bytes == len(content) - 8
+        assert (data_bytes, samples) == (2000, 1000)
+        assert struct.unpack_from("<4sI", content, 72) == (b"data", 0xFFFFFFFF)
+        np.testing.assert_array_equal(np.frombuffer(content[80:], "<i2"), wave_data)
+
+    def test_rf64_reserve_stays_plain_wav_when_small(self, tmp_path):
+        """Test rf64=True still writes a readable WAV below the limit"""
+        wave_data = generate_metronome(bpm=120, duration_seconds=1)
+        output = tmp_path / "small.wav"
+        save_as_wav(wave_data, 44100, str(output), rf64=True)
+        assert output.read_bytes()[:4] == b"RIFF"
+        _, data = wavfile.read(str(output))
+        np.testing.assert_array_equal(data, wave_data)
+
+    def test_wav_output_does_not_need_scipy(self, tmp_path):
+        """Test writing WAV never imports scipy"""
+        output = str(tmp_path / "out.wav")
+        script = (
+            "import sys\n"
+            "from src.metronome import generate_metronome, save_as_wav\n"
+            f"save_as_wav(generate_metronome(120, 1), 44100, {output!r})\n"
+            "print('scipy' in sys.modules)"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        completed = subprocess.run(
+            [sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True
+        )
+        assert completed.stdout.strip() == "False"
+
+
+class TestMemmapOutput:
+    """Tests for rendering straight into a memory-mapped file"""
+
+    def test_wav_matches_save_as_wav(self, tmp_path):
+        """Test the memmap WAV is byte-identical to save_as_wav output"""
+        output = tmp_path / "mapped.wav"
+        with memmap_output(str(output), count_samples(150, 30, 48000, "4to8"), 48000) as out:
+            generate_metronome(
+                bpm=150, duration_seconds=30, sample_rate=48000, pattern="4to8", out=out
+            )
+
+        reference = tmp_path / "reference.wav"
+        wave_data = generate_metronome(
+            bpm=150, duration_seconds=30, sample_rate=48000, pattern="4to8"
+        )
+        save_as_wav(wave_data, 48000, str(reference))
+        assert output.read_bytes() == reference.read_bytes()
+
+    def test_raw_pcm(self, tmp_path):
+        """Test raw format writes headerless little-endian PCM"""
+        output = tmp_path / "mapped.pcm"
+        with memmap_output(str(output), count_samples(120, 5), format="raw") as out:
+            generate_metronome(bpm=120, duration_seconds=5, out=out)
+        expected = generate_metronome(bpm=120, duration_seconds=5)
+        np.testing.assert_array_equal(np.frombuffer(output.read_bytes(), "<i2"), expected)
+
+    def test_bounded_memory(self, tmp_path):
+        """Test working memory does not grow with the duration"""
+        num_samples = count_samples(120, 1800, 22050)
+        tracemalloc.start()
+        try:
+            with memmap_output(str(tmp_path / "long.wav"), num_samples, 22050) as out:
+                generate_metronome(bpm=120, duration_seconds=1800, sample_rate=22050, out=out)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # 全体（約79MB）の5%未満
+        assert peak < num_samples * 2 // 20
+
+    def test_failure_leaves_no_file(self, tmp_path):
+        """Test an exception inside the block discards the output"""
+        output = tmp_path / "mapped.wav"
+        with pytest.raises(RuntimeError):
+            with memmap_output(str(output), 1000) as out:
+                out[:] = 1
+                raise RuntimeError("stop")
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize("fail", [False, True])
+    def test_mapping_closed_before_rename(self, monkeypatch, tmp_path, fail):
+        """Test the mapping is closed before the file is renamed or removed"""
+        mappings = []
+        states = []
+        for name in ("replace", "remove"):
+            original = getattr(os, name)
+
+            def record(*args, original=original):
+                states.append(mappings[0].closed)
+                return original(*args)
+
+            monkeypatch.setattr(os, name, record)
+
+        with contextlib.suppress(RuntimeError):
+            with memmap_output(str(tmp_path / "mapped.wav"), 1000) as out:
+                mappings.append(out._mmap)
+                if fail:
+                    raise RuntimeError("stop")
+        assert states == [True]
+
+    def test_invalid_format(self, tmp_path):
+        """Test unknown formats are rejected"""
+        with pytest.raises(ValueError):
+            with memmap_output(str(tmp_path / "out.flac"), 10, format="flac"):
+                pass
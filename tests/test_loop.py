@@ -0,0 +1,170 @@
+"""Tests for seamless loop export"""
+
+import json
+import struct
+import wave
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from src.metronome.cli import main
+from src.metronome.core import generate_metronome
+from src.metronome.io import WavWriter, save_as_wav
+from src.metronome.loop import find_loop, loop_metadata_filename, render_loop, save_loop
+
+
+def read_smpl_loops(path):
+    """Return the (start, end) pairs of every loop in the file's smpl chunk"""
+    data = path.read_bytes()
+    offset = 12
+    while offset < len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        if chunk_id == b"smpl":
+            count = struct.unpack_from("<I", data, offset + 8 + 28)[0]
+            loops = []
+            for i in range(count):
+                _, _, start, end, _, _ = struct.unpack_from("<6I", data, offset + 8 + 36 + 24 * i)
+                loops.append((start, end))
+            return loops
+        offset += 8 + size + size % 2
+    return None
+
+
+class TestFindLoop:
+    """Tests for the loop length search"""
+
+    def test_integer_cycle(self):
+        """Test a cycle with a whole number of samples loops after one cycle"""
+        info = find_loop(120, 44100, "4beat")
+        assert (info.cycles, info.samples) == (1, 88200)
+        assert info.exact
+
+    def test_fractional_cycle_spans_several_cycles(self):
+        """Test a fractional cycle length is repeated until it becomes whole"""
+        info = find_loop(173, 44100, "4beat")
+        assert info.cycles == 173
+        assert info.samples == 44100 * 60 * 4
+        assert info.exact
+
+    def test_max_cycles_rounds_tempo(self):
+        """Test capping the cycles picks the smallest tempo error"""
+        info = find_loop(173, 44100, "4to8", max_cycles=4)
+        assert info.cycles <= 4
+        assert not info.exact
+        assert float(info.loop_bpm) == pytest.approx(173, abs=1e-3)
+        exact = Fraction(60 * 44100 * 8 * info.cycles) / info.loop_bpm
+        assert exact == info.samples
+
+    def test_too_long_without_cap(self):
+        """Test an impractically long exact loop asks for max_cycles"""
+        with pytest.raises(ValueError):
+            find_loop(120.1, 44100, "4beat")
+        assert find_loop(120.1, 44100, "4beat", max_cycles=16).cycles <= 16
+
+    def test_invalid_max_cycles(self):
+        """Test max_cycles must be positive"""
+        with pytest.raises(ValueError):
+            find_loop(120, max_cycles=0)
+
+
+class TestRenderLoop:
+    """Tests for rendering the loop"""
+
+    @pytest.mark.parametrize(
+        "bpm,sample_rate,pattern",
+        [(120, 44100, "4beat"), (173, 22050, "4to8"), (133, 48000, ". A x/3 x/3 x/3")],
+    )
+    def test_repeats_like_exact_timing(self, bpm, sample_rate, pattern):
+        """Test looping the segment reproduces a long timing="exact" render"""
+        wave_data, info = render_loop(bpm, sample_rate, pattern)
+        assert len(wave_data) == info.samples
+        expected = generate_metronome(bpm, 3 * info.seconds, sample_rate, pattern, timing="exact")
+        np.testing.assert_array_equal(np.tile(wave_data, 3), expected[: 3 * info.samples])
+
+    def test_tail_wraps_to_start(self):
+        """Test a click running past the loop end continues at the loop start"""
+        wave_data, info = render_loop(330, 44100, "A*3/4 x/4")
+        n = info.samples
+        expected = generate_metronome(330, 3 * info.seconds, 44100, "A*3/4 x/4", timing="exact")
+        # 2周目以降は前の周の余韻が重なる
+        np.testing.assert_array_equal(np.tile(wave_data, 3)[n : 2 * n], expected[n : 2 * n])
+
+    def test_loop_shorter_than_click(self):
+        """Test loops shorter than one click still wrap every tail"""
+        wave_data, info = render_loop(2400, 8000, "A")
+        assert info.samples == 200
+        # 400サンプルのクリックが2周分重なる
+        assert np.abs(wave_data).max() > 0
+
+
+class TestSaveLoop:
+    """Tests for writing loops"""
+
+    def test_smpl_chunk_and_sidecar(self, tmp_path):
+        """Test the WAV carries loop points and the sidecar JSON matches"""
+        output, info = save_loop(173, str(tmp_path / "loop"), 22050, "4to8", max_cycles=4)
+        path = tmp_path / "loop.wav"
+        assert output == str(path)
+        assert read_smpl_loops(path) == [(0, info.samples - 1)]
+        with wave.open(str(path)) as f:
+            assert f.getnframes() == info.samples
+        metadata = json.loads((tmp_path / "loop.loop.json").read_text())
+        assert metadata == info.to_dict()
+        assert metadata["loop_end"] == info.samples
+        assert loop_metadata_filename(output) == str(tmp_path / "loop.loop.json")
+
+    def test_without_sidecar(self, tmp_path):
+        """Test the sidecar can be skipped"""
+        save_loop(120, str(tmp_path / "loop.wav"), sidecar=False)
+        assert [p.name for p in tmp_path.iterdir()] == ["loop.wav"]
+
+    def test_loop_must_fit_the_data(self, tmp_path):
+        """Test loop points outside the data are rejected"""
+        with pytest.raises(ValueError):
+            save_as_wav(np.zeros(10, np.int16), 8000, str(tmp_path / "a.wav"), loop=(0, 11))
+        assert not list(tmp_path.iterdir())
+        with pytest.raises(ValueError):
+            WavWriter(str(tmp_path / "b.wav"), 8000, loop=(5, 5))
+
+
+class TestLoopCli:
+    """Tests for --loop"""
+
+    def test_single_loop(self, tmp_path, capsys):
+        """Test --loop writes the loop WAV instead of a full-length MP3"""
+        output = tmp_path / "click.wav"
+        assert main(["--bpm", "173", "--loop", "--max-cycles", "4", "-o", str(output)]) == 0
+        assert read_smpl_loops(output)
+        assert (tmp_path / "click.loop.json").exists()
+        assert "ループ内のテンポ" in capsys.readouterr().out
+
+    def test_batch_loops(self, tmp_path):
+        """Test batch --loop writes one loop per BPM, pattern and sample rate"""
+        status = main(
+            [
+                "batch",
+                "--bpm",
+                "120",
+                "173",
+                "--pattern",
+                "4beat",
+                "4to8",
+                "--sample-rate",
+                "44100",
+                "22050",
+                "--loop",
+                "--max-cycles",
+                "8",
+                "-o",
+                str(tmp_path),
+            ]
+        )
+        assert status == 0
+        assert len(list(tmp_path.glob("*/*_loop*.wav"))) == 8
+        assert (tmp_path / "4to8" / "metronome_bpm173_loop_22050hz.loop.json").exists()
+
+    def test_loop_rejects_tempo_map(self):
+        """Test loops need a constant tempo"""
+        with pytest.raises(SystemExit):
+            main(["--tempo-map", "120-180@4", "--loop"])
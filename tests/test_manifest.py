@@ -0,0 +1,194 @@
+"""Tests for job files and incremental builds"""
+
+import json
+
+import pytest
+
+from src.metronome.cli import main
+from src.metronome.manifest import (
+    STATE_FILENAME,
+    build,
+    check_job,
+    load_job,
+    plan_job,
+    validate_job,
+)
+
+
+def make_job(tmp_path, **overrides):
+    job = {
+        "output_dir": str(tmp_path / "out"),
+        "bpm_range": ["120:140:10"],
+        "patterns": ["4beat"],
+        "durations": [1],
+        "formats": ["wav"],
+    }
+    job.update(overrides)
+    return validate_job(job)
+
+
+def statuses(results):
+    return sorted((r.entry.name, r.status, r.reason) for r in results)
+
+
+class TestJobFiles:
+    """Tests for loading and validating job files"""
+
+    def test_json_and_toml(self, tmp_path):
+        """Test both formats give the same job with paths relative to the file"""
+        (tmp_path / "job.json").write_text(
+            json.dumps({"output_dir": "out", "bpm_range": "160:180:10", "bpms": [100, 160]})
+        )
+        (tmp_path / "job.toml").write_text(
+            'output_dir = "out"\nbpm_range = "160:180:10"\nbpms = [100, 160]\n'
+        )
+        job = load_job(str(tmp_path / "job.json"))
+        assert load_job(str(tmp_path / "job.toml")) == job
+        assert job["bpms"] == [100, 160, 170, 180]
+        assert job["output_dir"] == str(tmp_path / "out")
+        assert job["formats"] == ["mp3"]
+
+    def test_yaml(self, tmp_path):
+        """Test YAML job files when PyYAML is installed"""
+        pytest.importorskip("yaml")
+        (tmp_path / "job.yaml").write_text("bpms: [120]\ndurations: 30\n")
+        assert load_job(str(tmp_path / "job.yaml"))["durations"] == [30]
+
+    @pytest.mark.parametrize(
+        "job",
+        [
+            {"bpms": [120], "tempo": 3},
+            {},
+            {"bpm_range": ["120-140"]},
+            {"bpms": [120], "patterns": ["waltz"]},
+            {"bpms": [120], "formats": ["ogg"]},
+            {"bpms": [120], "timing": "fast"},
+            ["bpms"],
+        ],
+    )
+    def test_invalid(self, job):
+        """Test malformed jobs are rejected"""
+        with pytest.raises(ValueError):
+            validate_job(job)
+
+    def test_unknown_extension(self, tmp_path):
+        """Test the format is taken from the extension"""
+        (tmp_path / "job.txt").write_text("{}")
+        with pytest.raises(ValueError):
+            load_job(str(tmp_path / "job.txt"))
+
+    def test_plan(self, tmp_path):
+        """Test every combination gets an output per format with its own spec hash"""
+        entries = plan_job(make_job(tmp_path, formats=["mp3", "wav"], sample_rates=[44100, 22050]))
+        assert len(entries) == 12
+        names = [entry.name for entry in entries]
+        assert "4beat/metronome_bpm120_1sec.mp3" in names
+        assert "4beat/metronome_bpm140_1sec_22050hz.wav" in names
+        assert len({entry.spec_hash for entry in entries}) == 12
+
+
+class TestBuild:
+    """Tests for incremental builds"""
+
+    def test_rerun_skips_finished_outputs(self, tmp_path):
+        """Test a second run renders nothing"""
+        job = make_job(tmp_path)
+        first = list(build(job))
+        assert {r.status for r in first} == {"built"}
+        assert {r.reason for r in first} == {"new"}
+        assert {r.status for r in build(job)} == {"up-to-date"}
+        state = json.loads((tmp_path / "out" / STATE_FILENAME).read_text())
+        assert sorted(state["outputs"]) == sorted(r.entry.name for r in first)
+
+    def test_missing_and_corrupt_outputs(self, tmp_path):
+        """Test deleted and damaged files are rebuilt"""
+        job = make_job(tmp_path)
+        list(build(job))
+        (tmp_path / "out" / "4beat" / "metronome_bpm120_1sec.wav").unlink()
+        damaged = tmp_path / "out" / "4beat" / "metronome_bpm130_1sec.wav"
+        data = bytearray(damaged.read_bytes())
+        data[-1] ^= 0xFF
+        damaged.write_bytes(bytes(data))
+
+        # サイズが同じなので size では検出できない
+        assert [r for _, r in check_job(job, verify="size") if r] == ["missing"]
+        assert statuses(build(job)) == [
+            ("4beat/metronome_bpm120_1sec.wav", "built", "missing"),
+            ("4beat/metronome_bpm130_1sec.wav", "built", "corrupt"),
+            ("4beat/metronome_bpm140_1sec.wav", "up-to-date", None),
+        ]
+
+    def test_changed_parameters(self, tmp_path):
+        """Test only outputs whose parameters changed are rebuilt"""
+        list(build(make_job(tmp_path)))
+        changed = make_job(tmp_path, timing="exact", bpm_range=["130:150:10"])
+        assert statuses(build(changed)) == [
+            ("4beat/metronome_bpm130_1sec.wav", "built", "changed"),
+            ("4beat/metronome_bpm140_1sec.wav", "built", "changed"),
+            ("4beat/metronome_bpm150_1sec.wav", "built", "new"),
+        ]
+        # ジョブから外れた出力の記録は残さない
+        state = json.loads((tmp_path / "out" / STATE_FILENAME).read_text())
+        assert "4beat/metronome_bpm120_1sec.wav" not in state["outputs"]
+
+    def test_resume_after_interruption(self, tmp_path):
+        """Test stopping part-way records the finished outputs"""
+        job = make_job(tmp_path, bpm_range=["100:190:10"])
+        results = build(job, encode_workers=1)
+        finished = [next(results).entry.name for _ in range(3)]
+        results.close()
+
+        resumed = list(build(job))
+        assert sorted(r.entry.name for r in resumed if r.status == "up-to-date") == sorted(finished)
+        assert sum(r.status == "built" for r in resumed) == 7
+
+    def test_failures_are_not_recorded(self, tmp_path):
+        """Test a failed output is retried on the next run"""
+        job = make_job(tmp_path, bpm_range=[], bpms=[0, 120])
+        assert statuses(build(job))[0][1] == "failed"
+        assert [r.status for r in build(job)].count("failed") == 1
+
+    def test_force(self, tmp_path):
+        """Test force rebuilds everything"""
+        job = make_job(tmp_path)
+        list(build(job))
+        assert {r.reason for r in build(job, force=True)} == {"forced"}
+
+    def test_custom_state_file(self, tmp_path):
+        """Test the state can be kept outside the output directory"""
+        state_file = tmp_path / "state" / "catalog.json"
+        list(build(make_job(tmp_path), state_file=str(state_file)))
+        assert state_file.exists()
+        assert not (tmp_path / "out" / STATE_FILENAME).exists()
+
+    def test_invalid_verify(self, tmp_path):
+        """Test an unknown verification mode is rejected"""
+        with pytest.raises(ValueError):
+            next(build(make_job(tmp_path), verify="mtime"))
+
+
+class TestBuildCli:
+    """Tests for the build subcommand"""
+
+    def test_build_and_dry_run(self, fake_encoder, tmp_path, capsys):
+        """Test the subcommand builds MP3 and WAV outputs and reports what is outdated"""
+        job_file = tmp_path / "catalog.json"
+        job_file.write_text(
+            json.dumps({"bpms": [120, 200], "durations": 1, "formats": ["mp3", "wav"]})
+        )
+        assert main(["build", str(job_file), "--no-cache"]) == 0
+        assert len(list((tmp_path / "mp3" / "4beat").iterdir())) == 4
+        assert "生成 4 / 最新 0" in capsys.readouterr().out
+
+        (tmp_path / "mp3" / "4beat" / "metronome_bpm200_1sec.mp3").unlink()
+        assert main(["build", str(job_file), "--dry-run"]) == 0
+        out = capsys.readouterr().out
+        assert "missing" in out
+        assert "生成が必要: 1/4個" in out
+
+    def test_invalid_job_file(self, tmp_path):
+        """Test job file errors are reported as usage errors"""
+        job_file = tmp_path / "catalog.json"
+        job_file.write_text(json.dumps({"bpms": [120], "formats": ["flac"]}))
+        with pytest.raises(SystemExit):
+            main(["build", str(job_file)])
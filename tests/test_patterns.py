@@ -0,0 +1,115 @@
+"""Tests for the declarative pattern engine"""
+
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from src.metronome.core import CLICK_DURATION, _compute_onsets, generate_metronome
+from src.metronome.patterns import (
+    CLICK_ACCENT,
+    CLICK_NORMAL,
+    PATTERNS,
+    REST,
+    canonicalize,
+    compile_pattern,
+    parse_pattern,
+)
+
+
+class TestParsePattern:
+    """Tests for the pattern grammar"""
+
+    def test_steps_and_lengths(self):
+        """Test symbols and length suffixes"""
+        assert parse_pattern("A x/2 .*2 x*3/2") == [
+            (Fraction(1), CLICK_ACCENT),
+            (Fraction(1, 2), CLICK_NORMAL),
+            (Fraction(2), REST),
+            (Fraction(3, 2), CLICK_NORMAL),
+        ]
+
+    @pytest.mark.parametrize("text", ["", "A y", "x/0", "x*0", "x/-1", "A,x"])
+    def test_invalid(self, text):
+        """Test malformed patterns are rejected"""
+        with pytest.raises(ValueError):
+            parse_pattern(text)
+
+
+class TestCompilePattern:
+    """Tests for compilation and memoization"""
+
+    def test_builtin_names(self):
+        """Test built-in patterns compile to their onset tables"""
+        compiled = compile_pattern("4to8")
+        assert compiled.cycle_beats == 8.0
+        assert compiled.step_beats.tolist() == [1, 1, 0.5, 0.5, 0.5, 0.5] * 2
+        assert compiled.variants.tolist() == [1, 0, 0, 0, 0, 0] * 2
+
+    def test_equivalent_forms_share_cache_entry(self):
+        """Test name, grammar and step sequence memoize to one table"""
+        steps = [(1, True), (1, False), (1, False), (1, False)]
+        assert canonicalize(steps) == canonicalize("A  x x x") == "A x x x"
+        assert compile_pattern("4beat") is compile_pattern(steps)
+        assert compile_pattern("4beat") is compile_pattern(" A x x x ")
+
+    def test_step_sequence_subdivisions(self):
+        """Test (subdivision, accent) steps become 1/N beats"""
+        assert canonicalize([(1, True), (2, False), (2, None), (Fraction(1, 2), False)]) == (
+            "A x/2 ./2 x*2"
+        )
+
+    def test_tables_are_read_only(self):
+        """Test compiled tables cannot be mutated through the cache"""
+        with pytest.raises(ValueError):
+            compile_pattern("4beat").variants[0] = 0
+
+    def test_unknown_name(self):
+        """Test unknown pattern names raise instead of falling back"""
+        with pytest.raises(ValueError, match="不明なパターン"):
+            compile_pattern("5beat")
+
+    def test_builtins_are_canonical(self):
+        """Test built-in definitions are already in canonical form"""
+        for text in PATTERNS.values():
+            assert canonicalize(text) == text
+
+
+class TestPatternRendering:
+    """Tests for rendering custom patterns"""
+
+    def test_grammar_equals_builtin(self):
+        """Test the grammar form renders byte-identical to the named pattern"""
+        np.testing.assert_array_equal(
+            generate_metronome(bpm=173, duration_seconds=10, pattern=PATTERNS["4to8"]),
+            generate_metronome(bpm=173, duration_seconds=10, pattern="4to8"),
+        )
+
+    def test_rests_are_silent(self):
+        """Test a rest step advances time without a click"""
+        full = generate_metronome(bpm=120, duration_seconds=4, pattern="A x x x")
+        rest = generate_metronome(bpm=120, duration_seconds=4, pattern=". x x x")
+        assert len(full) == len(rest)
+
+        click_samples = int(44100 * CLICK_DURATION)
+        beat = 22050
+        for cycle_start in range(0, len(full), 4 * beat):
+            assert not rest[cycle_start : cycle_start + click_samples].any()
+            np.testing.assert_array_equal(
+                rest[cycle_start + beat : cycle_start + 4 * beat],
+                full[cycle_start + beat : cycle_start + 4 * beat],
+            )
+
+    def test_triplets(self):
+        """Test fractional steps place clicks at the expected samples"""
+        positions, variants, total_samples = _compute_onsets(60, 1, 44100, "A x/3 x/3 x/3 x*2/3")
+        # 逐次加算の丸めにより1サンプル前にずれることがある
+        np.testing.assert_allclose(positions, [0, 44100, 58800, 73500, 88200], atol=1)
+        assert variants.tolist() == [1, 0, 0, 0, 0]
+        assert total_samples == 117600
+
+    def test_all_rest_pattern(self):
+        """Test a pattern without clicks renders silence"""
+        wave = generate_metronome(bpm=120, duration_seconds=2, pattern=". .")
+        assert len(wave) == 88200
+        assert not wave.any()
@@ -0,0 +1,196 @@
+"""Tests for the pipelined render/encode executor"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.metronome.batch import BatchTask, expand_tasks
+from src.metronome.cache import RenderCache
+from src.metronome.cli import main
+from src.metronome.core import generate_metronome
+from src.metronome.pipeline import BatchPipeline, StageTimings
+
+
+def save_raw(wave_data, task):
+    """Store the rendered PCM instead of encoding it"""
+    with open(task.output_file, "wb") as f:
+        f.write(wave_data.astype("<i2").tobytes())
+
+
+def read_raw(task):
+    return np.frombuffer(open(task.output_file, "rb").read(), "<i2")
+
+
+class TestBatchPipeline:
+    """Tests for BatchPipeline"""
+
+    @pytest.mark.parametrize("encode_workers", [1, 3])
+    def test_every_task_is_rendered(self, tmp_path, encode_workers):
+        """Test each task produces the same waveform as a direct render"""
+        tasks = expand_tasks(
+            [120, 173], patterns=["4beat", "4to8"], durations=[1, 2], output_dir=str(tmp_path)
+        )
+        pipeline = BatchPipeline(render_workers=2, encode_workers=encode_workers, encode=save_raw)
+        results = list(pipeline.run(tasks))
+        assert sorted(result.task.output_file for result in results) == sorted(
+            task.output_file for task in tasks
+        )
+        assert all(result.error is None for result in results)
+        for task in tasks:
+            expected = generate_metronome(task.bpm, task.duration, pattern=task.pattern)
+            np.testing.assert_array_equal(read_raw(task), expected)
+
+    def test_errors_are_isolated(self, tmp_path):
+        """Test render and encode failures only affect their own tasks"""
+        tasks = [
+            BatchTask(120, 1, 44100, "4beat", str(tmp_path / "ok.pcm")),
+            BatchTask(0, 1, 44100, "4beat", str(tmp_path / "render.pcm")),
+            BatchTask(130, 1, 44100, "4beat", str(tmp_path / "encode.pcm")),
+        ]
+
+        def encode(wave_data, task):
+            if task.bpm == 130:
+                raise RuntimeError("encoder crashed")
+            save_raw(wave_data, task)
+
+        results = {r.task.bpm: r.error for r in BatchPipeline(encode=encode).run(tasks)}
+        assert results[120] is None
+        assert "ZeroDivisionError" in results[0]
+        assert "RuntimeError: encoder crashed" in results[130]
+
+    def test_queue_bounds_rendered_waveforms(self, tmp_path):
+        """Test rendering waits while the encoders are busy"""
+        tasks = expand_tasks(range(100, 110), durations=[1], output_dir=str(tmp_path))
+        release = threading.Event()
+        in_flight = []
+
+        def encode(wave_data, task):
+            release.wait()
+            save_raw(wave_data, task)
+
+        pipeline = BatchPipeline(encode_workers=1, queue_size=2, encode=encode)
+        results = pipeline.run(tasks)
+        consumer = threading.Thread(target=lambda: in_flight.extend(results))
+        consumer.start()
+        time.sleep(0.5)
+        # 1つはエンコード中、2つはキューで待機
+        assert not list(tmp_path.glob("**/*.mp3"))
+        release.set()
+        consumer.join()
+        assert len(in_flight) == len(tasks)
+        assert pipeline.timings.render_blocked > 0.3
+
+    def test_close_stops_remaining_tasks(self, tmp_path):
+        """Test closing the result generator stops the workers"""
+        tasks = expand_tasks(range(100, 140), durations=[1], output_dir=str(tmp_path))
+        pipeline = BatchPipeline(encode_workers=1, queue_size=1, encode=save_raw)
+        results = pipeline.run(tasks)
+        next(results)
+        results.close()
+        assert len(list(tmp_path.glob("**/*.mp3"))) < len(tasks)
+        assert not [t for t in threading.enumerate() if t.name.startswith("metronome-encode")]
+
+    def test_cache_hits_skip_rendering(self, tmp_path):
+        """Test cached tasks are copied without being rendered or encoded"""
+        cache = RenderCache(str(tmp_path / "cache"))
+        tasks = expand_tasks([120, 150], durations=[1], output_dir=str(tmp_path / "out"))
+        first = list(BatchPipeline(cache=cache, encode=save_raw).run(tasks))
+        assert not any(result.cached for result in first)
+
+        def encode(wave_data, task):
+            raise AssertionError("should have been cached")
+
+        second = list(BatchPipeline(cache=cache, encode=encode).run(tasks))
+        assert all(result.cached for result in second)
+
+    def test_invalid_pattern_with_cache(self, tmp_path):
+        """Test a pattern rejected by the cache key is reported without stalling the run"""
+        tasks = [
+            BatchTask(120, 1, 44100, "bogus", str(tmp_path / "bad.pcm")),
+            BatchTask(120, 1, 44100, "4beat", str(tmp_path / "ok.pcm")),
+        ]
+        pipeline = BatchPipeline(cache=RenderCache(str(tmp_path / "cache")), encode=save_raw)
+        results = []
+        consumer = threading.Thread(target=lambda: results.extend(pipeline.run(tasks)), daemon=True)
+        consumer.start()
+        consumer.join(timeout=10)
+        assert not consumer.is_alive()
+        errors = {result.task.pattern: result.error for result in results}
+        assert "ValueError" in errors["bogus"]
+        assert errors["4beat"] is None
+        np.testing.assert_array_equal(
+            read_raw(tasks[1]), generate_metronome(bpm=120, duration_seconds=1)
+        )
+
+    def test_timings(self, tmp_path):
+        """Test per-stage timings are recorded"""
+        tasks = expand_tasks([120, 150], durations=[2], output_dir=str(tmp_path))
+        pipeline = BatchPipeline(encode_workers=2, encode=save_raw)
+        list(pipeline.run(tasks))
+        timings = pipeline.timings
+        assert timings.render > 0
+        assert timings.encode > 0
+        assert timings.elapsed >= timings.render
+        assert timings.encode_workers == 2
+        assert timings.bottleneck in ("render", "encode")
+        assert "律速" in timings.summary()
+
+    @pytest.mark.parametrize(
+        "kwargs", [{"render_workers": 0}, {"encode_workers": -1}, {"queue_size": 0}]
+    )
+    def test_invalid_settings(self, kwargs):
+        """Test non-positive stage sizes are rejected"""
+        with pytest.raises(ValueError):
+            BatchPipeline(**kwargs)
+
+
+class TestStageTimings:
+    """Tests for StageTimings"""
+
+    def test_bottleneck_uses_utilization(self):
+        """Test the stage with the higher per-worker load is the bottleneck"""
+        timings = StageTimings(
+            render=2.0, encode=6.0, elapsed=4.0, render_workers=1, encode_workers=4
+        )
+        assert timings.utilization("render") == pytest.approx(0.5)
+        assert timings.utilization("encode") == pytest.approx(0.375)
+        assert timings.bottleneck == "render"
+
+
+class TestPipelineCli:
+    """Tests for batch --pipeline"""
+
+    def test_pipeline_subcommand(self, fake_encoder, tmp_path, capsys):
+        """Test the batch subcommand can use the pipeline and reports stage timings"""
+        status = main(
+            [
+                "batch",
+                "--bpm",
+                "120",
+                "200",
+                "--pattern",
+                "4beat",
+                "4to8",
+                "--duration",
+                "1",
+                "--pipeline",
+                "--encoders",
+                "2",
+                "-o",
+                str(tmp_path),
+            ]
+        )
+        assert status == 0
+        assert len(list(tmp_path.glob("*/*.mp3"))) == 4
+        data = np.frombuffer((tmp_path / "4to8" / "metronome_bpm200_1sec.mp3").read_bytes(), "<i2")
+        np.testing.assert_array_equal(
+            data, generate_metronome(bpm=200, duration_seconds=1, pattern="4to8")
+        )
+        assert "律速" in capsys.readouterr().out
+
+    def test_invalid_pipeline_settings(self):
+        """Test invalid stage sizes are reported as usage errors"""
+        with pytest.raises(SystemExit):
+            main(["batch", "--bpm", "120", "--pipeline", "--queue-size", "0"])
@@ -0,0 +1,199 @@
+"""Tests for the real-time playback engine"""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from src.metronome.cli import main
+from src.metronome.core import generate_metronome
+from src.metronome.playback import FileSink, NullSink, PlaybackEngine, RingBuffer
+
+
+class CaptureSink(NullSink):
+    """Null sink that keeps a copy of every block"""
+
+    def __init__(self, realtime=False):
+        super().__init__(realtime)
+        self.blocks = []
+
+    def consume(self, block):
+        self.blocks.append(block.copy())
+
+    @property
+    def output(self):
+        return np.concatenate(self.blocks)
+
+
+def _play(engine, duration_seconds, realtime=False):
+    sink = CaptureSink(realtime)
+    sink.run(engine, duration_seconds)
+    return sink.output
+
+
+class TestRingBuffer:
+    """Tests for the single-producer/single-consumer ring buffer"""
+
+    def test_wraparound(self):
+        """Test data survives writes and reads that cross the end"""
+        ring = RingBuffer(10)
+        out = np.zeros(4, dtype=np.int16)
+        received = []
+        data = np.arange(100, dtype=np.int16)
+        offset = 0
+        while len(received) < 100:
+            offset += ring.write(data[offset : offset + 7])
+            count = ring.read_into(out)
+            received.extend(out[:count])
+        np.testing.assert_array_equal(received, data)
+
+    def test_write_stops_when_full(self):
+        """Test writes are truncated to the free space"""
+        ring = RingBuffer(8)
+        assert ring.write(np.ones(5, dtype=np.int16)) == 5
+        assert ring.write(np.ones(5, dtype=np.int16)) == 3
+        assert ring.free == 0
+        assert ring.available == 8
+
+    def test_read_from_empty(self):
+        """Test reading an empty buffer returns nothing"""
+        ring = RingBuffer(8)
+        out = np.full(4, 7, dtype=np.int16)
+        assert ring.read_into(out) == 0
+        assert np.all(out == 7)
+
+    def test_invalid_capacity(self):
+        """Test non-positive capacities are rejected"""
+        with pytest.raises(ValueError):
+            RingBuffer(0)
+
+
+class TestPlaybackEngine:
+    """Tests for block feeding, underruns and bar-aligned changes"""
+
+    @pytest.mark.parametrize("pattern", ["4beat", "4to8", "A x/8 x/8 . x"])
+    @pytest.mark.parametrize("block_size", [64, 256, 1000])
+    def test_matches_exact_render(self, block_size, pattern):
+        """Test the stream equals the exact-timing file render"""
+        engine = PlaybackEngine(173, pattern, block_size=block_size)
+        output = _play(engine, 6)
+        expected = generate_metronome(bpm=173, duration_seconds=8, pattern=pattern, timing="exact")
+        np.testing.assert_array_equal(output, expected[: len(output)])
+        assert engine.underruns == 0
+
+    def test_overlapping_clicks_cross_bar_boundary(self):
+        """Test click tails are carried into the next bar"""
+        engine = PlaybackEngine(300, "x/8", block_size=128)
+        output = _play(engine, 2)
+        expected = generate_metronome(bpm=300, duration_seconds=3, pattern="x/8", timing="exact")
+        np.testing.assert_array_equal(output, expected[: len(output)])
+
+    def test_underrun_outputs_silence(self):
+        """Test a starved callback outputs silence and counts an underrun"""
+        engine = PlaybackEngine(120, block_size=256)
+        block = np.full(256, 123, dtype=np.int16)
+        engine.callback(block)
+        assert np.all(block == 0)
+        assert engine.info()["underruns"] == 1
+
+        engine.fill()
+        engine.callback(block)
+        assert engine.underruns == 1
+        assert engine.blocks == 2
+
+    def test_tempo_change_at_next_bar(self):
+        """Test a tempo change takes effect at the next bar boundary"""
+        engine = PlaybackEngine(120, "4beat", block_size=256)
+        engine.fill()
+        engine.set_tempo(240)
+        output = _play(engine, 4)
+
+        bar = 88200  # 4拍 × 0.5秒 × 44100
+        before = generate_metronome(bpm=120, duration_seconds=2, timing="exact")
+        after = generate_metronome(bpm=240, duration_seconds=4, timing="exact")
+        np.testing.assert_array_equal(output[:bar], before[:bar])
+        np.testing.assert_array_equal(output[bar:], after[: len(output) - bar])
+
+    def test_pattern_change_at_next_bar(self):
+        """Test a pattern change takes effect at the next bar boundary"""
+        engine = PlaybackEngine(120, "4beat", block_size=256)
+        engine.fill()
+        engine.set_pattern("4to8")
+        output = _play(engine, 4)
+
+        bar = 88200
+        after = generate_metronome(bpm=120, duration_seconds=4, pattern="4to8", timing="exact")
+        np.testing.assert_array_equal(output[bar:], after[: len(output) - bar])
+        assert engine.pattern is not None
+
+    def test_callback_does_not_allocate_audio(self):
+        """Test the callback copies into the given buffer without new arrays"""
+        engine = PlaybackEngine(120, block_size=8192, buffer_blocks=4)
+        block = np.zeros(8192, dtype=np.int16)
+        engine.fill()
+
+        tracemalloc.start()
+        try:
+            for _ in range(3):
+                engine.callback(block)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # 1ブロック分（16KB）のコピーが発生していないこと
+        assert peak < block.nbytes // 2
+
+    def test_background_producer(self):
+        """Test the producer thread keeps a paced callback fed"""
+        with PlaybackEngine(150, "4to8", block_size=256, buffer_blocks=32) as engine:
+            assert engine.running
+            output = _play(engine, 0.5, realtime=True)
+        assert not engine.running
+        expected = generate_metronome(bpm=150, duration_seconds=4, pattern="4to8", timing="exact")
+        if engine.underruns == 0:
+            np.testing.assert_array_equal(output, expected[: len(output)])
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [{"bpm": 0}, {"bpm": 120, "block_size": 0}, {"bpm": 120, "buffer_blocks": 1}],
+    )
+    def test_invalid_arguments(self, kwargs):
+        """Test invalid settings are rejected"""
+        with pytest.raises(ValueError):
+            PlaybackEngine(**kwargs)
+
+    def test_invalid_pattern_change(self):
+        """Test an invalid pattern change leaves the engine untouched"""
+        engine = PlaybackEngine(120)
+        with pytest.raises(ValueError):
+            engine.set_pattern("A q")
+        assert engine.pattern.canonical == "A x x x"
+
+
+class TestFileSink:
+    """Tests for the WAV file sink"""
+
+    def test_writes_stream(self, tmp_path):
+        """Test the sink writes exactly the streamed blocks"""
+        output_file = str(tmp_path / "take.wav")
+        engine = PlaybackEngine(120, block_size=500)
+        FileSink(output_file).run(engine, 3)
+
+        sample_rate, data = wavfile.read(output_file)
+        assert sample_rate == 44100
+        assert len(data) == 265 * 500  # ブロック単位に切り上げ
+        expected = generate_metronome(bpm=120, duration_seconds=4, timing="exact")
+        np.testing.assert_array_equal(data, expected[: len(data)])
+
+    def test_cli_play_to_file(self, tmp_path):
+        """Test the play subcommand renders to a file headless"""
+        output_file = str(tmp_path / "take.wav")
+        status = main(["play", "-b", "120", "--duration", "2", "--output", output_file])
+        assert status == 0
+        _, data = wavfile.read(output_file)
+        assert len(data) >= 2 * 44100
+
+    def test_cli_requires_duration_for_file(self, tmp_path):
+        """Test file output needs an explicit duration"""
+        with pytest.raises(SystemExit):
+            main(["play", "-b", "120", "--output", str(tmp_path / "take.wav")])
@@ -0,0 +1,147 @@
+"""Tests for the profiling hooks"""
+
+import json
+import threading
+
+import pytest
+
+from src.metronome import profiling
+from src.metronome.cli import main
+from src.metronome.core import generate_metronome
+from src.metronome.io import encode_mp3, save_as_wav
+from src.metronome.profiling import Profile
+
+
+class TestStage:
+    """Tests for stage timers"""
+
+    def test_disabled_by_default(self):
+        """Test no hooks means a shared, falsy timer that records nothing"""
+        assert not profiling.is_enabled()
+        timer = profiling.stage("render.place")
+        assert not timer
+        assert timer is profiling.stage("wav.write")
+        with timer:
+            timer.bytes = 10
+
+    def test_hooks_receive_records(self):
+        """Test a registered hook gets one record per stage"""
+        records = []
+        profiling.add_hook(records.append)
+        try:
+            with profiling.stage("custom") as timer:
+                assert timer
+                timer.bytes = 3
+        finally:
+            profiling.remove_hook(records.append)
+        assert not profiling.is_enabled()
+        assert [(r.stage, r.bytes) for r in records] == [("custom", 3)]
+        assert records[0].seconds >= 0
+
+    def test_remove_unknown_hook(self):
+        """Test removing a hook that was never added is a no-op"""
+        profiling.remove_hook(print)
+
+
+class TestProfile:
+    """Tests for Profile"""
+
+    def test_generate_stages(self):
+        """Test rendering records schedule, clicks and placement with array sizes"""
+        with Profile() as profile:
+            wave_data = generate_metronome(bpm=120, duration_seconds=2)
+            generate_metronome(bpm=None, duration_seconds=None, tempo_map="120-180@1")
+        totals = profile.totals()
+        assert list(totals)[:3] == ["schedule", "clicks", "render.tiled"]
+        assert totals["render.tiled"]["array_bytes"] == wave_data.nbytes
+        assert totals["schedule"]["calls"] == 2
+        # テンポマップはタイリングせずに配置→変換する
+        assert totals["render.place"]["calls"] == 1
+        assert totals["render.int16"]["calls"] == 1
+        assert profile.elapsed > 0
+
+    def test_wav_bytes(self, tmp_path):
+        """Test the WAV stage records the size of the written file"""
+        output = tmp_path / "click.wav"
+        wave_data = generate_metronome(bpm=120, duration_seconds=1)
+        with Profile() as profile:
+            save_as_wav(wave_data, 44100, str(output))
+        assert profile.totals()["wav.write"]["bytes"] == output.stat().st_size
+
+    def test_mp3_bytes(self, fake_encoder, tmp_path):
+        """Test the MP3 stage records the size of the encoded file"""
+        output = tmp_path / "click.mp3"
+        with Profile() as profile:
+            encode_mp3(generate_metronome(bpm=120, duration_seconds=1), 44100, str(output))
+        assert profile.totals()["mp3.encode"]["bytes"] == output.stat().st_size
+
+    def test_records_other_threads(self):
+        """Test stages measured by worker threads are collected"""
+        with Profile() as profile:
+            worker = threading.Thread(
+                target=generate_metronome, args=(120, 1), name="profiled-worker"
+            )
+            worker.start()
+            worker.join()
+        assert {record.thread for record in profile.records} == {"profiled-worker"}
+
+    def test_summary_and_json(self):
+        """Test the report formats"""
+        with Profile() as profile:
+            generate_metronome(bpm=120, duration_seconds=1)
+        assert "render.tiled" in profile.summary()
+        data = json.loads(json.dumps(profile.to_dict()))
+        assert data["stages"]["clicks"]["calls"] == 1
+        assert len(data["records"]) == len(profile.records)
+
+
+class TestProfileCli:
+    """Tests for --profile"""
+
+    def test_prints_breakdown(self, fake_encoder, tmp_path, capsys):
+        """Test --profile prints the stage table"""
+        main(["--bpm", "120", "--duration", "1", "--no-cache", "-o", str(tmp_path / "a.mp3")])
+        assert "mp3.encode" not in capsys.readouterr().out
+        main(
+            [
+                "--bpm",
+                "120",
+                "--duration",
+                "1",
+                "--no-cache",
+                "--profile",
+                "-o",
+                str(tmp_path / "b.mp3"),
+            ]
+        )
+        out = capsys.readouterr().out
+        assert "render.tiled" in out
+        assert "mp3.encode" in out
+
+    def test_writes_json(self, fake_encoder, tmp_path):
+        """Test --profile FILE writes the breakdown as JSON"""
+        report = tmp_path / "profile.json"
+        status = main(
+            [
+                "batch",
+                "--bpm",
+                "120",
+                "130",
+                "--duration",
+                "1",
+                "--pipeline",
+                "--no-cache",
+                "--profile",
+                str(report),
+                "-o",
+                str(tmp_path / "out"),
+            ]
+        )
+        assert status == 0
+        stages = json.loads(report.read_text())["stages"]
+        assert stages["mp3.encode"]["calls"] == 2
+
+    def test_batch_requires_in_process_workers(self):
+        """Test --profile is rejected for the process pool"""
+        with pytest.raises(SystemExit):
+            main(["batch", "--bpm", "120", "--profile", "--jobs", "2"])
@@ -0,0 +1,203 @@
+"""Tests for the local HTTP render service"""
+
+import http.client
+import io
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from src.metronome.core import generate_metronome
+from src.metronome.server import (
+    MetronomeServer,
+    RenderRequest,
+    RenderService,
+    ServiceBusyError,
+    parse_render_request,
+)
+
+
+@pytest.fixture
+def server():
+    """Run a server on an ephemeral localhost port"""
+    service = RenderService(workers=2, max_requests=2, chunk_samples=8192)
+    server = MetronomeServer(("127.0.0.1", 0), service, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+class TestParseRenderRequest:
+    """Tests for request validation"""
+
+    def test_query_strings_are_converted(self):
+        """Test numeric query values are parsed as integers"""
+        request = parse_render_request({"bpm": "150", "duration": "30", "pattern": "4to8"})
+        assert request == RenderRequest(bpm=150, duration=30, pattern="4to8")
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"bpm": "fast"},
+            {"bpm": 10},
+            {"bpm": 120, "duration": 0},
+            {"bpm": 120, "duration": 601},
+            {"bpm": 120, "format": "ogg"},
+            {"bpm": 120, "pattern": "A q"},
+            {"bpm": 120, "timing": "drift"},
+            {"bpm": 120, "volume": 3},
+            {"bpm": 120, "pattern": 4},
+        ],
+    )
+    def test_invalid_params(self, params):
+        """Test invalid parameters are rejected"""
+        with pytest.raises(ValueError):
+            parse_render_request(params)
+
+
+class TestRenderEndpoints:
+    """Tests for the HTTP endpoints"""
+
+    def test_get_wav_streams_chunked(self, server):
+        """Test GET /render streams a WAV identical to generate_metronome"""
+        status, headers, body = _request(server, "GET", "/render?bpm=173&duration=5")
+        assert status == 200
+        assert headers["Content-Type"] == "audio/wav"
+        assert headers["Transfer-Encoding"] == "chunked"
+
+        sample_rate, data = wavfile.read(io.BytesIO(body))
+        assert sample_rate == 44100
+        np.testing.assert_array_equal(data, generate_metronome(bpm=173, duration_seconds=5))
+
+    def test_post_json(self, server):
+        """Test POST /render accepts a JSON body"""
+        body = json.dumps(
+            {"bpm": 150, "duration": 3, "sample_rate": 22050, "pattern": "4to8", "timing": "exact"}
+        )
+        status, _, payload = _request(server, "POST", "/render", body)
+        assert status == 200
+        sample_rate, data = wavfile.read(io.BytesIO(payload))
+        expected = generate_metronome(
+            bpm=150, duration_seconds=3, sample_rate=22050, pattern="4to8", timing="exact"
+        )
+        assert sample_rate == 22050
+        np.testing.assert_array_equal(data, expected)
+
+    def test_mp3_is_piped_through_encoder(self, server, fake_encoder):
+        """Test MP3 requests stream the encoder's stdout"""
+        status, headers, body = _request(server, "GET", "/render?bpm=120&duration=2&format=mp3")
+        assert status == 200
+        assert headers["Content-Type"] == "audio/mpeg"
+        expected = generate_metronome(bpm=120, duration_seconds=2)
+        np.testing.assert_array_equal(np.frombuffer(body, "<i2"), expected)
+
+    def test_encoder_failure_is_500(self, server, fake_encoder, monkeypatch):
+        """Test an encoder that fails before any output yields a 500"""
+        monkeypatch.setattr("pydub.AudioSegment.converter", "/nonexistent/ffmpeg")
+        status, _, body = _request(server, "GET", "/render?bpm=120&duration=2&format=mp3")
+        assert status == 500
+        assert "error" in json.loads(body)
+
+    def test_bad_request(self, server):
+        """Test invalid parameters return 400 with a JSON error"""
+        status, headers, body = _request(server, "GET", "/render?bpm=1000")
+        assert status == 400
+        assert headers["Content-Type"].startswith("application/json")
+        assert "BPM" in json.loads(body)["error"]
+
+    def test_bad_json(self, server):
+        """Test malformed JSON bodies return 400"""
+        status, _, _ = _request(server, "POST", "/render", "{bpm")
+        assert status == 400
+
+    def test_not_found(self, server):
+        """Test unknown paths return 404"""
+        status, _, _ = _request(server, "GET", "/nothing")
+        assert status == 404
+
+    def test_health(self, server):
+        """Test the health endpoint reports the pool state"""
+        status, _, body = _request(server, "GET", "/health")
+        assert status == 200
+        assert json.loads(body) == {"status": "ok", "workers": 2, "max_requests": 2, "active": 0}
+
+    def test_keep_alive(self, server):
+        """Test several requests can share one connection"""
+        connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+        try:
+            for bpm in (120, 140):
+                connection.request("GET", f"/render?bpm={bpm}&duration=1")
+                response = connection.getresponse()
+                _, data = wavfile.read(io.BytesIO(response.read()))
+                assert len(data) == len(generate_metronome(bpm=bpm, duration_seconds=1))
+        finally:
+            connection.close()
+
+
+class TestConcurrencyLimits:
+    """Tests for backpressure and the request limit"""
+
+    def test_busy_returns_503(self, server):
+        """Test requests beyond the limit are refused with Retry-After"""
+        service = server.service
+        streams = [service.open(RenderRequest(bpm=120, duration=600)) for _ in range(2)]
+        try:
+            status, headers, _ = _request(server, "GET", "/render?bpm=120&duration=1")
+            assert status == 503
+            assert headers["Retry-After"] == "1"
+        finally:
+            for stream in streams:
+                stream.close()
+
+        status, _, _ = _request(server, "GET", "/render?bpm=120&duration=1")
+        assert status == 200
+
+    def test_slow_reader_blocks_producer(self):
+        """Test the worker stops rendering while the queue is full"""
+        service = RenderService(workers=1, queue_chunks=2, chunk_samples=1024)
+        try:
+            stream = service.open(RenderRequest(bpm=120, duration=600))
+            deadline = time.monotonic() + 5
+            while not stream.queue.full() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            assert stream.queue.qsize() == 2
+            assert not stream.future.done()
+
+            # 読み出した分だけ生成が進む
+            next(stream)
+            assert service.info()["active"] == 1
+            stream.close()
+            stream.future.result(timeout=5)
+            assert service.info()["active"] == 0
+        finally:
+            service.close()
+
+    def test_service_raises_when_full(self):
+        """Test open() raises once max_requests streams are active"""
+        service = RenderService(workers=1, max_requests=1)
+        try:
+            stream = service.open(RenderRequest(bpm=120, duration=600))
+            with pytest.raises(ServiceBusyError):
+                service.open(RenderRequest(bpm=120, duration=1))
+            stream.close()
+            assert b"".join(service.open(RenderRequest(bpm=120, duration=1)))
+        finally:
+            service.close()
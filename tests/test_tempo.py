@@ -0,0 +1,173 @@
+"""Tests for tempo maps"""
+
+import numpy as np
+import pytest
+
+from src.metronome.cache import render_spec
+from src.metronome.cli import main
+from src.metronome.core import (
+    _compute_onsets,
+    count_samples,
+    generate_metronome,
+    iter_metronome_chunks,
+)
+from src.metronome.tempo import parse_tempo_map
+
+
+def numeric_beat_times(bpm_at, beats, horizon, steps=2_000_000):
+    """Integrate a tempo curve numerically and invert it at the given beats"""
+    t = np.linspace(0, horizon, steps + 1)
+    bpm = bpm_at(t)
+    elapsed_beats = np.concatenate([[0.0], np.cumsum((bpm[1:] + bpm[:-1]) / 2 * np.diff(t) / 60)])
+    return np.interp(beats, elapsed_beats, t)
+
+
+class TestParseTempoMap:
+    """Tests for the tempo map notation"""
+
+    def test_segments(self):
+        """Test each segment kind and length unit"""
+        tempo_map = parse_tempo_map("120@8, 160-300@96 160~300@10m 100>130@4 90@30s")
+        shapes = [(s.shape, s.unit, s.length) for s in tempo_map.segments]
+        assert shapes == [
+            ("hold", "bars", 8),
+            ("linear", "bars", 96),
+            ("exp", "seconds", 600),
+            ("step", "bars", 4),
+            ("hold", "seconds", 30),
+        ]
+        assert tempo_map.start_bpm == 120
+        assert tempo_map.end_bpm == 90
+
+    def test_canonical_round_trip(self):
+        """Test the canonical form parses back to the same map"""
+        tempo_map = parse_tempo_map("160-300@1.5m  120@8")
+        assert tempo_map.canonical == "160-300@90s 120@8"
+        assert parse_tempo_map(tempo_map.canonical) == tempo_map
+        assert parse_tempo_map(tempo_map) is tempo_map
+
+    @pytest.mark.parametrize(
+        "text", ["", "120", "120@0", "0-120@4", "120@4x", "100>200@10s", "100>200@2.5", "a@4"]
+    )
+    def test_invalid(self, text):
+        """Test malformed maps are rejected"""
+        with pytest.raises(ValueError):
+            parse_tempo_map(text)
+
+
+class TestBeatTimes:
+    """Tests for closed-form onset times"""
+
+    def test_hold(self):
+        """Test a constant tempo gives evenly spaced beats"""
+        times = parse_tempo_map("120@4").beat_times([0, 1, 16, 20], 4)
+        np.testing.assert_allclose(times, [0, 0.5, 8, 10])
+
+    def test_linear_ramp_matches_integration(self):
+        """Test the linear ramp inverse agrees with numeric integration"""
+        tempo_map = parse_tempo_map("160-300@600s")
+        beats = np.linspace(0, tempo_map.total_beats(4), 500)
+        expected = numeric_beat_times(lambda t: 160 + 140 * t / 600, beats, 600)
+        np.testing.assert_allclose(tempo_map.beat_times(beats, 4), expected, atol=1e-4)
+        assert tempo_map.total_beats(4) == pytest.approx(2300)
+
+    def test_exponential_ramp_matches_integration(self):
+        """Test the exponential ramp inverse agrees with numeric integration"""
+        tempo_map = parse_tempo_map("100~200@120s")
+        beats = np.linspace(0, tempo_map.total_beats(4), 500)
+        expected = numeric_beat_times(lambda t: 100 * 2 ** (t / 120), beats, 120)
+        np.testing.assert_allclose(tempo_map.beat_times(beats, 4), expected, atol=1e-4)
+
+    def test_bars_and_seconds_agree(self):
+        """Test a ramp given in bars lasts the time implied by its average tempo"""
+        tempo_map = parse_tempo_map("100-200@10")
+        assert tempo_map.total_seconds(4) == pytest.approx(40 * 60 / 150)
+        seconds = tempo_map.total_seconds(4)
+        same = parse_tempo_map(f"100-200@{seconds}s")
+        assert same.total_beats(4) == pytest.approx(40)
+
+    def test_holds_last_tempo_after_the_map(self):
+        """Test beats past the end continue at the final tempo"""
+        tempo_map = parse_tempo_map("120@1 120-240@1")
+        end = tempo_map.total_seconds(4)
+        times = tempo_map.beat_times([8, 12], 4)
+        assert times[0] == pytest.approx(end)
+        assert times[1] - times[0] == pytest.approx(1.0)
+
+
+class TestTempoMapRendering:
+    """Tests for rendering with a tempo map"""
+
+    def test_constant_map_matches_exact_timing(self):
+        """Test a single held tempo renders like timing="exact" """
+        expected = generate_metronome(bpm=123, duration_seconds=30, pattern="4to8", timing="exact")
+        rendered = generate_metronome(
+            bpm=None, duration_seconds=30, pattern="4to8", tempo_map="123@1"
+        )
+        np.testing.assert_array_equal(rendered, expected)
+
+    def test_ramp_intervals(self):
+        """Test click spacing follows the ramp from start to end tempo"""
+        positions, _, total_samples = _compute_onsets(
+            None, None, 44100, "4beat", tempo_map="160-300@10m"
+        )
+        intervals = np.diff(positions)
+        assert np.all(intervals[1:] <= intervals[:-1] + 1)
+        assert 60 * 44100 / intervals[0] == pytest.approx(160, abs=0.1)
+        assert 60 * 44100 / intervals[-1] == pytest.approx(300, abs=0.1)
+        assert total_samples == 600 * 44100
+
+    def test_step_changes_per_bar(self):
+        """Test stepped maps keep one tempo within each bar"""
+        positions, _, _ = _compute_onsets(None, None, 44100, "4beat", tempo_map="100>130@4")
+        intervals = np.diff(positions).astype(float)
+        bars = [intervals[i * 4 : i * 4 + 3] for i in range(4)]
+        for bar, bpm in zip(bars, (100, 110, 120, 130)):
+            np.testing.assert_allclose(bar, 60 * 44100 / bpm, atol=1)
+
+    def test_duration_completes_cycles(self):
+        """Test an explicit duration is extended to the end of the current cycle"""
+        total_samples = count_samples(None, 50, 44100, "4to8", tempo_map="100-200@2 200@100")
+        assert total_samples >= 50 * 44100
+        # 200 BPM で1サイクル（12拍）は3.6秒
+        assert total_samples < (50 + 3.6) * 44100
+
+    def test_streaming_and_out_match(self):
+        """Test chunked and out= rendering agree with the one-pass render"""
+        tempo_map = "90~180@8 180@2"
+        expected = generate_metronome(None, None, 22050, "A x/2 x/2 . x", tempo_map=tempo_map)
+        chunks = iter_metronome_chunks(
+            None, None, 22050, "A x/2 x/2 . x", chunk_samples=3000, tempo_map=tempo_map
+        )
+        np.testing.assert_array_equal(np.concatenate(list(chunks)), expected)
+        out = np.empty(len(expected), dtype=np.int16)
+        generate_metronome(None, None, 22050, "A x/2 x/2 . x", out=out, tempo_map=tempo_map)
+        np.testing.assert_array_equal(out, expected)
+
+    def test_cache_key(self):
+        """Test the tempo map is part of the cache key only when used"""
+        plain = render_spec(120, 60, 44100, "4beat")
+        assert "tempo_map" not in plain
+        ramp = render_spec(None, None, 44100, "4beat", tempo_map="120-180@4.0")
+        assert ramp["tempo_map"] == "120-180@4"
+        assert render_spec(None, None, 44100, "4beat", tempo_map="120-180@5") != ramp
+
+
+class TestTempoMapCli:
+    """Tests for --tempo-map"""
+
+    def test_renders_tempo_map(self, fake_encoder, tmp_path, capsys):
+        """Test the CLI renders the whole map when no duration is given"""
+        output = tmp_path / "ramp.mp3"
+        main(["--tempo-map", "120-240@2", "--no-cache", "-o", str(output)])
+        data = np.frombuffer(output.read_bytes(), "<i2")
+        np.testing.assert_array_equal(data, generate_metronome(None, None, tempo_map="120-240@2"))
+        assert "120-240@2" in capsys.readouterr().out
+
+    @pytest.mark.parametrize(
+        "argv", [[], ["--bpm", "120", "--tempo-map", "120@4"], ["--tempo-map", "fast"]]
+    )
+    def test_invalid_arguments(self, argv):
+        """Test exactly one valid tempo source is required"""
+        with pytest.raises(SystemExit):
+            main(argv + ["--no-cache"])